@@ -13,6 +13,9 @@ run_suite () {
     put_host_image
     install_local_rpms_without_reposync
     env_start
+    env_metrics_start
+    env_profile_start
+    env_glance_mirror_start
     env_copy_repo_file
     env_copy_config_file
     env_status
@@ -33,7 +36,10 @@ run_suite () {
         "zipp==1.2.0"
 
     for scenario in "${test_scenarios[@]}"; do
-        if [[ "$scenario" == *pytest* ]]; then
+        if [[ "$scenario" == *_ui_*pytest* ]]; then
+            echo "Running test scenario ${scenario##*/} with pytest, browsers in parallel"
+            env_run_pytest_browsers "$scenario" || failed=true
+        elif [[ "$scenario" == *pytest* ]]; then
             echo "Running test scenario ${scenario##*/} with pytest"
             env_run_pytest "$scenario" || failed=true
         else
@@ -43,10 +49,10 @@ run_suite () {
 
         if [[ -n "$OST_SKIP_COLLECT" ]]; then
             if [[ "$failed" == "true" ]]; then
-                env_collect "$PWD/test_logs/${SUITE##*/}/post-${scenario##*/}"
+                env_collect_incremental "$PWD/test_logs/${SUITE##*/}/post-${scenario##*/}"
             fi
         else
-            env_collect "$PWD/test_logs/${SUITE##*/}/post-${scenario##*/}"
+            env_collect_incremental "$PWD/test_logs/${SUITE##*/}/post-${scenario##*/}"
         fi
         if $failed; then
             echo "@@@@ ERROR: Failed running $scenario"
@@ -55,4 +61,5 @@ run_suite () {
     done
 
     generate_vdsm_coverage_report
+    env_perf_record
 }
@@ -42,12 +42,17 @@ from test_utils import constants
 from test_utils import versioning
 
 from ost_utils import general_utils
+from ost_utils import readiness
+from ost_utils import waiter
 from ost_utils.pytest.fixtures import api_v4
 from ost_utils.pytest.fixtures import prefix
 
 import logging
 LOGGER = logging.getLogger(__name__)
 
+# Runs the steps marked with their dependencies concurrently
+pytest_plugins = ('ost_utils.pytest.scheduler',)
+
 MB = 2 ** 20
 GB = 2 ** 30
 
@@ -89,7 +94,10 @@ GLANCE_AVAIL = False
 GUEST_IMAGE_NAME = versioning.guest_os_image_name()
 GLANCE_DISK_NAME = versioning.guest_os_glance_disk_name()
 TEMPLATE_GUEST = versioning.guest_os_template_name()
-GLANCE_SERVER_URL = 'http://glance.ovirt.org:9292/'
+# Set by run_suite.sh when the images are served from a local mirror
+GLANCE_SERVER_URL = os.environ.get(
+    'OST_GLANCE_MIRROR_URL', 'http://glance.ovirt.org:9292/'
+)
 
 # Network
 VM_NETWORK = u'VM Network with a very long name and עברית'
@@ -199,6 +207,7 @@ def _wait_for_status(hosts_service, dc_name, status):
 
 
 @pytest.mark.run(order=2)
+@pytest.mark.depends()
 def test_add_dc(api_v4):
     engine = api_v4.system_service()
     dcs_service = engine.data_centers_service()
@@ -214,6 +223,7 @@ def test_add_dc(api_v4):
 
 
 @pytest.mark.run(order=20)
+@pytest.mark.depends('test_update_default_dc', 'test_add_mac_pool')
 def test_remove_default_dc(api_v4):
     engine = api_v4.system_service()
     dc_service = test_utils.data_center_service(engine, 'Default')
@@ -222,6 +232,7 @@ def test_remove_default_dc(api_v4):
 
 
 @pytest.mark.run(order=17)
+@pytest.mark.depends()
 def test_update_default_dc(api_v4):
     engine = api_v4.system_service()
     dc_service = test_utils.data_center_service(engine, 'Default')
@@ -234,6 +245,7 @@ def test_update_default_dc(api_v4):
 
 
 @pytest.mark.run(order=18)
+@pytest.mark.depends()
 def test_update_default_cluster(api_v4):
     engine = api_v4.system_service()
     cluster_service = test_utils.get_cluster_service(engine, 'Default')
@@ -248,6 +260,7 @@ def test_update_default_cluster(api_v4):
 
 
 @pytest.mark.run(order=21)
+@pytest.mark.depends('test_remove_default_dc')
 def test_remove_default_cluster(api_v4):
     engine = api_v4.system_service()
     cl_service = test_utils.get_cluster_service(engine, 'Default')
@@ -256,6 +269,7 @@ def test_remove_default_cluster(api_v4):
 
 
 @pytest.mark.run(order=16)
+@pytest.mark.depends('test_add_dc')
 def test_add_dc_quota(api_v4):
     datacenters_service = api_v4.system_service().data_centers_service()
     datacenter = datacenters_service.list(search='name=%s' % DC_NAME)[0]
@@ -271,6 +285,7 @@ def test_add_dc_quota(api_v4):
     )
 
 @pytest.mark.run(order=3)
+@pytest.mark.depends('test_add_dc')
 def test_add_cluster(api_v4):
     engine = api_v4.system_service()
     clusters_service = engine.clusters_service()
@@ -313,6 +328,7 @@ def test_add_cluster(api_v4):
 
 
 @pytest.mark.run(order=5)
+@pytest.mark.depends('test_add_hosts')
 def test_sync_time(prefix):
     hosts = prefix.virt_env.host_vms()
     for host in hosts:
@@ -321,9 +337,11 @@ def test_sync_time(prefix):
 
 
 @pytest.mark.run(order=4)
+@pytest.mark.depends('test_add_cluster')
 def test_add_hosts(prefix):
     hosts = prefix.virt_env.host_vms()
-    api = prefix.virt_env.engine_vm().get_api_v4()
+    engine_vm = prefix.virt_env.engine_vm()
+    api = engine_vm.get_api_v4()
     engine = api.system_service()
     hosts_service = engine.hosts_service()
 
@@ -342,11 +360,16 @@ def test_add_hosts(prefix):
         )
 
     with test_utils.TestEvent(engine, 42):
-        for host in hosts:
+        for i, host in enumerate(hosts):
+            certificates = readiness.engine_certificate_count(engine_vm)
             assert _add_host(host)
-            # TODO: Adding a delay between adding hosts to bypass certificate
-            # issue: https://bugzilla.redhat.com/1787195
-            time.sleep(60)
+            # TODO: Waiting for the certificate of each host to be signed
+            # before adding the next one to bypass certificate issue:
+            # https://bugzilla.redhat.com/1787195
+            if i < len(hosts) - 1:
+                readiness.wait_for_certificate_enrolled(
+                    engine_vm, certificates, timeout=60
+                )
 
 
 @pytest.mark.run(order=30)
@@ -390,6 +413,7 @@ def test_complete_hosts_setup(prefix):
 
 
 @pytest.mark.run(order=0)
+@pytest.mark.depends()
 def test_copy_storage_script(prefix):
     engine = prefix.virt_env.engine_vm()
     storage_script = os.path.join(
@@ -404,6 +428,7 @@ def test_copy_storage_script(prefix):
 
 
 @pytest.mark.run(order=14)
+@pytest.mark.depends('test_copy_storage_script')
 def test_configure_storage(prefix):
     engine = prefix.virt_env.engine_vm()
     result = engine.ssh(
@@ -642,6 +667,7 @@ def generic_import_from_glance(prefix=None, as_template=False,
 
 
 @pytest.mark.run(order=15)
+@pytest.mark.depends()
 def test_list_glance_images(api_v4):
     global GLANCE_AVAIL
     search_query = 'name={}'.format(SD_GLANCE_NAME)
@@ -655,6 +681,7 @@ def test_list_glance_images(api_v4):
             pytest.skip('GLANCE storage domain is not available.')
         glance_domain_list = storage_domains_service.list(search=search_query)
 
+    use_glance_mirror(engine)
     if not check_glance_connectivity(engine):
         pytest.skip('GLANCE connectivity test failed')
 
@@ -708,6 +735,22 @@ def add_glance(api):
     return glance.pop()
 
 
+def use_glance_mirror(engine):
+    """
+    Points the provider created by engine-setup at GLANCE_SERVER_URL, if
+    it's the local mirror
+    """
+    if 'OST_GLANCE_MIRROR_URL' not in os.environ:
+        return
+    providers_service = engine.openstack_image_providers_service()
+    for provider in providers_service.list():
+        if (provider.name == SD_GLANCE_NAME and
+                provider.url != GLANCE_SERVER_URL):
+            providers_service.provider_service(provider.id).update(
+                sdk4.types.OpenStackImageProvider(url=GLANCE_SERVER_URL)
+            )
+
+
 def check_glance_connectivity(engine):
     avail = False
     providers_service = engine.openstack_image_providers_service()
@@ -739,6 +782,7 @@ def import_template_from_glance(prefix_param):
 
 
 @pytest.mark.run(order=24)
+@pytest.mark.depends('test_add_quota_storage_limits', 'test_add_quota_cluster_limits')
 def test_set_dc_quota_audit(api_v4):
     dcs_service = api_v4.system_service().data_centers_service()
     dc = dcs_service.list(search='name=%s' % DC_NAME)[0]
@@ -751,6 +795,7 @@ def test_set_dc_quota_audit(api_v4):
 
 
 @pytest.mark.run(order=22)
+@pytest.mark.depends('test_add_dc_quota')
 def test_add_quota_storage_limits(api_v4):
 
     # Find the data center and the service that manages it:
@@ -805,6 +850,7 @@ def test_add_quota_storage_limits(api_v4):
     )
 
 @pytest.mark.run(order=23)
+@pytest.mark.depends('test_add_dc_quota')
 def test_add_quota_cluster_limits(api_v4):
     datacenters_service = api_v4.system_service().data_centers_service()
     datacenter = datacenters_service.list(search='name=%s' % DC_NAME)[0]
@@ -868,6 +914,7 @@ def test_add_non_vm_network(api_v4):
 
 
 @pytest.mark.run(order=25)
+@pytest.mark.depends()
 def test_add_role(api_v4):
     engine = api_v4.system_service()
     roles_service = engine.roles_service()
@@ -888,6 +935,7 @@ def test_add_role(api_v4):
 
 
 @pytest.mark.run(order=27)
+@pytest.mark.depends()
 def test_add_affinity_label(api_v4):
     engine = api_v4.system_service()
     affinity_labels_service = engine.affinity_labels_service()
@@ -900,6 +948,7 @@ def test_add_affinity_label(api_v4):
 
 
 @pytest.mark.run(order=11)
+@pytest.mark.depends('test_add_cluster')
 def test_add_affinity_group(api_v4):
     engine = api_v4.system_service()
     cluster_service = test_utils.get_cluster_service(engine, CLUSTER_NAME)
@@ -920,6 +969,7 @@ def test_add_affinity_group(api_v4):
 
 
 @pytest.mark.run(order=13)
+@pytest.mark.depends()
 def test_add_bookmark(api_v4):
     engine = api_v4.system_service()
     bookmarks_service = engine.bookmarks_service()
@@ -933,6 +983,7 @@ def test_add_bookmark(api_v4):
 
 
 @pytest.mark.run(order=29)
+@pytest.mark.depends('test_add_cluster')
 def test_add_cpu_profile(api_v4):
     engine = api_v4.system_service()
     cpu_profiles_service = engine.cpu_profiles_service()
@@ -949,6 +1000,7 @@ def test_add_cpu_profile(api_v4):
 
 
 @pytest.mark.run(order=12)
+@pytest.mark.depends('test_add_dc')
 def test_add_qos(api_v4):
     engine = api_v4.system_service()
     dc_service = test_utils.data_center_service(engine, DC_NAME)
@@ -992,6 +1044,7 @@ def test_add_disk_profile(api_v4):
 
 
 @pytest.mark.run(order=6)
+@pytest.mark.depends()
 def test_get_version(api_v4):
     product_info = api_v4.system_service().get().product_info
     name = product_info.name
@@ -1017,6 +1070,7 @@ def test_get_cluster_enabled_features(api_v4):
 
 
 @pytest.mark.run(order=10)
+@pytest.mark.depends()
 def test_get_cluster_levels(api_v4):
     cluster_levels_service = api_v4.system_service().cluster_levels_service()
     cluster_levels = sorted(cluster_levels_service.list(), key=lambda level:level.id)
@@ -1034,6 +1088,7 @@ def test_get_cluster_levels(api_v4):
 
 
 @pytest.mark.run(order=7)
+@pytest.mark.depends()
 def test_get_domains(api_v4):
     domains_service = api_v4.system_service().domains_service()
     domains = sorted(domains_service.list(), key=lambda domain: domain.name)
@@ -1111,6 +1166,7 @@ def test_check_update_host(api_v4):
 
 
 @pytest.mark.run(order=26)
+@pytest.mark.depends()
 def test_add_scheduling_policy(api_v4):
     engine = api_v4.system_service()
     scheduling_policies_service = engine.scheduling_policies_service()
@@ -1141,12 +1197,14 @@ def test_add_scheduling_policy(api_v4):
 
 
 @pytest.mark.run(order=9)
+@pytest.mark.depends()
 def test_get_system_options(api_v4):
     #TODO: get some option
     options_service = api_v4.system_service().options_service()
 
 
 @pytest.mark.run(order=8)
+@pytest.mark.depends()
 def test_get_operating_systems(api_v4):
     operating_systems_service = api_v4.system_service().operating_systems_service()
     os_list = sorted(operating_systems_service.list(), key=lambda os:os.name)
@@ -1187,6 +1245,7 @@ def test_add_fence_agent(api_v4):
 
 
 @pytest.mark.run(order=28)
+@pytest.mark.depends()
 def test_add_tag(api_v4):
     engine = api_v4.system_service()
     tags_service = engine.tags_service()
@@ -1199,6 +1258,7 @@ def test_add_tag(api_v4):
 
 
 @pytest.mark.run(order=19)
+@pytest.mark.depends('test_update_default_cluster')
 def test_add_mac_pool(api_v4):
     engine = api_v4.system_service()
     pools_service = engine.mac_pools_service()
@@ -1280,6 +1340,7 @@ def test_verify_engine_backup(prefix):
 
 
 @pytest.mark.run(order=1)
+@pytest.mark.depends()
 def test_download_engine_certs(prefix):
     engine_ip = prefix.virt_env.engine_vm().ip()
     engine_base_url = '/ovirt-engine/services/pki-resource?resource=ca-certificate&format='
@@ -1392,7 +1453,6 @@ def test_add_blank_vms(api_v4):
     vm_params.memory = 256 * MB
     vm_params.memory_policy.guaranteed = 128 * MB
     vms_service.add(vm_params)
-    backup_vm_service = test_utils.get_vm_service(engine, BACKUP_VM_NAME)
 
     vm_params.name = VM0_NAME
     least_hotplug_increment = 256 * MB
@@ -1402,13 +1462,18 @@ def test_add_blank_vms(api_v4):
     vm_params.memory_policy.max = required_memory + least_hotplug_increment
 
     vms_service.add(vm_params)
-    vm0_vm_service = test_utils.get_vm_service(engine, VM0_NAME)
 
-    for vm_service in [backup_vm_service, vm0_vm_service]:
-        testlib.assert_true_within_short(
-            lambda:
-            vm_service.get().status == sdk4.types.VmStatus.DOWN
-        )
+    waiter.wait_all(
+        [
+            waiter.EntityCondition(
+                vms_service, vm_name,
+                lambda vm: vm is not None and
+                vm.status == sdk4.types.VmStatus.DOWN
+            )
+            for vm_name in [BACKUP_VM_NAME, VM0_NAME]
+        ],
+        testlib.SHORT_TIMEOUT
+    )
 
 
 @pytest.mark.run(order=34)
@@ -20,6 +20,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import fcntl
 import functools
 import os
 import shutil
@@ -55,6 +56,7 @@ from test_utils.page_objects.WebAdminLeftMenu import WebAdminLeftMenu
 from selenium import webdriver
 from selenium.common.exceptions import (ElementNotVisibleException,
                                         NoSuchElementException,
+                                        TimeoutException,
                                         WebDriverException)
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
@@ -117,19 +119,20 @@ def chrome_capabilities():
     return capabilities
 
 
-@pytest.fixture(
-    scope="session",
-    params=[
-        pytest.param(
-            firefox_capabilities(),
-            id="firefox"
-        ),
-        pytest.param(
-            chrome_capabilities(),
-            id="chrome"
-        ),
-    ]
-)
+BROWSERS = {
+    'firefox': firefox_capabilities,
+    'chrome': chrome_capabilities,
+}
+
+
+def _browser_params():
+    # run_suite.sh runs one pytest process per browser, all at the same
+    # time, each selecting its browser with OST_UI_BROWSER
+    names = os.environ.get('OST_UI_BROWSER', 'firefox,chrome').split(',')
+    return [pytest.param(BROWSERS[name](), id=name) for name in names]
+
+
+@pytest.fixture(scope="session", params=_browser_params())
 def capabilities(request):
     return request.param
 
@@ -157,10 +160,12 @@ def ovirt_driver(capabilities, hub_url, engine_webadmin_url):
 
 
 @pytest.fixture(scope="session")
-def screenshots_dir():
+def screenshots_dir(browser_name):
     dc_version = os.environ.get('OST_DC_VERSION', '')
     root = os.environ.get('OST_REPO_ROOT')
-    path = os.path.join(root, 'exported-artifacts/screenshots%s/' % dc_version)
+    path = os.path.join(
+        root, 'exported-artifacts/screenshots%s/%s/' % (dc_version, browser_name)
+    )
 
     # make screenshot directory
     if os.path.exists(path):
@@ -173,11 +178,11 @@ def screenshots_dir():
 @pytest.fixture(scope="session")
 def save_screenshot(ovirt_driver, browser_name, screenshots_dir):
 
-    def save(description, delay=1):
+    def save(description, delay=1, force=False):
         date = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         name = "{}_{}_{}.png".format(date, browser_name, description)
         path = os.path.join(screenshots_dir, name)
-        ovirt_driver.save_screenshot(path, delay)
+        ovirt_driver.save_screenshot(path, delay, force)
 
     return save
 
@@ -216,7 +221,6 @@ def test_left_nav(ovirt_driver, save_screenshot):
     ovirt_driver.hover_to_id(SEL_ID_COMPUTE_MENU)
     save_screenshot('left_nav_hover_compute')
     ovirt_driver.id_click(SEL_ID_CLUSTERS_MENU)
-    time.sleep(1)
     save_screenshot('left_nav_clicked_clusters')
 
     ovirt_driver.hover_to_id(SEL_ID_COMPUTE_MENU)
@@ -246,7 +250,19 @@ def test_left_nav(ovirt_driver, save_screenshot):
 
 
 @pytest.fixture
-def setup_virtual_machines(api_v4):
+def vm0_lock(prefix):
+    # The browsers may run in parallel processes, and all of them power off
+    # vm0, so only one of them can use it at a time
+    with open(prefix.paths.prefixed('ui-vm0.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@pytest.fixture
+def setup_virtual_machines(api_v4, vm0_lock):
     vm_service = test_utils.get_vm_service(api_v4.system_service(), 'vm0')
     if vm_service.get().status == types.VmStatus.DOWN:
         vm_service.start()
@@ -295,7 +311,7 @@ def test_virtual_machines(ovirt_driver, setup_virtual_machines,
         vm_vgpu_dialog.cancel()
         save_screenshot('vms-success')
     except:
-        save_screenshot('vms-failed')
+        save_screenshot('vms-failed', force=True)
         save_page_source('vms-failed')
         raise
 
@@ -329,6 +345,14 @@ def test_image_upload(ovirt_driver, save_screenshot, browser_name,
                                    image_name)
     save_screenshot('left_nav_add_alias')
     ovirt_driver.wait_for_id('UploadImagePopupView_Ok').click()
-    # wait for image upload
-    time.sleep(IMAGE_UPLOAD_DELAY)
-    save_screenshot('left_nav_ok_clicked')
+    # wait for the uploaded image to show up in the disks list. The upload
+    # itself isn't verified here, so don't fail if it doesn't.
+    try:
+        WebDriverWait(ovirt_driver.driver, IMAGE_UPLOAD_DELAY).until(
+            EC.presence_of_element_located(
+                (By.XPATH, '//*[text()="{}"]'.format(image_name))
+            )
+        )
+    except TimeoutException:
+        pass
+    save_screenshot('left_nav_ok_clicked', force=True)
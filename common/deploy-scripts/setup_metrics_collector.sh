@@ -0,0 +1,101 @@
+set -x
+# Start background system metrics collection: one CSV line per second with
+# CPU, memory, disk and network usage, read from /proc. The lines are
+# streamed to the test runner by common/scripts/stream_metrics.py.
+# Collection is optional and should not fail the tests if failed.
+
+# Maximum collection time to limit disk grow (seconds)
+AUTOKILL_SECONDS=7200
+# Collection interval (seconds)
+COLLECT_INTERVAL=1
+METRICS_FILE=/var/log/ost-metrics.csv
+
+# cpu_* are percents of the interval, disk_* and net_* are per second,
+# disk_busy is the percent of the interval the disks were busy
+cat > /usr/local/bin/ost-metrics-collector <<'COLLECTOR'
+#!/usr/bin/awk -f
+function read_stats(    line, f, dev, n) {
+    while ((getline line < "/proc/stat") > 0) {
+        split(line, f)
+        if (f[1] == "cpu") {
+            cpu["user"] = f[2] + f[3]; cpu["system"] = f[4] + f[7] + f[8]
+            cpu["idle"] = f[5]; cpu["iowait"] = f[6]; cpu["steal"] = f[9]
+            break
+        }
+    }
+    close("/proc/stat")
+    while ((getline line < "/proc/meminfo") > 0) {
+        split(line, f)
+        mem[f[1]] = f[2]
+    }
+    close("/proc/meminfo")
+    disk["read"] = disk["write"] = disk["busy"] = 0
+    while ((getline line < "/proc/diskstats") > 0) {
+        split(line, f)
+        dev = f[3]
+        if (dev ~ /^(sd|vd|xvd|hd)[a-z]+$/ || dev ~ /^nvme[0-9]+n[0-9]+$/) {
+            disk["read"] += f[6] * 512; disk["write"] += f[10] * 512
+            disk["busy"] += f[13]
+        }
+    }
+    close("/proc/diskstats")
+    net["rx"] = net["tx"] = 0
+    while ((getline line < "/proc/net/dev") > 0) {
+        if (line !~ /:/) continue
+        sub(/^ */, "", line)
+        split(line, f, /[: ]+/)
+        if (f[1] == "lo") continue
+        net["rx"] += f[2]; net["tx"] += f[10]
+    }
+    close("/proc/net/dev")
+    getline load < "/proc/loadavg"
+    close("/proc/loadavg")
+    split(load, f)
+    load1 = f[1]
+    "date +%s.%N" | getline now
+    close("date +%s.%N")
+}
+function copy(src, dst,    k) { for (k in src) dst[k] = src[k] }
+BEGIN {
+    interval = ARGV[1]; ARGV[1] = ""
+    print "timestamp,cpu_user,cpu_system,cpu_iowait,cpu_steal,cpu_idle," \
+          "mem_used_kb,mem_available_kb,swap_used_kb," \
+          "disk_read_bps,disk_write_bps,disk_busy," \
+          "net_rx_bps,net_tx_bps,load1"
+    fflush()
+    read_stats()
+    while (1) {
+        copy(cpu, pcpu); copy(disk, pdisk); copy(net, pnet); pnow = now
+        system("sleep " interval)
+        read_stats()
+        total = 0
+        for (k in cpu) total += cpu[k] - pcpu[k]
+        if (total <= 0) total = 1
+        elapsed = now - pnow
+        if (elapsed <= 0) elapsed = interval
+        printf "%.3f,%.1f,%.1f,%.1f,%.1f,%.1f,%.0f,%.0f,%.0f,%.0f,%.0f,%.1f,%.0f,%.0f,%s\n",
+            now,
+            100 * (cpu["user"] - pcpu["user"]) / total,
+            100 * (cpu["system"] - pcpu["system"]) / total,
+            100 * (cpu["iowait"] - pcpu["iowait"]) / total,
+            100 * (cpu["steal"] - pcpu["steal"]) / total,
+            100 * (cpu["idle"] - pcpu["idle"]) / total,
+            mem["MemTotal:"] - mem["MemAvailable:"], mem["MemAvailable:"],
+            mem["SwapTotal:"] - mem["SwapFree:"],
+            (disk["read"] - pdisk["read"]) / elapsed,
+            (disk["write"] - pdisk["write"]) / elapsed,
+            100 * (disk["busy"] - pdisk["busy"]) / (elapsed * 1000),
+            (net["rx"] - pnet["rx"]) / elapsed,
+            (net["tx"] - pnet["tx"]) / elapsed,
+            load1
+        fflush()
+    }
+}
+COLLECTOR
+chmod +x /usr/local/bin/ost-metrics-collector
+
+timeout $AUTOKILL_SECONDS \
+    /usr/local/bin/ost-metrics-collector $COLLECT_INTERVAL \
+    > $METRICS_FILE 2>/dev/null </dev/null &
+
+exit 0
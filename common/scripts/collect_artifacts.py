@@ -0,0 +1,496 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import time
+import zlib
+
+from textwrap import dedent
+
+import six
+from six.moves import shlex_quote
+
+from lago import sdk, utils
+
+#: Artifacts that only grow, so only their new tail is fetched
+APPEND_ONLY_PREFIXES = ('/var/log/',)
+#: Bytes before the previous end of an appended file that are fetched again
+#: to verify it was not replaced in the meantime
+TAIL_OVERLAP = 64
+CHUNK_SIZE = 1024 * 1024
+#: Max bytes of files fetched with a single ssh command, as its output is
+#: kept in memory until it ends. Bigger files are copied on their own.
+FETCH_BATCH_SIZE = 32 * 1024 * 1024
+
+
+DESCRIPTION = dedent(
+    """
+    Collects the artifacts of all the running VMs in the lago prefix, like
+    'lago collect', from all the VMs in parallel.
+
+    By default the collection is incremental: only the files that changed
+    since the previous collection are fetched, and only the new tail of the
+    appended logs. The content of unchanged files is hard linked from a
+    content addressed store shared by all the collections.
+
+    With --full, all the artifacts of each VM are fetched, compressed on the
+    VM, ignoring the previous collections.
+    """
+)
+
+
+class ContentStore(object):
+    """
+    Stores file contents by their sha1, so identical files of different
+    collections are kept once
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def blob_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def add(self, src_path, prefix_digest=None):
+        """
+        Move the given file into the store
+
+        Args:
+            src_path (str): file to add, it is moved
+            prefix_digest (str): digest of content to prepend to the file
+
+        Returns:
+            tuple of str, int: digest and size of the stored content
+        """
+        sha1 = hashlib.sha1()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as dst:
+            sources = [src_path]
+            if prefix_digest is not None:
+                sources.insert(0, self.blob_path(prefix_digest))
+            for source in sources:
+                with open(source, 'rb') as src:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                        sha1.update(chunk)
+                        size += len(chunk)
+                        dst.write(chunk)
+        os.unlink(src_path)
+
+        digest = sha1.hexdigest()
+        blob_path = self.blob_path(digest)
+        if os.path.exists(blob_path):
+            os.unlink(tmp_path)
+        else:
+            _makedirs(os.path.dirname(blob_path))
+            os.rename(tmp_path, blob_path)
+        return digest, size
+
+    def tail_matches(self, digest, size, tail_path):
+        """
+        Returns:
+            bool: True if the first ``TAIL_OVERLAP`` bytes of the fetched tail
+                are the last bytes of the stored content
+        """
+        overlap = min(TAIL_OVERLAP, size)
+        with open(self.blob_path(digest), 'rb') as stored:
+            stored.seek(size - overlap)
+            expected = stored.read(overlap)
+        with open(tail_path, 'rb') as tail:
+            return tail.read(overlap) == expected
+
+    def strip_overlap(self, size, tail_path):
+        overlap = min(TAIL_OVERLAP, size)
+        stripped_path = tail_path + '.new'
+        with open(tail_path, 'rb') as src, open(stripped_path, 'wb') as dst:
+            src.seek(overlap)
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.rename(stripped_path, tail_path)
+
+    def link(self, digest, dest_path):
+        _makedirs(os.path.dirname(dest_path))
+        try:
+            os.link(self.blob_path(digest), dest_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), dest_path)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+def _local_path(artifact, remote_path):
+    # Same layout as 'lago collect'
+    local_path = artifact.replace('/', '_')
+    if remote_path != artifact:
+        local_path = os.path.join(
+            local_path, os.path.relpath(remote_path, artifact)
+        )
+    return local_path
+
+
+def _list_remote_files(vm, artifacts):
+    """
+    Returns:
+        dict of str: tuple: (artifact, size, mtime) of each remote file
+    """
+    command = 'find {} -xdev -type f -printf "%s %T@ %p\\0" 2>/dev/null'
+    result = vm.ssh(
+        ['bash', '-c', shlex_quote(command.format(
+            ' '.join(shlex_quote(path) for path in artifacts)
+        ))],
+        show_output=False,
+    )
+    files = {}
+    for entry in result.out.split('\0'):
+        if not entry:
+            continue
+        size, mtime, path = entry.split(' ', 2)
+        artifact = _artifact_of(path, artifacts)
+        if artifact is not None:
+            files[path] = (artifact, int(size), mtime)
+    return files
+
+
+def _fetch_batches(fetches):
+    """
+    Args:
+        fetches (list of tuple): index, remote path, offset and expected
+            length of each fetch
+
+    Yields:
+        list of tuple: index, remote path and offset of each fetch of a
+            batch of at most ``FETCH_BATCH_SIZE`` bytes (or of a single fetch)
+    """
+    batch = []
+    batch_size = 0
+    for index, path, offset, length in fetches:
+        if batch and batch_size + length > FETCH_BATCH_SIZE:
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append((index, path, offset))
+        batch_size += length
+    if batch:
+        yield batch
+
+
+def _fetch_batch(vm, batch, dest_dir):
+    # A line for each file, with its index and its compressed content read
+    # in place, nothing is written on the VM
+    lines = [
+        'printf "{index} "; {{ tail -c +{offset} -- {path} 2>/dev/null || :; }}'
+        ' | gzip -c | base64 -w0; echo'.format(
+            index=index, offset=offset + 1, path=shlex_quote(path)
+        )
+        for index, path, offset in batch
+    ]
+    result = vm.ssh(
+        ['bash', '-s'], data='\n'.join(lines) + '\n', show_output=False
+    )
+    if result.code != 0:
+        raise RuntimeError(
+            'Failed to fetch from {}: {}'.format(vm.name(), result.err)
+        )
+
+    transferred = 0
+    for line in result.out.splitlines():
+        if not line.strip():
+            continue
+        index, data = line.split(' ', 1)
+        with open(os.path.join(dest_dir, str(int(index))), 'wb') as dst:
+            dst.write(
+                zlib.decompress(base64.b64decode(data), 16 + zlib.MAX_WBITS)
+            )
+        transferred += len(data)
+    return transferred
+
+
+def _copy_file(vm, path, dest):
+    try:
+        vm.copy_from(path, dest, recursive=False)
+    except Exception as err:
+        # Same as a file that is gone by the time it is fetched
+        print('{}: failed to copy {}: {}'.format(vm.name(), path, err))
+        open(dest, 'wb').close()
+    return os.path.getsize(dest)
+
+
+def _fetch(vm, fetches, dest_dir):
+    """
+    Fetch the given files, or their tails, streamed from the files in place
+    in batches of at most ``FETCH_BATCH_SIZE`` bytes (or of a single tail).
+    Whole files bigger than that are copied on their own.
+
+    Args:
+        vm (lago.plugins.vm.VMPlugin): VM to fetch from
+        fetches (list of tuple): remote path, offset to fetch from (0 to
+            fetch the whole file) and expected length of each fetch
+        dest_dir (str): local directory to put the fetched files in, named by
+            their index in ``fetches``
+
+    Returns:
+        int: number of bytes transferred
+    """
+    transferred = 0
+    batched = []
+    for index, (path, offset, length) in enumerate(fetches):
+        if offset == 0 and length > FETCH_BATCH_SIZE:
+            transferred += _copy_file(
+                vm, path, os.path.join(dest_dir, str(index))
+            )
+        else:
+            batched.append((index, path, offset, length))
+
+    for batch in _fetch_batches(batched):
+        transferred += _fetch_batch(vm, batch, dest_dir)
+    return transferred
+
+
+def collect_vm(vm, output_path, store, state_path):
+    """
+    Collect the artifacts of a single VM
+
+    Args:
+        vm (lago.plugins.vm.VMPlugin): VM to collect from
+        output_path (str): directory to collect the artifacts into
+        store (ContentStore): store of the collected contents
+        state_path (str): file with the state of the previous collection
+    """
+    artifacts = vm.spec.get('artifacts', [])
+    if not artifacts:
+        return
+
+    previous = {}
+    if os.path.exists(state_path):
+        with open(state_path) as state_file:
+            previous = json.load(state_file)
+
+    files = _list_remote_files(vm, artifacts)
+    state = {}
+    fetches = []
+    tails = set()
+    for path, (artifact, size, mtime) in six.iteritems(files):
+        known = previous.get(path)
+        if known and known['mtime'] == mtime and known['size'] == size:
+            state[path] = known
+        elif (
+            known and size > known['size'] and
+            path.startswith(APPEND_ONLY_PREFIXES)
+        ):
+            offset = max(known['size'] - TAIL_OVERLAP, 0)
+            fetches.append((path, offset, size - offset))
+            tails.add(path)
+        else:
+            fetches.append((path, 0, size))
+
+    tmp_dir = tempfile.mkdtemp(dir=store.path)
+    try:
+        refetches = []
+        if fetches:
+            _fetch(vm, fetches, tmp_dir)
+        for index, (path, _, _) in enumerate(fetches):
+            fetched = os.path.join(tmp_dir, str(index))
+            prefix_digest = None
+            if path in tails:
+                known = previous[path]
+                if not store.tail_matches(
+                    known['digest'], known['size'], fetched
+                ):
+                    refetches.append((path, 0, files[path][1]))
+                    continue
+                store.strip_overlap(known['size'], fetched)
+                prefix_digest = known['digest']
+            digest, size = store.add(fetched, prefix_digest)
+            state[path] = {
+                'mtime': files[path][2], 'size': size, 'digest': digest,
+            }
+
+        if refetches:
+            _fetch(vm, refetches, tmp_dir)
+        for index, (path, _, _) in enumerate(refetches):
+            digest, size = store.add(os.path.join(tmp_dir, str(index)))
+            state[path] = {
+                'mtime': files[path][2], 'size': size, 'digest': digest,
+            }
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    vm_output = os.path.join(output_path, vm.name())
+    for path, entry in six.iteritems(state):
+        store.link(
+            entry['digest'],
+            os.path.join(vm_output, _local_path(files[path][0], path)),
+        )
+
+    with open(state_path + '.new', 'w') as state_file:
+        json.dump(state, state_file)
+    os.rename(state_path + '.new', state_path)
+    print(
+        '{}: {} files, {} fetched'.format(
+            vm.name(), len(state), len(fetches)
+        )
+    )
+
+
+def _artifact_of(path, artifacts):
+    return next(
+        (a for a in artifacts if path == a or
+         path.startswith(a.rstrip('/') + '/')),
+        None,
+    )
+
+
+def fetch_vm(vm, output_path):
+    """
+    Collect all the artifacts of a single VM, compressed on the VM and
+    fetched in batches, without the state of the previous collections
+
+    Args:
+        vm (lago.plugins.vm.VMPlugin): VM to collect from
+        output_path (str): directory to collect the artifacts into
+
+    Returns:
+        dict: number of files, transferred bytes and seconds it took
+    """
+    artifacts = vm.spec.get('artifacts', [])
+    stats = {'files': 0, 'bytes': 0, 'seconds': 0}
+    if not artifacts:
+        return stats
+
+    start = time.time()
+    vm_output = os.path.join(output_path, vm.name())
+    files = sorted(six.iteritems(_list_remote_files(vm, artifacts)))
+    tmp_dir = tempfile.mkdtemp(dir=output_path, prefix='.fetch-')
+    try:
+        stats['bytes'] = _fetch(
+            vm, [(path, 0, size) for path, (_, size, _) in files], tmp_dir
+        )
+        for index, (path, (artifact, _, _)) in enumerate(files):
+            local_path = os.path.join(vm_output, _local_path(artifact, path))
+            _makedirs(os.path.dirname(local_path))
+            os.rename(os.path.join(tmp_dir, str(index)), local_path)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    stats['files'] = len(files)
+    stats['seconds'] = time.time() - start
+    print(
+        '{}: {files} files, {bytes} bytes in {seconds:.1f}s'.format(
+            vm.name(), **stats
+        )
+    )
+    return stats
+
+
+def fetch_artifacts(prefix_path, output_path):
+    prefix = sdk.load_env(prefix_path)
+    _makedirs(output_path)
+    vms = [vm for vm in six.itervalues(prefix.get_vms()) if vm.running()]
+
+    def _fetch_all(vm):
+        try:
+            fetch_vm(vm, output_path)
+        except Exception as err:
+            print(
+                '{}: fetching failed ({}), copying the artifacts'.format(
+                    vm.name(), err
+                )
+            )
+            shutil.rmtree(
+                os.path.join(output_path, vm.name()), ignore_errors=True
+            )
+            vm.collect_artifacts(
+                os.path.join(output_path, vm.name()), ignore_nopath=True
+            )
+
+    utils.invoke_in_parallel(_fetch_all, vms)
+
+
+def collect_artifacts(prefix_path, output_path, state_path=None):
+    prefix = sdk.load_env(prefix_path)
+    state_path = state_path or os.path.join(
+        prefix_path, 'current', 'collect-state'
+    )
+    store = ContentStore(os.path.join(state_path, 'store'))
+    _makedirs(store.path)
+    _makedirs(output_path)
+
+    vms = [vm for vm in six.itervalues(prefix.get_vms()) if vm.running()]
+
+    def _collect(vm):
+        collect_vm(
+            vm,
+            output_path,
+            store,
+            os.path.join(state_path, '{}.json'.format(vm.name())),
+        )
+
+    utils.invoke_in_parallel(_collect, vms)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('prefix_path', help='path to a lago prefix')
+    parser.add_argument(
+        'output_path', help='directory to collect the artifacts into'
+    )
+    parser.add_argument(
+        'state_path',
+        nargs='?',
+        help=(
+            'directory of the store and of the state of the previous '
+            'collection, PREFIX_PATH/current/collect-state by default'
+        ),
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='fetch all the artifacts instead of collecting incrementally',
+    )
+    args = parser.parse_args()
+
+    if args.full:
+        fetch_artifacts(args.prefix_path, args.output_path)
+    else:
+        collect_artifacts(
+            args.prefix_path, args.output_path, args.state_path
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,636 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import contextlib
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import time
+
+from textwrap import dedent
+
+import six
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib.parse import parse_qs
+from six.moves.urllib.request import Request
+from six.moves.urllib.request import urlopen
+
+DESCRIPTION = dedent(
+    """
+    Local mirror of the images of a Glance server.
+
+    'serve' listens on the gateway of the management network of a lago
+    prefix, and answers the subset of the Glance v1 API the engine uses to
+    list, inspect and import images. Images are kept in a content
+    addressed cache shared by all the runs on the machine: the first
+    download of an image is streamed from the upstream server to the
+    engine and into the cache at the same time, later ones are served from
+    the cache, with no access to the upstream server. The list of images is
+    served from the cache too when the upstream server can't be reached.
+
+    The hits, misses and transfer rates of the run are appended to
+    CACHE_DIR/stats.jsonl when the mirror is terminated.
+    """
+)
+
+UPSTREAM_URL = 'http://glance.ovirt.org:9292/'
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/ost/images')
+DEFAULT_PORT = 9292
+#: Seconds the list of upstream images is served from the cache
+LISTING_TTL = 300
+#: Seconds to wait for the upstream server
+UPSTREAM_TIMEOUT = 30
+#: Max images returned by the upstream server in a single listing
+UPSTREAM_PAGE_SIZE = 100
+CHUNK_SIZE = 1024 * 1024
+
+CATALOG_FILE = 'catalog.json'
+STATS_FILE = 'stats.jsonl'
+
+_IMAGE_PATH = re.compile(r'^/v1/images/([^/]+)$')
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _rate(size, seconds):
+    return '%.1f MB/s' % (size / 2.0 ** 20 / seconds) if seconds else '-'
+
+
+class Stats(object):
+
+    COUNTERS = (
+        'hits', 'misses', 'passthrough', 'served_bytes', 'served_seconds',
+        'fetched_bytes', 'fetched_seconds', 'listings', 'stale_listings',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in six.iteritems(counters):
+                self._counters[name] += value
+
+    def summary(self):
+        with self._lock:
+            summary = dict(self._counters)
+        summary['served_rate'] = _rate(
+            summary['served_bytes'], summary['served_seconds']
+        )
+        summary['fetched_rate'] = _rate(
+            summary['fetched_bytes'], summary['fetched_seconds']
+        )
+        return summary
+
+
+class ImageCache(object):
+    """
+    Images of the upstream server, stored by the sha256 of their content
+    under CACHE_DIR/sha256, and a catalog of the upstream images, the
+    metadata of each and the blob of the ones that were downloaded.
+
+    The catalog is shared by the mirrors running at the same time, and
+    is only changed with its lock file held.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._blobs_dir = os.path.join(cache_dir, 'sha256')
+        self._tmp_dir = os.path.join(cache_dir, 'tmp')
+        self._catalog_path = os.path.join(cache_dir, CATALOG_FILE)
+        _makedirs(self._blobs_dir)
+        _makedirs(self._tmp_dir)
+
+    @contextlib.contextmanager
+    def _locked_catalog(self):
+        with open(self._catalog_path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                catalog = self._read_catalog()
+                yield catalog
+                tmp_path = self._catalog_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(catalog, f, indent=1, sort_keys=True)
+                os.rename(tmp_path, self._catalog_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_catalog(self):
+        try:
+            with open(self._catalog_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {'images': {}, 'blobs': {}, 'listed_at': 0}
+
+    def images(self):
+        """
+        Returns:
+            tuple of list of dict, float: the metadata of the upstream images
+                in the order they were listed, and when they were listed
+        """
+        catalog = self._read_catalog()
+        images = sorted(
+            six.itervalues(catalog['images']),
+            key=lambda image: image.get('_order', 0)
+        )
+        return images, catalog['listed_at']
+
+    def image(self, image_id):
+        return self._read_catalog()['images'].get(image_id)
+
+    def set_images(self, images):
+        with self._locked_catalog() as catalog:
+            catalog['images'] = {}
+            for order, image in enumerate(images):
+                catalog['images'][image['id']] = dict(image, _order=order)
+            catalog['listed_at'] = time.time()
+
+    def blob_path(self, image_id):
+        """
+        Returns:
+            str: path of the content of the image, None if it wasn't
+                downloaded yet
+        """
+        digest = self._read_catalog()['blobs'].get(image_id)
+        if digest is None:
+            return None
+        path = os.path.join(self._blobs_dir, digest)
+        return path if os.path.exists(path) else None
+
+    @contextlib.contextmanager
+    def writer(self, image_id, checksum=None):
+        """
+        Yields a function writing the next chunk of the content of the
+        image. The content is added to the cache if the block exits with
+        no error and the content matches the md5 checksum of the image.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                def write(chunk):
+                    f.write(chunk)
+                    md5.update(chunk)
+                    sha256.update(chunk)
+                yield write
+            if checksum and md5.hexdigest() != checksum:
+                raise RuntimeError(
+                    'Image {} has checksum {} instead of {}'.format(
+                        image_id, md5.hexdigest(), checksum
+                    )
+                )
+            digest = sha256.hexdigest()
+            os.rename(tmp_path, os.path.join(self._blobs_dir, digest))
+            tmp_path = None
+            with self._locked_catalog() as catalog:
+                catalog['blobs'][image_id] = digest
+        finally:
+            if tmp_path is not None:
+                os.unlink(tmp_path)
+
+    def prune(self):
+        """
+        Removes the images that are no longer listed upstream, and the
+        downloads that were cut short.
+        """
+        with self._locked_catalog() as catalog:
+            catalog['blobs'] = dict(
+                (image_id, digest)
+                for image_id, digest in six.iteritems(catalog['blobs'])
+                if image_id in catalog['images']
+            )
+            used = set(six.itervalues(catalog['blobs']))
+            for digest in os.listdir(self._blobs_dir):
+                if digest not in used:
+                    print('Removing {}'.format(digest))
+                    os.unlink(os.path.join(self._blobs_dir, digest))
+            shutil.rmtree(self._tmp_dir)
+            _makedirs(self._tmp_dir)
+
+    def record_stats(self, summary):
+        with open(os.path.join(self.cache_dir, STATS_FILE), 'a') as f:
+            f.write(json.dumps(dict(summary, time=time.time())) + '\n')
+
+
+class Upstream(object):
+
+    def __init__(self, url):
+        self.url = url.rstrip('/') + '/v1'
+
+    def open(self, path, method='GET', headers=None):
+        request = Request(self.url + path, headers=headers or {})
+        request.get_method = lambda: method
+        return urlopen(request, timeout=UPSTREAM_TIMEOUT)
+
+    def list_images(self):
+        images = []
+        marker = None
+        while True:
+            query = '?limit={}'.format(UPSTREAM_PAGE_SIZE)
+            if marker is not None:
+                query += '&marker={}'.format(marker)
+            response = self.open('/images/detail' + query)
+            try:
+                page = json.loads(response.read().decode('utf-8'))['images']
+            finally:
+                response.close()
+            images.extend(page)
+            if len(page) < UPSTREAM_PAGE_SIZE:
+                return images
+            marker = page[-1]['id']
+
+
+def image_headers(image):
+    """
+    Returns:
+        list of tuple: the headers describing the image in the responses of
+            Glance v1 to HEAD and GET of /v1/images/ID
+    """
+    headers = []
+    for key, value in sorted(six.iteritems(image)):
+        if key.startswith('_') or value is None:
+            continue
+        if key == 'properties':
+            headers.extend(
+                ('x-image-meta-property-{}'.format(name), str(prop))
+                for name, prop in sorted(six.iteritems(value))
+            )
+        else:
+            headers.append(('x-image-meta-{}'.format(key), str(value)))
+    return headers
+
+
+# Copied as _parse_range to network-suite-master/repo_server.py, which can't
+# import this script, keep them in sync
+def parse_range(header, size):
+    """
+    Returns:
+        tuple of int: first and last byte of the single range requested by
+            the header, None if the whole content should be sent
+
+    Raises:
+        ValueError: if the range can't be satisfied
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        first, last = max(0, size - int(last)), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError('Range {} is out of {} bytes'.format(header, size))
+    return first, last
+
+
+class GlanceMirrorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ost-glance-mirror'
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def log_message(self, fmt, *args):
+        print('{} {}'.format(self.address_string(), fmt % args))
+
+    def _handle(self, send_body):
+        # the engine appends /v1 to the url of the provider, that usually
+        # ends with a slash, so the path isn't split with urlsplit, which
+        # takes '//v1' for a host
+        path, _, query = self.path.partition('?')
+        path = re.sub('/+', '/', path).rstrip('/')
+        if path in ('/v1/images', '/v1/images/detail'):
+            self._send_listing(parse_qs(query), send_body)
+            return
+        match = _IMAGE_PATH.match(path)
+        if match is None:
+            self.send_error(404)
+            return
+        image = self.server.mirror.image(match.group(1))
+        if image is None:
+            self.send_error(404)
+        elif send_body:
+            self._send_image(image)
+        else:
+            self._send_headers(200, image_headers(image))
+
+    def _send_headers(self, code, headers, length=0):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+    def _send_listing(self, query, send_body):
+        images = [
+            dict((k, v) for k, v in six.iteritems(image)
+                 if not k.startswith('_'))
+            for image in self.server.mirror.images()
+        ]
+        if 'name' in query:
+            images = [i for i in images if i.get('name') in query['name']]
+        if 'marker' in query:
+            ids = [image['id'] for image in images]
+            marker = query['marker'][0]
+            images = images[ids.index(marker) + 1:] if marker in ids else []
+        if 'limit' in query:
+            images = images[:int(query['limit'][0])]
+        body = json.dumps({'images': images}).encode('utf-8')
+        self._send_headers(
+            200, [('Content-Type', 'application/json')], len(body)
+        )
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_image(self, image):
+        mirror = self.server.mirror
+        start = time.time()
+        path = mirror.cache.blob_path(image['id'])
+        if path is not None:
+            sent, source = self._send_cached(image, path), 'hit'
+            mirror.stats.add(hits=1)
+        else:
+            sent, source = self._send_upstream(image)
+        seconds = time.time() - start
+        mirror.stats.add(served_bytes=sent, served_seconds=seconds)
+        print('{} {}: sent {} bytes in {:.1f}s, {}'.format(
+            image['id'], source, sent, seconds, _rate(sent, seconds)
+        ))
+
+    def _send_cached(self, image, path):
+        size = os.path.getsize(path)
+        headers = image_headers(image) + [
+            ('Content-Type', 'application/octet-stream'),
+            ('Accept-Ranges', 'bytes'),
+        ]
+        try:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        except ValueError:
+            headers.append(('Content-Range', 'bytes */{}'.format(size)))
+            self._send_headers(416, headers)
+            return 0
+        if byte_range is None:
+            first, last = 0, size - 1
+            self._send_headers(200, headers, size)
+        else:
+            first, last = byte_range
+            headers.append(('Content-Range', 'bytes {}-{}/{}'.format(
+                first, last, size
+            )))
+            self._send_headers(206, headers, last - first + 1)
+
+        remaining = last - first + 1
+        with open(path, 'rb') as f:
+            f.seek(first)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+        return last - first + 1 - remaining
+
+    def _send_upstream(self, image):
+        """
+        Sends the image as read from the upstream server, and adds it to
+        the cache, unless only a range of it was requested or it's already
+        being downloaded by another request.
+        """
+        mirror = self.server.mirror
+        headers = {}
+        if self.headers.get('Range'):
+            headers['Range'] = self.headers.get('Range')
+        try:
+            response = mirror.upstream.open(
+                '/images/{}'.format(image['id']), headers=headers
+            )
+        except IOError as e:
+            self.send_error(getattr(e, 'code', None) or 502, str(e))
+            return 0, 'error'
+        try:
+            self.send_response(response.getcode())
+            for name, value in response.info().items():
+                if name.lower() not in ('connection', 'transfer-encoding'):
+                    self.send_header(name, value)
+            if response.info().get('Content-Length') is None:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+
+            with mirror.downloading(image['id'], not headers) as fetching:
+                if not fetching:
+                    mirror.stats.add(passthrough=1)
+                    return self._copy(response, [self.wfile.write]), 'upstream'
+
+                mirror.stats.add(misses=1)
+                start = time.time()
+                sent = [0]
+                try:
+                    with mirror.cache.writer(
+                            image['id'], image.get('checksum')) as write:
+                        sent[0] = self._copy(
+                            response, [self.wfile.write, write]
+                        )
+                except RuntimeError as e:
+                    print('Not caching the image: {}'.format(e))
+                mirror.stats.add(
+                    fetched_bytes=sent[0], fetched_seconds=time.time() - start
+                )
+                return sent[0], 'miss'
+        finally:
+            response.close()
+
+    def _copy(self, response, writers):
+        copied = 0
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                return copied
+            for write in writers:
+                write(chunk)
+            copied += len(chunk)
+
+
+class GlanceMirror(object):
+
+    def __init__(self, cache, upstream):
+        self.cache = cache
+        self.upstream = upstream
+        self.stats = Stats()
+        self._lock = threading.Lock()
+        self._downloading = set()
+
+    def images(self):
+        images, listed_at = self.cache.images()
+        if time.time() - listed_at < LISTING_TTL:
+            return images
+        try:
+            images = self.upstream.list_images()
+        except (IOError, ValueError, KeyError) as e:
+            print('Listing the upstream images failed, serving the last '
+                  'listing: {}'.format(e))
+            self.stats.add(stale_listings=1)
+            return images
+        self.stats.add(listings=1)
+        self.cache.set_images(images)
+        return images
+
+    def image(self, image_id):
+        image = self.cache.image(image_id)
+        if image is None:
+            image = next(
+                (i for i in self.images() if i['id'] == image_id), None
+            )
+        return image
+
+    @contextlib.contextmanager
+    def downloading(self, image_id, cacheable):
+        """
+        Yields True if the caller should add the image to the cache, as
+        nobody else is downloading it.
+        """
+        with self._lock:
+            fetching = cacheable and image_id not in self._downloading
+            if fetching:
+                self._downloading.add(image_id)
+        try:
+            yield fetching
+        finally:
+            if fetching:
+                with self._lock:
+                    self._downloading.discard(image_id)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def management_gateway(prefix_path):
+    from lago import sdk
+
+    prefix = sdk.load_env(prefix_path)
+    mgmt_net = next(
+        net for net in prefix.get_nets().values() if net.is_management()
+    )
+    return mgmt_net.gw()
+
+
+def serve(prefix_path, cache_dir, upstream_url, port, url_file=None):
+    mirror = GlanceMirror(ImageCache(cache_dir), Upstream(upstream_url))
+    server = ThreadingHTTPServer(
+        (management_gateway(prefix_path), port), GlanceMirrorHandler
+    )
+    server.mirror = mirror
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    thread = threading.Thread(target=server.serve_forever, name='mirror')
+    thread.daemon = True
+    thread.start()
+
+    url = 'http://{}:{}/'.format(*server.server_address[:2])
+    print('Mirroring {} at {}'.format(upstream_url, url))
+    if url_file:
+        with open(url_file + '.tmp', 'w') as f:
+            f.write(url + '\n')
+        os.rename(url_file + '.tmp', url_file)
+
+    # wait with a timeout, so the signals are handled
+    while not stop.is_set():
+        stop.wait(1)
+    server.shutdown()
+    server.server_close()
+
+    summary = mirror.stats.summary()
+    mirror.cache.record_stats(summary)
+    print('Image cache: {}'.format(
+        ', '.join('{}={}'.format(k, v) for k, v in sorted(summary.items()))
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=os.environ.get('OST_IMAGE_CACHE', DEFAULT_CACHE_DIR),
+        help='directory of the cached images, shared by all the runs',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    serve_parser = subparsers.add_parser(
+        'serve', help='serve the images to the VMs of a lago prefix'
+    )
+    serve_parser.add_argument('prefix_path', help='path to a lago prefix')
+    serve_parser.add_argument(
+        '--upstream', default=UPSTREAM_URL, help='url of the Glance server'
+    )
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument(
+        '--url-file', help='file to write the url of the mirror into'
+    )
+    subparsers.add_parser(
+        'prune', help='remove the images that are no longer upstream'
+    )
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.prefix_path, args.cache_dir, args.upstream, args.port,
+              args.url_file)
+    else:
+        ImageCache(args.cache_dir).prune()
+
+
+if __name__ == '__main__':
+    main()
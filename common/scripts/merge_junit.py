@@ -0,0 +1,100 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import xml.etree.ElementTree as ET
+
+from textwrap import dedent
+
+
+DESCRIPTION = dedent(
+    """
+    Merges the junit xml files of pytest runs that ran at the same time
+    into a single test suite. The counters are summed up, and the time of
+    the suite is the time of the longest run, as the runs overlapped.
+    Missing input files, of runs that didn't get to write one, are counted
+    as one error each.
+    """
+)
+COUNTERS = ('tests', 'errors', 'failures', 'skipped')
+
+
+def _suites(path):
+    root = ET.parse(path).getroot()
+    if root.tag == 'testsuites':
+        return list(root.iter('testsuite'))
+    return [root]
+
+
+def _missing_run_case(path):
+    case = ET.Element(
+        'testcase', classname='merge_junit', name=path, time='0'
+    )
+    error = ET.SubElement(case, 'error', message='no junit xml was written')
+    error.text = 'The run writing {} did not finish'.format(path)
+    return case
+
+
+def merge(paths, name):
+    merged = ET.Element('testsuite', name=name)
+    counts = dict.fromkeys(COUNTERS, 0)
+    duration = 0.0
+
+    for path in paths:
+        try:
+            suites = _suites(path)
+        except (IOError, ET.ParseError):
+            merged.append(_missing_run_case(path))
+            counts['tests'] += 1
+            counts['errors'] += 1
+            continue
+
+        for suite in suites:
+            for counter in COUNTERS:
+                counts[counter] += int(suite.get(counter, 0))
+            duration = max(duration, float(suite.get('time', 0)))
+            for child in suite:
+                merged.append(child)
+
+    for counter in COUNTERS:
+        merged.set(counter, str(counts[counter]))
+    merged.set('time', '%.3f' % duration)
+    return ET.ElementTree(merged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        '--name', default='pytest', help='Name of the merged test suite'
+    )
+    parser.add_argument('output', help='Path of the merged junit xml')
+    parser.add_argument('inputs', nargs='+', help='Junit xml files to merge')
+    args = parser.parse_args()
+
+    merge(args.inputs, args.name).write(
+        args.output, encoding='utf-8', xml_declaration=True
+    )
+
+
+if __name__ == '__main__':
+    main()
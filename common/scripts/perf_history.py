@@ -0,0 +1,411 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from textwrap import dedent
+
+
+DESCRIPTION = dedent(
+    """
+    Keeps the durations of the tests and profiled spans of every run in a
+    SQLite database, to catch the runs that got slower than the previous
+    ones.
+
+    'ingest' stores a run: the tests in its junit xml files, keyed by the
+    scenario the file is of, and the total time of the spans recorded by
+    ost_utils.profiler, keyed by their stack. SSH commands are counted
+    under the host they ran on rather than under the command.
+
+    'compare' checks the tests and spans of a run against the same ones in
+    the previous runs of the suite. A duration is a regression if it's
+    both THRESHOLD slower than the median of the baseline, and more than
+    Z_SCORE robust standard deviations (from the median absolute deviation)
+    above it, so that steps whose duration is noisy don't get flagged.
+    """
+)
+#: Environment variable with the path of the database
+DB_ENV = 'OST_PERF_DB'
+DEFAULT_DB = os.path.join(
+    os.path.expanduser('~'), '.cache', 'ost', 'perf_history.sqlite'
+)
+JUNIT_SUFFIX = '.junit.xml'
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+#: Span categories stored for the runs
+SPAN_CATEGORIES = ('scenario', 'test', 'task', 'wait', 'ssh')
+
+#: Defaults of the comparison
+BASELINE_RUNS = 10
+MIN_BASELINE_RUNS = 3
+THRESHOLD = 0.2
+Z_SCORE = 3.0
+#: Seconds under which a slowdown is ignored, whatever its ratio
+MIN_DELTA = 2.0
+#: Scale of the median absolute deviation to a standard deviation
+MAD_SCALE = 1.4826
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    suite TEXT NOT NULL,
+    engine_version TEXT,
+    label TEXT,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    kind TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_run ON timings (run_id);
+CREATE INDEX IF NOT EXISTS runs_suite ON runs (suite, id);
+"""
+
+Timing = collections.namedtuple(
+    'Timing', ['kind', 'scenario', 'name', 'duration', 'status']
+)
+
+
+def connect(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    db = sqlite3.connect(path, timeout=60)
+    db.executescript(SCHEMA)
+    return db
+
+
+def _scenario_of(junit_path):
+    name = os.path.basename(junit_path)
+    if name.endswith(JUNIT_SUFFIX):
+        name = name[:-len(JUNIT_SUFFIX)]
+    return name
+
+
+def _case_status(case):
+    if case.find('failure') is not None or case.find('error') is not None:
+        return FAILED
+    if case.find('skipped') is not None:
+        return SKIPPED
+    return PASSED
+
+
+def read_junit(path):
+    """
+    Returns:
+        list of Timing: the test cases in the junit xml file
+    """
+    scenario = _scenario_of(path)
+    timings = []
+    for case in ET.parse(path).getroot().iter('testcase'):
+        name = case.get('name', '')
+        if case.get('classname'):
+            name = '%s.%s' % (case.get('classname'), name)
+        timings.append(Timing(
+            'test', scenario, name, float(case.get('time') or 0),
+            _case_status(case),
+        ))
+    return timings
+
+
+def read_spans(path):
+    """
+    Returns:
+        tuple of list of Timing, float: the total time of the spans by
+            stack, and the start time of the first span
+    """
+    spans = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            spans[span['id']] = span
+
+    def stack(span):
+        names = []
+        scenario = ''
+        while span is not None:
+            if span['cat'] == 'scenario':
+                scenario = span['name']
+            elif span['cat'] == 'ssh':
+                names.append('ssh %s' % (span.get('args') or {}).get(
+                    'host', ''
+                ))
+            else:
+                names.append(span['name'])
+            span = spans.get(span.get('parent'))
+        return scenario, ';'.join(reversed(names))
+
+    totals = collections.defaultdict(float)
+    for span in spans.values():
+        if span['cat'] not in SPAN_CATEGORIES:
+            continue
+        scenario, name = stack(span)
+        totals[(span['cat'], scenario, name)] += span['end'] - span['start']
+
+    timings = [
+        Timing('span:%s' % category, scenario, name, duration, PASSED)
+        for (category, scenario, name), duration in sorted(totals.items())
+    ]
+    started = min([s['start'] for s in spans.values()] or [time.time()])
+    return timings, started
+
+
+def engine_version_of(prefix_path):
+    from lago import sdk
+
+    prefix = sdk.load_env(prefix_path)
+    for name, vm in sorted(prefix.get_vms().items()):
+        if name.endswith('engine') and vm.running():
+            result = vm.ssh(
+                ['rpm', '-q', '--qf', '%{VERSION}-%{RELEASE}', 'ovirt-engine']
+            )
+            if result.code == 0:
+                return result.out.strip()
+    return None
+
+
+def ingest(db, suite, junit_paths, spans_path=None, engine_version=None,
+           label=None):
+    """
+    Returns:
+        int: id of the stored run
+    """
+    timings = []
+    started = time.time()
+    for path in junit_paths:
+        try:
+            timings.extend(read_junit(path))
+        except (IOError, ET.ParseError) as err:
+            print('Skipping %s: %s' % (path, err))
+    if spans_path and os.path.exists(spans_path):
+        span_timings, started = read_spans(spans_path)
+        timings.extend(span_timings)
+
+    with db:
+        cursor = db.execute(
+            'INSERT INTO runs (suite, engine_version, label, started) '
+            'VALUES (?, ?, ?, ?)',
+            (suite, engine_version, label, started),
+        )
+        run_id = cursor.lastrowid
+        db.executemany(
+            'INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?)',
+            [(run_id,) + tuple(timing) for timing in timings],
+        )
+    return run_id
+
+
+def _timings(db, run_ids):
+    marks = ', '.join('?' * len(run_ids))
+    return db.execute(
+        'SELECT run_id, kind, scenario, name, duration FROM timings '
+        'WHERE status = ? AND run_id IN (%s)' % marks,
+        [PASSED] + list(run_ids),
+    ).fetchall()
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def is_regression(duration, baseline, threshold=THRESHOLD, z_score=Z_SCORE,
+                  min_delta=MIN_DELTA):
+    """
+    Returns:
+        tuple of bool, float, float: whether the duration is a regression
+            against the baseline durations, the median of the baseline and
+            the robust z-score of the duration
+    """
+    median = _median(baseline)
+    deviation = MAD_SCALE * _median([abs(d - median) for d in baseline])
+    # identical baseline durations would make any change significant
+    deviation = max(deviation, 0.05 * median, 0.1)
+    z = (duration - median) / deviation
+    regression = (
+        duration - median >= min_delta and
+        duration >= median * (1 + threshold) and
+        z >= z_score
+    )
+    return regression, median, z
+
+
+def compare(db, suite, run_id=None, baseline_runs=BASELINE_RUNS,
+            min_baseline_runs=MIN_BASELINE_RUNS, threshold=THRESHOLD,
+            z_score=Z_SCORE, min_delta=MIN_DELTA):
+    """
+    Returns:
+        list of tuple: (kind, scenario, name, duration, median, z) of the
+            regressions of the run, the latest run of the suite by default,
+            the largest slowdown first
+    """
+    if run_id is None:
+        row = db.execute(
+            'SELECT MAX(id) FROM runs WHERE suite = ?', (suite,)
+        ).fetchone()
+        run_id = row[0]
+        if run_id is None:
+            raise RuntimeError('No runs of suite %s were stored' % suite)
+
+    baseline_ids = [
+        row[0] for row in db.execute(
+            'SELECT id FROM runs WHERE suite = ? AND id < ? '
+            'ORDER BY id DESC LIMIT ?',
+            (suite, run_id, baseline_runs),
+        )
+    ]
+    baselines = collections.defaultdict(list)
+    if baseline_ids:
+        for _, kind, scenario, name, duration in _timings(db, baseline_ids):
+            baselines[(kind, scenario, name)].append(duration)
+
+    regressions = []
+    for _, kind, scenario, name, duration in _timings(db, [run_id]):
+        baseline = baselines.get((kind, scenario, name), [])
+        if len(baseline) < min_baseline_runs:
+            continue
+        regression, median, z = is_regression(
+            duration, baseline, threshold, z_score, min_delta
+        )
+        if regression:
+            regressions.append((kind, scenario, name, duration, median, z))
+    regressions.sort(key=lambda r: r[4] - r[3])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--db', default=os.environ.get(DB_ENV, DEFAULT_DB),
+        help='Path of the database, $%s or %s by default' % (
+            DB_ENV, DEFAULT_DB
+        ),
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    ingest_parser = subparsers.add_parser('ingest', help='store a run')
+    ingest_parser.add_argument('--suite', required=True)
+    ingest_parser.add_argument(
+        '--spans', help='spans file written by ost_utils.profiler'
+    )
+    ingest_parser.add_argument('--engine-version')
+    ingest_parser.add_argument(
+        '--prefix',
+        help='lago prefix to get the engine version from, if not given',
+    )
+    ingest_parser.add_argument('--label', help='e.g. the CI build url')
+    ingest_parser.add_argument(
+        'junit', nargs='*', help='junit xml files of the scenarios, named '
+        '<scenario>%s' % JUNIT_SUFFIX
+    )
+
+    compare_parser = subparsers.add_parser(
+        'compare', help='find the regressions of a run'
+    )
+    compare_parser.add_argument('--suite', required=True)
+    compare_parser.add_argument(
+        '--run', type=int, help='id of the run, the latest by default'
+    )
+    compare_parser.add_argument(
+        '--baseline-runs', type=int, default=BASELINE_RUNS,
+        help='number of previous runs to compare with',
+    )
+    compare_parser.add_argument(
+        '--min-baseline-runs', type=int, default=MIN_BASELINE_RUNS,
+        help='number of previous durations needed to compare one',
+    )
+    compare_parser.add_argument(
+        '--threshold', type=float, default=THRESHOLD,
+        help='slowdown ratio over the baseline median',
+    )
+    compare_parser.add_argument(
+        '--z-score', type=float, default=Z_SCORE,
+        help='robust standard deviations over the baseline median',
+    )
+    compare_parser.add_argument(
+        '--min-delta', type=float, default=MIN_DELTA,
+        help='seconds of slowdown under which nothing is flagged',
+    )
+    compare_parser.add_argument(
+        '--fail', action='store_true',
+        help='exit with an error if there are regressions',
+    )
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command == 'ingest':
+        engine_version = args.engine_version
+        if engine_version is None and args.prefix:
+            try:
+                engine_version = engine_version_of(args.prefix)
+            except Exception as err:
+                print('Failed to get the engine version: %s' % err)
+        run_id = ingest(db, args.suite, args.junit, args.spans,
+                        engine_version, args.label)
+        print('Stored run %d of %s, engine %s' % (
+            run_id, args.suite, engine_version or 'unknown'
+        ))
+        return
+
+    regressions = compare(
+        db, args.suite, args.run, args.baseline_runs, args.min_baseline_runs,
+        args.threshold, args.z_score, args.min_delta,
+    )
+    if not regressions:
+        print('No performance regressions found')
+        return
+    print('Performance regressions:')
+    for kind, scenario, name, duration, median, z in regressions:
+        print('%8.1fs (median %.1fs, %s, z=%.1f) %s %s %s' % (
+            duration, median,
+            '%+.0f%%' % (100.0 * (duration - median) / median)
+            if median else 'new', z, kind, scenario, name,
+        ))
+    if args.fail:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
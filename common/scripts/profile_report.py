@@ -0,0 +1,274 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import os
+
+from textwrap import dedent
+
+
+DESCRIPTION = dedent(
+    """
+    Reports on the spans recorded by ost_utils.profiler during a run: the
+    log tasks, tests, waits and SSH commands, with the spans they ran in.
+
+    Writes into OUTPUT_DIR:
+      trace.json       the spans in the Chrome trace event format, to load
+                       in chrome://tracing or https://ui.perfetto.dev
+      profile.folded   the self time of the span stacks, in milliseconds,
+                       in the folded format of flamegraph.pl and speedscope
+      critical_path.tsv
+                       the chain of spans that set the duration of the run
+
+    The critical path starts from the span that ended last, and goes back
+    through the span that ended last before each one started, down into
+    the nested spans. The spans of it that took the most time are printed,
+    with the time per kind of span and per host.
+    """
+)
+CRITICAL_PATH_FILE = 'critical_path.tsv'
+FOLDED_FILE = 'profile.folded'
+TRACE_FILE = 'trace.json'
+ROOT_ID = 'run'
+TOP_SPANS = 15
+#: Seconds of the critical path under which a span isn't printed
+MIN_REPORTED = 0.05
+
+
+def read_spans(path):
+    """
+    Returns:
+        dict: the spans by their ids, spans of unknown parents are nested
+            under the root span, which covers the whole run
+    """
+    spans = collections.OrderedDict()
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                # a line may be cut short if a process was killed
+                continue
+            spans[span['id']] = span
+
+    root = {
+        'id': ROOT_ID,
+        'parent': None,
+        'name': 'run',
+        'cat': 'run',
+        'pid': 0,
+        'tid': 0,
+        'thread': '',
+        'start': min([s['start'] for s in spans.values()] or [0]),
+        'end': max([s['end'] for s in spans.values()] or [0]),
+        'args': {},
+    }
+    for span in spans.values():
+        if span.get('parent') not in spans:
+            span['parent'] = ROOT_ID
+    spans[ROOT_ID] = root
+    return spans
+
+
+def children_of(spans):
+    children = collections.defaultdict(list)
+    for span in spans.values():
+        if span['parent'] is not None:
+            children[span['parent']].append(span)
+    return children
+
+
+def _covered(intervals):
+    total = 0.0
+    last_end = None
+    for start, end in sorted(intervals):
+        if last_end is not None and start < last_end:
+            start = last_end
+        if end > start:
+            total += end - start
+            last_end = end
+    return total
+
+
+def self_time(span, children):
+    """
+    Returns:
+        float: seconds of the span that none of the spans in it covered
+    """
+    intervals = [
+        (max(c['start'], span['start']), min(c['end'], span['end']))
+        for c in children[span['id']]
+    ]
+    return max(0.0, span['end'] - span['start'] - _covered(intervals))
+
+
+def critical_path(spans, children):
+    """
+    Returns:
+        list of tuple of dict, float: the spans of the critical path in the
+            order they ran, each with the seconds of the path spent in the
+            span itself rather than in a span nested in it
+    """
+    path = []
+
+    def walk(span, start, end):
+        # the time between 'start' and 'end' of 'span' on the critical path
+        segments = []
+        cursor = end
+        candidates = sorted(
+            children[span['id']], key=lambda c: c['end'], reverse=True
+        )
+        while True:
+            previous = [
+                c for c in candidates
+                if c['start'] < cursor and c['start'] >= start and
+                min(c['end'], cursor) > c['start']
+            ]
+            if not previous:
+                break
+            child = max(previous, key=lambda c: min(c['end'], cursor))
+            child_end = min(child['end'], cursor)
+            segments.append((child, child['start'], child_end))
+            cursor = child['start']
+            candidates.remove(child)
+
+        own = (end - start) - sum(e - s for _, s, e in segments)
+        path.append((span, max(0.0, own)))
+        for child, child_start, child_end in reversed(segments):
+            walk(child, child_start, child_end)
+
+    root = spans[ROOT_ID]
+    walk(root, root['start'], root['end'])
+    path.sort(key=lambda item: item[0]['start'])
+    return path
+
+
+def _stack(span, spans):
+    names = []
+    while span is not None and span['id'] != ROOT_ID:
+        names.append(span['name'].replace(';', ',').replace('\n', ' '))
+        span = spans.get(span['parent'])
+    return ';'.join(reversed(names))
+
+
+def write_trace(spans, path):
+    events = []
+    threads = set()
+    for span in spans.values():
+        if span['id'] == ROOT_ID:
+            continue
+        args = dict(span.get('args') or {})
+        args.update(id=span['id'], parent=span['parent'])
+        events.append({
+            'name': span['name'],
+            'cat': span['cat'],
+            'ph': 'X',
+            'ts': span['start'] * 1e6,
+            'dur': (span['end'] - span['start']) * 1e6,
+            'pid': span['pid'],
+            'tid': span['tid'],
+            'args': args,
+        })
+        threads.add((span['pid'], span['tid'], span['thread']))
+    for pid, tid, name in sorted(threads):
+        events.append({
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': tid,
+            'args': {'name': name},
+        })
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def write_folded(spans, children, path):
+    stacks = collections.Counter()
+    for span in spans.values():
+        if span['id'] == ROOT_ID:
+            continue
+        stacks[_stack(span, spans)] += self_time(span, children)
+    with open(path, 'w') as f:
+        for stack, seconds in sorted(stacks.items()):
+            milliseconds = int(round(seconds * 1000))
+            if milliseconds > 0:
+                f.write('%s %d\n' % (stack, milliseconds))
+
+
+def report(spans_path, output_dir):
+    spans = read_spans(spans_path)
+    children = children_of(spans)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    write_trace(spans, os.path.join(output_dir, TRACE_FILE))
+    write_folded(spans, children, os.path.join(output_dir, FOLDED_FILE))
+
+    path = critical_path(spans, children)
+    by_category = collections.Counter()
+    by_host = collections.Counter()
+    with open(os.path.join(output_dir, CRITICAL_PATH_FILE), 'w') as f:
+        f.write('start\tduration\tcritical\tcategory\thost\tstack\n')
+        for span, critical in path:
+            host = (span.get('args') or {}).get('host', '')
+            by_category[span['cat']] += critical
+            if host:
+                by_host[host] += critical
+            f.write('%.3f\t%.3f\t%.3f\t%s\t%s\t%s\n' % (
+                span['start'], span['end'] - span['start'], critical,
+                span['cat'], host, _stack(span, spans) or span['name'],
+            ))
+
+    root = spans[ROOT_ID]
+    print('Run took %.1fs, critical path by kind of span:' % (
+        root['end'] - root['start']
+    ))
+    for category, seconds in by_category.most_common():
+        print('%8.1fs %s' % (seconds, category))
+    if by_host:
+        print('Critical path by host:')
+        for host, seconds in by_host.most_common():
+            print('%8.1fs %s' % (seconds, host))
+    print('Slowest spans on the critical path:')
+    for span, critical in sorted(path, key=lambda item: -item[1])[:TOP_SPANS]:
+        if critical < MIN_REPORTED:
+            break
+        print('%8.1fs %s %s' % (critical, span['cat'], _stack(span, spans)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('spans', help='Spans file written by the profiler')
+    parser.add_argument('output_dir', help='Directory to write reports into')
+    args = parser.parse_args()
+
+    report(args.spans, args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
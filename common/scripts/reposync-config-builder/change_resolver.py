@@ -1,36 +1,303 @@
 #!/bin/env python
+"""
+Resolves the suites a change affects.
 
+A file affects the suites it's in, the suites having a symlink to it, or
+to a directory it's in, and the suites of the python modules importing it,
+directly or through other modules, e.g. a module of ost_utils affects all
+the suites whose tests import it.
+
+The symlinks and imports of the repository are kept in an index, built
+once for every git tree and stored under the git dir, so resolving the
+changes of a patch doesn't walk the repository. The imports of a file are
+stored by the hash of its content, so building the index of a new tree only
+parses the python files that changed.
+
+Usage: change_resolver.py [--rebuild] [PATH...]
+
+With no paths, resolves the files changed by HEAD.
+"""
+from __future__ import print_function
+
+import argparse
+import ast
+import errno
+import json
+import logging
 import os
 from re import compile
 from subprocess import check_output
-from operator import or_
-from itertools import imap
-import logging
-import sys
 
 from change_resolver_conf import CONF
 
 logging.basicConfig(filename='change_resolver.log', level=logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
 
+SYMLINK_MODE = '120000'
+# Indexes of older trees that are kept
+MAX_INDEXES = 10
+INDEX_VERSION = 1
+IMPORTS_CACHE = 'imports.json'
+
 
 def main():
-    changes = get_changes(sys.argv[1])
-    change_to_suite = ChangeResolver()
-    change_set = reduce(or_, imap(change_to_suite, changes))
+    parser = argparse.ArgumentParser(
+        description='Prints the suites affected by the changed files'
+    )
+    parser.add_argument(
+        'paths', nargs='*',
+        help='changed files, the ones changed by HEAD if none is given'
+    )
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help='build the index of the repository even if it is stored'
+    )
+    args = parser.parse_args()
+
+    change_to_suite = ChangeResolver(rebuild=args.rebuild)
+    change_set = change_to_suite.resolve_changes(
+        get_changes(args.paths, change_to_suite.root)
+    )
 
     if not change_set:
         LOGGER.info('Changes were not detected, returning default suites')
         change_set = CONF['default_suites']
     exclude_set = CONF['exclude']
     LOGGER.debug('excluding: {}'.format(','.join(change_set & exclude_set)))
-    print "\n".join(str(e) for e in change_set - exclude_set)
+    print("\n".join(str(e) for e in sorted(change_set - exclude_set)))
+
+
+def _git(root, *args):
+    return check_output(('git', '-C', root) + args).decode('utf-8')
+
+
+def get_changes(paths, root):
+    if paths:
+        return [os.path.realpath(x) for x in paths]
+    changed = _git(
+        root, 'diff-tree', '--no-commit-id', '--name-only', '-r', '-z', 'HEAD'
+    )
+    return [
+        os.path.realpath(os.path.join(root, x))
+        for x in changed.split('\0') if x
+    ]
+
+
+def _imported_modules(source):
+    """
+    :return: the names of the modules the source may import, 'from a
+    import b' may import 'a' or 'a.b', relative imports are prefixed with
+    a dot for each level
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, TypeError, ValueError):
+        # e.g. python 2 code using 'async' as a keyword argument
+        return _imported_modules_from_text(source)
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = '.' * (node.level or 0) + (node.module or '')
+            if node.module:
+                modules.add(base)
+            for alias in node.names:
+                if alias.name != '*':
+                    modules.add(
+                        base + ('.' if node.module else '') + alias.name
+                    )
+    return sorted(modules)
+
+
+_IMPORT_RGX = compile(
+    r'^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+\(?([\w, \t]+)'
+    r'|import[ \t]+([\w., \t]+))',
+)
+
+
+def _imported_modules_from_text(source):
+    if isinstance(source, bytes):
+        source = source.decode('utf-8', 'replace')
+    modules = set()
+    for line in source.splitlines():
+        match = _IMPORT_RGX.match(line)
+        if match is None:
+            continue
+        base, names, imported = match.groups()
+        if imported:
+            modules.update(
+                name.split()[0] for name in imported.split(',')
+                if name.strip()
+            )
+            continue
+        if base.strip('.'):
+            modules.add(base)
+        separator = '' if base.endswith('.') else '.'
+        modules.update(
+            base + separator + name.split()[0]
+            for name in names.split(',') if name.strip()
+        )
+    return sorted(modules)
+
+
+class RepoIndex(object):
+    """
+    The symlinks and python imports of a tree, by the real paths of the
+    files, relative to the root of the repository:
+
+    - files: file -> suites having a symlink to it
+    - dirs: directory -> suites having a symlink to it
+    - importers: module -> files importing it
+    """
+
+    def __init__(self, files, dirs, importers):
+        self.files = files
+        self.dirs = dirs
+        self.importers = importers
+
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION,
+            'files': self.files,
+            'dirs': self.dirs,
+            'importers': self.importers,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError('Unsupported index version')
+        return cls(data['files'], data['dirs'], data['importers'])
+
+
+class IndexBuilder(object):
+
+    def __init__(self, root, path_to_suite, imports_cache):
+        self.root = root
+        self.path_to_suite = path_to_suite
+        self.imports_cache = imports_cache
+        self.import_roots = [
+            os.path.join(root, d) for d in CONF.get('import_roots', ())
+        ]
+
+    def realpath_wrapper(self, path):
+        real_path = os.path.realpath(path)
+        LOGGER.info(
+            'resolving realpath for symlink: {} -> {}'
+            .format(path, real_path)
+        )
+        if os.path.islink(real_path):
+            raise RuntimeError(
+                'You have a loop of symlinks at {}'
+                .format(real_path)
+            )
+        return real_path
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root)
+
+    def build(self):
+        files = {}
+        dirs = {}
+        importers = {}
+        symlinks = []
+        tracked = list(self._tracked_files())
+        blobs = dict((path, blob) for _, blob, path in tracked)
+        for mode, blob, path in tracked:
+            abs_path = os.path.join(self.root, path)
+            real = abs_path
+            if mode == SYMLINK_MODE:
+                real = self.realpath_wrapper(abs_path)
+                target = dirs if os.path.isdir(real) else files
+                symlinks.append((path, target, self._relative(real)))
+                _add(target, self._relative(real), self.path_to_suite(path))
+                # the imports of a symlinked module are looked up from
+                # the directory of the symlink
+                blob = blobs.get(self._relative(real))
+            if blob is None or not path.endswith('.py'):
+                continue
+            for module in self._resolve_imports(abs_path, real, blob):
+                _add(importers, module, self._relative(real))
+
+        # a symlink in a directory other symlinks point to is in the suites
+        # of those too, e.g. compat-4.2-suite-master/control.sh
+        changed = True
+        while changed:
+            changed = False
+            for path, target, real in symlinks:
+                for directory in _parents(path):
+                    for suite in dirs.get(directory, ()):
+                        changed |= _add(target, real, suite)
+        LOGGER.debug('generated file to suite(s) map:\n{}'.format(files))
+        return RepoIndex(files, dirs, importers)
+
+    def _tracked_files(self):
+        for entry in _git(self.root, 'ls-files', '-s', '-z').split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            mode, blob, _ = info.split(' ')
+            yield mode, blob, path
 
-def get_changes(x):
-    f = os.path.realpath(x)
-    return [f]
+    def _resolve_imports(self, path, real, blob):
+        if blob not in self.imports_cache:
+            with open(real, 'rb') as f:
+                self.imports_cache[blob] = _imported_modules(f.read())
+        resolved = set()
+        for module in self.imports_cache[blob]:
+            module_path = self._module_path(module, os.path.dirname(path))
+            if module_path is not None:
+                resolved.add(self._relative(module_path))
+        return sorted(resolved)
+
+    def _search_dirs(self, directory):
+        """
+        The directory of the importing file and its parents up to the root
+        of its suite, as the tests run with the root of the suite in their
+        path, and then the configured import roots
+        """
+        while directory.startswith(self.root + os.sep):
+            yield directory
+            if os.path.dirname(directory) == self.root:
+                break
+            directory = os.path.dirname(directory)
+        for import_root in self.import_roots:
+            yield import_root
+
+    def _module_path(self, module, directory):
+        level = len(module) - len(module.lstrip('.'))
+        if level:
+            for _ in range(level - 1):
+                directory = os.path.dirname(directory)
+            search_dirs = [directory]
+        else:
+            search_dirs = self._search_dirs(directory)
+        relative_path = module.lstrip('.').replace('.', os.sep)
+        for search_dir in search_dirs:
+            base = os.path.join(search_dir, relative_path)
+            for candidate in (base + '.py', os.path.join(base, '__init__.py')):
+                if os.path.isfile(candidate):
+                    return os.path.realpath(candidate)
+        return None
+
+
+class ChangeResolver(object):
+
+    def __init__(self, root=None, cache_dir=None, rebuild=False):
+        self.root = root or _git(
+            os.getcwd(), 'rev-parse', '--show-toplevel'
+        ).strip()
+        self.cache_dir = cache_dir or os.environ.get(
+            'OST_CHANGE_RESOLVER_CACHE',
+            os.path.join(
+                self.root,
+                _git(self.root, 'rev-parse', '--git-dir').strip(),
+                'ost-change-resolver',
+            )
+        )
+        self.rebuild = rebuild
 
-class ChangeResolver:
     def __call__(self, change):
         return self.resolve_change(change)
 
@@ -52,72 +319,151 @@ class ChangeResolver:
             )
         return self._suite_files_rgx_cache
 
+    @property
+    def index(self):
+        if not hasattr(self, '_index'):
+            self._index = self._load_index()
+        return self._index
+
     def resolve_change(self, change):
+        return self.resolve_changes([change])
+
+    def resolve_changes(self, changes):
+        """
+        Resolves all the changes of a patch at once, the files importing
+        several of the changed modules are only looked at once
+        """
         suites_to_run = set()
-        LOGGER.info('resolving change: {}'.format(change))
-        core_files_changed = self._core_files_rgx.search(change)
-        if core_files_changed:
-            LOGGER.info(
-                'OST core file changed. Adding {}'.format(
-                    ','.join(CONF['core_suites'])
+        paths = set()
+        for change in changes:
+            LOGGER.info('resolving change: {}'.format(change))
+            change = os.path.relpath(change, self.root)
+            if self._core_files_rgx.search(change):
+                LOGGER.info(
+                    'OST core file changed. Adding {}'.format(
+                        ','.join(CONF['core_suites'])
+                    )
                 )
-            )
-            return CONF['core_suites']
+                suites_to_run.update(CONF['core_suites'])
+            else:
+                paths.add(change)
 
-        suite_files_changed = self._suite_files_rgx.search(change)
-        if suite_files_changed:
-            suites_to_run = set(
-                [suite_files_changed.group('suite_type')]
+        for path in self._with_importers(paths):
+            suites = self.path_to_suites(path)
+            LOGGER.debug(
+                'for change: {} -> related suites: {}'.format(path, suites)
             )
-
-        related_symlinks = self.resolve_symlinks(change)
-        if related_symlinks:
-            LOGGER.info('found related symlinks: {}'.format(related_symlinks))
-            suites_to_run = or_(related_symlinks, suites_to_run)
-
-        LOGGER.debug(
-            'for change: {} -> related suites: {}'
-            .format(change, suites_to_run)
-        )
+            suites_to_run.update(suites)
         return suites_to_run
 
-    def realpath_wrapper(self, path):
-        real_path = os.path.realpath(path)
-        LOGGER.info(
-            'resolving realpath for symlink: {} -> {}'
-            .format(path, real_path)
-        )
-        if os.path.islink(real_path):
-            raise RuntimeError(
-                'You have a loop of symlinks at {}'
-                .format(real_path)
-            )
-        return real_path
+    def _with_importers(self, paths):
+        """
+        :return: the paths and the files importing them, directly or not
+        """
+        affected = set(paths)
+        pending = list(paths)
+        while pending:
+            for importer in self.index.importers.get(pending.pop(), ()):
+                if importer not in affected:
+                    affected.add(importer)
+                    pending.append(importer)
+        return affected
 
     def path_to_suite(self, path):
         suite = self._suite_files_rgx.search(path)
         if suite:
             return suite.group('suite_type')
 
+    def path_to_suites(self, path):
+        suites = set(self.index.files.get(path, ()))
+        suite = self.path_to_suite(path)
+        if suite:
+            suites.add(suite)
+        for directory in _parents(path):
+            suites.update(self.index.dirs.get(directory, ()))
+        return suites
+
     def resolve_symlinks(self, change):
-        if not hasattr(self, '_suites'):
-            self.make_symlinks_cache()
-        return self._suites.get(os.path.join(os.getcwd(), change))
+        return self.index.files.get(os.path.relpath(change, self.root))
 
-    def make_symlinks_cache(self):
-        paths = (
-            os.path.join(path, f)
-            for path, _, files in os.walk(os.path.curdir)
-            for f in files
-        )
-        paths_iterator = (
-            (f, self.realpath_wrapper(f)) for f in paths if os.path.islink(f)
+    def _tree(self):
+        return _git(self.root, 'rev-parse', 'HEAD^{tree}').strip()
+
+    def _load_index(self):
+        path = os.path.join(self.cache_dir, '{}.json'.format(self._tree()))
+        if not self.rebuild:
+            try:
+                with open(path) as f:
+                    return RepoIndex.from_dict(json.load(f))
+            except (IOError, ValueError, KeyError):
+                pass
+
+        imports_path = os.path.join(self.cache_dir, IMPORTS_CACHE)
+        imports_cache = _read_json(imports_path, {})
+        index = IndexBuilder(self.root, self.path_to_suite,
+                             imports_cache).build()
+        _makedirs(self.cache_dir)
+        _write_json(path, index.to_dict())
+        _write_json(imports_path, imports_cache)
+        self._prune_indexes()
+        return index
+
+    def _prune_indexes(self):
+        indexes = sorted(
+            (os.path.join(self.cache_dir, name)
+             for name in os.listdir(self.cache_dir)
+             if name.endswith('.json') and name != IMPORTS_CACHE),
+            key=os.path.getmtime,
         )
-        self._suites = dict()
-        for symlink, f in paths_iterator:
-            self._suites.setdefault(f, set()).add(self.path_to_suite(symlink))
-        LOGGER.debug('generated file to suite(s) map:\n{}'.format(self._suites))
-        return self._suites
+        for path in indexes[:-MAX_INDEXES]:
+            os.unlink(path)
+
+    def make_symlinks_cache(self):
+        self._index = self._load_index()
+        return self._index.files
+
+
+def _add(index, key, value):
+    """
+    Adds the value to the list of the key, unless it's None or there
+    :return: True if the value was added
+    """
+    values = index.setdefault(key, [])
+    if value is None or value in values:
+        return False
+    values.append(value)
+    return True
+
+
+def _parents(path):
+    directory = os.path.dirname(path)
+    while directory:
+        yield directory
+        directory = os.path.dirname(directory)
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return default
+
+
+def _write_json(path, data):
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp_path, path)
+
 
 if __name__ == "__main__":
     main()
@@ -10,6 +10,8 @@ About the configuration options:
       empty set.
     - core_suites: suites to run if a core file has been changed.
     - exclude: suites that will be excluded from the change list.
+    - import_roots: directories, relative to the root of the repository,
+      of the python packages the suites import, besides their own modules.
 """
 
 CONF = {
@@ -19,5 +21,8 @@ CONF = {
     'core_suites': {
         'basic-suite-master',
     },
-    'exclude': set()
+    'exclude': set(),
+    'import_roots': [
+        'ost_utils',
+    ],
 }
@@ -0,0 +1,332 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import bisect
+import collections
+import csv
+import gzip
+import io
+import os
+import signal
+import socket
+import threading
+
+from textwrap import dedent
+
+import six
+
+DESCRIPTION = dedent(
+    """
+    Host metrics of the VMs of a lago prefix.
+
+    'stream' streams the samples written by the metrics collector on each
+    running VM (see common/deploy-scripts/setup_metrics_collector.sh) into
+    OUTPUT_DIR/<vm>.csv.gz, one CSV row per second, until it's terminated.
+
+    'report' aligns the samples with the start and end times of the
+    scenarios, tests and log tasks in OUTPUT_DIR/events.tsv, and writes
+    the usage of each host during each of them to OUTPUT_DIR/steps.tsv.
+    The slowest steps are printed, with the hosts that were saturated
+    during them.
+    """
+)
+
+#: Metrics file written by the collector on the VMs
+METRICS_FILE = '/var/log/ost-metrics.csv'
+#: Seconds to wait before connecting again to a VM
+RETRY_INTERVAL = 5
+#: Max seconds between two flushes of the local metrics files
+FLUSH_INTERVAL = 10
+CHUNK_SIZE = 64 * 1024
+
+EVENTS_FILE = 'events.tsv'
+STEPS_FILE = 'steps.tsv'
+#: Usage from which a host is considered saturated
+SATURATION = collections.OrderedDict(
+    [
+        ('cpu_busy_max', 90.0),
+        ('cpu_iowait_max', 30.0),
+        ('cpu_steal_max', 30.0),
+        ('disk_busy_max', 90.0),
+    ]
+)
+SLOWEST_STEPS = 10
+
+
+def _metrics_path(output_dir, vm_name):
+    return os.path.join(output_dir, '{}.csv.gz'.format(vm_name))
+
+
+class VMStream(object):
+    """
+    Streams the metrics of a single VM, with 'tail -F' over ssh, connecting
+    again whenever the connection is lost. Rows that were already received
+    are not fetched again.
+    """
+
+    def __init__(self, vm, output_dir, stop):
+        self.vm = vm
+        self.path = _metrics_path(output_dir, vm.name())
+        self.stop = stop
+        self.received_lines = 0
+        self.has_header = os.path.exists(self.path)
+
+    def _write_lines(self, out, lines):
+        for line in lines:
+            self.received_lines += 1
+            if line.startswith(b'timestamp'):
+                if self.has_header:
+                    continue
+                self.has_header = True
+            out.write(line + b'\n')
+
+    def _stream_once(self):
+        client = self.vm._get_ssh_client()
+        try:
+            channel = client.get_transport().open_session()
+            channel.settimeout(FLUSH_INTERVAL)
+            channel.exec_command(
+                'tail -n +{} -F {} 2>/dev/null'.format(
+                    self.received_lines + 1, METRICS_FILE
+                )
+            )
+            pending = b''
+            with gzip.open(self.path, 'ab') as out:
+                while not self.stop.is_set():
+                    try:
+                        data = channel.recv(CHUNK_SIZE)
+                    except socket.timeout:
+                        out.flush()
+                        continue
+                    if not data:
+                        return
+                    lines = (pending + data).split(b'\n')
+                    pending = lines.pop()
+                    self._write_lines(out, lines)
+        finally:
+            client.close()
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                self._stream_once()
+            except Exception as err:
+                print('{}: metrics stream failed: {}'.format(
+                    self.vm.name(), err
+                ))
+            self.stop.wait(RETRY_INTERVAL)
+
+
+def stream(prefix_path, output_dir):
+    from lago import sdk
+
+    prefix = sdk.load_env(prefix_path)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    threads = []
+    for vm in six.itervalues(prefix.get_vms()):
+        if not vm.running():
+            continue
+        thread = threading.Thread(
+            target=VMStream(vm, output_dir, stop).run,
+            name='metrics-{}'.format(vm.name()),
+        )
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    # wait with a timeout, so the signals are handled
+    while not stop.is_set():
+        stop.wait(1)
+    for thread in threads:
+        thread.join(FLUSH_INTERVAL + 1)
+
+
+def read_samples(path):
+    """
+    Returns:
+        tuple of list of float, list of dict: the sorted timestamps and the
+            samples taken at them
+    """
+    with gzip.open(path, 'rb') as f:
+        text = io.TextIOWrapper(f) if six.PY3 else f
+        rows = []
+        try:
+            for row in csv.DictReader(text):
+                try:
+                    rows.append({k: float(v) for k, v in six.iteritems(row)})
+                except (TypeError, ValueError):
+                    continue
+        except (IOError, EOFError):
+            # the last gzip member may be cut short if the stream was killed
+            pass
+    rows.sort(key=lambda row: row['timestamp'])
+    return [row['timestamp'] for row in rows], rows
+
+
+def read_steps(path):
+    """
+    Returns:
+        list of tuple: (source, name, start, end) of each step that ended,
+            in the order they started
+    """
+    started = collections.defaultdict(list)
+    steps = []
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t', 3)
+            if len(fields) != 4:
+                continue
+            timestamp, source, event, name = fields
+            key = (source, name)
+            if event == 'start':
+                started[key].append(float(timestamp))
+            elif event == 'end' and started[key]:
+                steps.append((source, name, started[key].pop(),
+                              float(timestamp)))
+    steps.sort(key=lambda step: step[2])
+    return steps
+
+
+def usage(timestamps, samples, start, end):
+    """
+    Returns:
+        dict: usage of the host between 'start' and 'end', None if there
+            are no samples in between
+    """
+    window = samples[
+        bisect.bisect_left(timestamps, start):
+        bisect.bisect_right(timestamps, end + 1)
+    ]
+    if not window:
+        return None
+
+    busy = [100 - s['cpu_idle'] for s in window]
+    return collections.OrderedDict(
+        [
+            ('samples', len(window)),
+            ('cpu_busy_avg', sum(busy) / len(busy)),
+            ('cpu_busy_max', max(busy)),
+            ('cpu_iowait_max', max(s['cpu_iowait'] for s in window)),
+            ('cpu_steal_max', max(s['cpu_steal'] for s in window)),
+            ('disk_busy_max', max(s['disk_busy'] for s in window)),
+            ('mem_available_min_kb',
+             min(s['mem_available_kb'] for s in window)),
+            ('swap_used_max_kb', max(s['swap_used_kb'] for s in window)),
+            ('net_bps_max',
+             max(s['net_rx_bps'] + s['net_tx_bps'] for s in window)),
+        ]
+    )
+
+
+def _format(value):
+    return '%.1f' % value if isinstance(value, float) else str(value)
+
+
+def saturated(host_usage):
+    return [
+        metric for metric, limit in six.iteritems(SATURATION)
+        if host_usage[metric] >= limit
+    ]
+
+
+def report(output_dir):
+    hosts = {}
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith('.csv.gz'):
+            hosts[name[:-len('.csv.gz')]] = read_samples(
+                os.path.join(output_dir, name)
+            )
+    events_path = os.path.join(output_dir, EVENTS_FILE)
+    steps = read_steps(events_path) if os.path.exists(events_path) else []
+
+    durations = []
+    with open(os.path.join(output_dir, STEPS_FILE), 'w') as f:
+        header_written = False
+        for source, name, start, end in steps:
+            hot_hosts = []
+            for host in sorted(hosts):
+                host_usage = usage(hosts[host][0], hosts[host][1], start, end)
+                if host_usage is None:
+                    continue
+                if not header_written:
+                    f.write('\t'.join(
+                        ['source', 'name', 'start', 'duration', 'host'] +
+                        list(host_usage) + ['saturated']
+                    ) + '\n')
+                    header_written = True
+                hot = saturated(host_usage)
+                if hot:
+                    hot_hosts.append('{} ({})'.format(host, ', '.join(hot)))
+                f.write('\t'.join(
+                    [source, name, '%.3f' % start, '%.3f' % (end - start),
+                     host] +
+                    [_format(value) for value in host_usage.values()] +
+                    [','.join(hot)]
+                ) + '\n')
+            durations.append((end - start, source, name, hot_hosts))
+
+    durations.sort(reverse=True)
+    print('Slowest steps:')
+    for duration, source, name, hot_hosts in durations[:SLOWEST_STEPS]:
+        print('{:8.1f}s {} {}{}'.format(
+            duration, source, name,
+            '' if not hot_hosts else ', saturated: ' + '; '.join(hot_hosts)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    stream_parser = subparsers.add_parser(
+        'stream', help='stream the metrics of the running VMs'
+    )
+    stream_parser.add_argument('prefix_path', help='path to a lago prefix')
+    stream_parser.add_argument(
+        'output_dir', help='directory to write the metrics into'
+    )
+    report_parser = subparsers.add_parser(
+        'report', help='align the metrics with the steps of the run'
+    )
+    report_parser.add_argument(
+        'output_dir', help='directory the metrics were streamed into'
+    )
+    args = parser.parse_args()
+
+    if args.command == 'stream':
+        stream(args.prefix_path, args.output_dir)
+    else:
+        report(args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,8 @@ class Browser(Enum):
 
 DRIVER_MAX_RETRIES = 200
 DRIVER_SLEEP_TIME = .12
+DRIVER_WAIT_TIMEOUT = DRIVER_MAX_RETRIES * DRIVER_SLEEP_TIME
+SCREENSHOT_BUDGET = 100
 GC_WAIT_TIME = 5
 LEFT_NAV_HOVER_TIME = .8
 FIREFOX_BROWSER_PROCESS_NAME = 'firefox'
@@ -18,12 +18,20 @@
 # Refer to the README and COPYING files for full details of the license
 #
 
+import hashlib
 import os
+import threading
 import time
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 from selenium import webdriver
 from selenium.common.exceptions import (ElementNotVisibleException,
                                         NoSuchElementException,
+                                        TimeoutException,
                                         WebDriverException,
                                         StaleElementReferenceException)
 from selenium.webdriver.common.action_chains import ActionChains
@@ -37,6 +45,12 @@ from ..selenium_constants import *
 
 DEBUG = False
 
+# exceptions that mean 'not there yet' while waiting for an element
+WAIT_IGNORED_EXCEPTIONS = (NoSuchElementException,
+                           ElementNotVisibleException,
+                           StaleElementReferenceException,
+                           WebDriverException)
+
 
 class DriverException(Exception):
     def __init__(self, value):
@@ -46,114 +60,147 @@ class DriverException(Exception):
         return repr(self.value)
 
 
-class Driver(object):
+class ScreenshotWriter(object):
+    """
+    Writes screenshots and page sources to disk from a background thread.
 
-    def __init__(self, driver):
+    A screenshot identical to the previous one is not saved, and neither is
+    any screenshot after 'budget' of them were saved. Forced saves (used
+    for failures) skip both checks.
+    """
 
-        # this is a selenium webdriver instance
-        self.driver = driver
+    def __init__(self, budget=SCREENSHOT_BUDGET):
+        self._budget = budget
+        self._saved = 0
+        self._last_digest = None
+        self._queue = queue.Queue()
+        self._thread = None
 
-    def wait_for_id(self, text):
-
-        elem = None
-
-        for x in range(1, DRIVER_MAX_RETRIES):
-            try:
+    def save_png(self, path, png, force=False):
+        digest = hashlib.sha1(png).hexdigest()
+        if not force:
+            if digest == self._last_digest:
                 if DEBUG:
-                    print("self.driver.find_element_by_id(%s)" % text)
-                elem = self.driver.find_element_by_id(text)
-                break
-            except (NoSuchElementException, WebDriverException, ElementNotVisibleException) as e:
-                time.sleep(DRIVER_SLEEP_TIME)
-
-        if elem is None:
-            self.driver.save_screenshot('%s could not locate by id %s.png' % (time.time(), text))
-            print("could not locate by id: " + text)
-            raise DriverException("could not locate by id: " + text)
-
-        return elem
-
-    def action_on_element(self, text, action, path=None):
-        elem = None
-        find_by = 'id'
-
-        for x in range(1, DRIVER_MAX_RETRIES):
-            try:
+                    print("page unchanged, skipping screenshot " + path)
+                return False
+            if self._budget is not None and self._saved >= self._budget:
                 if DEBUG:
-                    print("self.driver.find_element_by_id(%s)" % text)
-                elif action == 'click':
-                    elem = self.driver.find_element_by_link_text(text)
-                    elem.click()
-                    find_by = 'text'
-                elif action == 'send':
-                    elem = self.driver.find_element_by_id(text)
-                    elem.send_keys(path)
-                break
-            except (NoSuchElementException, WebDriverException, ElementNotVisibleException) as e:
-                time.sleep(DRIVER_SLEEP_TIME)
+                    print("screenshot budget used up, skipping " + path)
+                return False
+            self._saved += 1
+        self._last_digest = digest
+        self.write(path, png)
+        return True
+
+    def write(self, path, data):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='screenshot-writer'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+        self._queue.put((path, data))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            except EnvironmentError as e:
+                print("could not save %s: %s" % (path, e))
 
-        if elem is None:
-            self.driver.save_screenshot('%s could not locate by %s %s.png' % (time.time(), find_by, text))
-            print("could not locate by text: " + text)
-            raise DriverException("could not locate by text: " + text)
-        return elem
 
-    def id_click(self, id):
+class Driver(object):
 
-        try:
-            for x in range(1, DRIVER_MAX_RETRIES):
+    def __init__(self, driver, screenshot_budget=SCREENSHOT_BUDGET):
 
-                # try to find the element. That requires its own wait loop, so it lives
-                # in another method for clarity
-                if DEBUG:
-                    print("self.wait_for_id(%s)" % id)
+        # this is a selenium webdriver instance
+        self.driver = driver
+        self._screenshots = ScreenshotWriter(screenshot_budget)
 
-                ret = self.wait_for_id(id)
+    def _wait(self, timeout=DRIVER_WAIT_TIMEOUT):
+        return WebDriverWait(self.driver, timeout,
+                             poll_frequency=DRIVER_SLEEP_TIME,
+                             ignored_exceptions=WAIT_IGNORED_EXCEPTIONS)
 
-                try:
-                    # try to click it. This may or may not work, hence the surrounding wait loop
-                    if DEBUG:
-                        print("" + str(ret) + ".click()")
+    def _until(self, condition, message, timeout=DRIVER_WAIT_TIMEOUT):
+        # one deadline for the whole condition, locating and acting included
+        try:
+            return self._wait(timeout).until(condition)
+        except TimeoutException:
+            self._save_failure_screenshot(message)
+            print(message)
+            raise DriverException(message)
 
-                    ret.click()
-                    break
-                except (NoSuchElementException, WebDriverException, ElementNotVisibleException) as e:
-                    time.sleep(DRIVER_SLEEP_TIME)
+    def _save_failure_screenshot(self, description):
+        self.save_screenshot('%s %s.png' % (time.time(), description),
+                             force=True)
 
-        except DriverException as e:
-            self.driver.save_screenshot('%s id_click couldnt find element %s.png' % (time.time(), id))
-            print('id_click couldnt find element %s' % id)
-            raise
+    def wait_for_id(self, text):
+        if DEBUG:
+            print("wait for element with id %s" % text)
 
-    def hover_to_id(self, id):
+        return self._until(
+            EC.presence_of_element_located((By.ID, text)),
+            "could not locate by id: " + text
+        )
 
-        try:
-            for x in range(1, DRIVER_MAX_RETRIES):
+    def action_on_element(self, text, action, path=None):
+        if action == 'click':
+            locator = (By.LINK_TEXT, text)
+        elif action == 'send':
+            locator = (By.ID, text)
+        else:
+            raise DriverException("unknown action: " + action)
+
+        def act(driver):
+            if DEBUG:
+                print("%s on element %s" % (action, text))
+            elem = driver.find_element(*locator)
+            if action == 'click':
+                elem.click()
+            else:
+                elem.send_keys(path)
+            return elem
+
+        return self._until(
+            act, "could not locate by %s: %s" % (locator[0], text)
+        )
 
-                # try to find the element. That requires its own wait loop, so it lives
-                # in another method for clarity
-                if DEBUG:
-                    print("self.wait_for_id(%s)" % id)
+    def id_click(self, id):
 
-                ret = self.wait_for_id(id)
+        def click(driver):
+            # locating and clicking share one deadline, as the element may
+            # be present but not clickable yet
+            if DEBUG:
+                print("click on element with id %s" % id)
+            driver.find_element_by_id(id).click()
+            return True
 
-                try:
-                    # try to hover over it. This may or may not work, hence the surrounding wait loop
-                    if DEBUG:
-                        print("hover.perform() on %s" % ret)
+        self._until(click, 'id_click couldnt find element %s' % id)
 
-                    hover = ActionChains(self.driver).move_to_element(ret)
-                    hover.perform()
-                    time.sleep(LEFT_NAV_HOVER_TIME)
-                    break
+    def hover_to_id(self, id):
 
-                except (NoSuchElementException, WebDriverException, ElementNotVisibleException) as e:
-                    time.sleep(DRIVER_SLEEP_TIME)
+        def hover(driver):
+            elem = driver.find_element_by_id(id)
+            if not elem.is_displayed():
+                return False
+            if DEBUG:
+                print("hover.perform() on %s" % elem)
+            ActionChains(driver).move_to_element(elem).perform()
+            return True
 
-        except DriverException as e:
-            self.driver.save_screenshot('%s hover_to_id couldnt find element %s.png' % (time.time(), id))
-            print('hover_to_id couldnt find element %s' % id)
-            raise
+        self._until(hover, 'hover_to_id couldnt find element %s' % id)
 
     def retry_if_stale(self, method_to_retry, *args):
         success = False
@@ -173,7 +220,7 @@ class Driver(object):
                 exception = e
 
         if not success:
-            self.save_screenshot("stale-element")
+            self._save_failure_screenshot("stale-element")
             print("StaleElementReferenceException occurred max times, stop retrying")
             raise exception
 
@@ -191,25 +238,48 @@ class Driver(object):
             pass
 
     def shutdown(self):
-        self.driver.quit()
+        try:
+            self.driver.quit()
+        finally:
+            self._screenshots.close()
 
     def refresh(self):
         self.driver.refresh()
 
-    def save_screenshot(self, path, delay=0):
-        if delay > 0 and delay <= 10:
-            time.sleep(delay)
+    def wait_for_page_ready(self, timeout):
+        """
+        Wait up to 'timeout' seconds for the page to finish loading.
+        Doesn't fail if it doesn't, as this is only used before taking
+        screenshots.
+        """
+        try:
+            WebDriverWait(self.driver, timeout,
+                          poll_frequency=DRIVER_SLEEP_TIME).until(
+                lambda driver: driver.execute_script(
+                    'return document.readyState') == 'complete'
+            )
+        except (TimeoutException, WebDriverException):
+            pass
+
+    def save_screenshot(self, path, delay=0, force=False):
+        if delay > 0:
+            self.wait_for_page_ready(min(delay, 10))
+
+        try:
+            png = self.driver.get_screenshot_as_png()
+        except WebDriverException as e:
+            print("could not take screenshot %s: %s" % (path, e))
+            return
 
-        print("saving screenshot " + path)
-        self.driver.save_screenshot(path)
+        if self._screenshots.save_png(path, png, force):
+            print("saving screenshot " + path)
 
     def save_page_source(self, path, delay=0):
-        if delay > 0 and delay <= 10:
-            time.sleep(delay)
+        if delay > 0:
+            self.wait_for_page_ready(min(delay, 10))
 
         print("saving page source " + path)
-        with open(path, "w") as text_file:
-            text_file.write(self.driver.page_source)
+        self._screenshots.write(path, self.driver.page_source.encode('utf-8'))
 
     def wait_until(self, condition_method, *args):
         WebDriverWait(self.driver, 60).until(ConditionClass(False, condition_method, *args))
@@ -20,7 +20,6 @@
 import functools
 import os
 import random
-import time
 import threading
 
 import nose.tools as nt
@@ -477,10 +476,6 @@ def run_log_collector(prefix):
         ],
     )
 
-@testlib.with_ovirt_prefix
-def sleep(prefix):
-    time.sleep(120)
-
 _TEST_LIST = [
     wait_engine,
     wait_hosts,
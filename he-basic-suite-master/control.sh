@@ -56,6 +56,7 @@ setup_ipv6() {
 
 run_suite(){
     install_libguestfs
+    cd "$OST_REPO_ROOT" && pip install --user -e ost_utils
     local suite="${SUITE?}"
     local curdir="${PWD?}"
     declare failed=false
@@ -73,6 +74,7 @@ run_suite(){
         install_local_rpms
     fi
     env_start
+    env_glance_mirror_start
     if [[ "${SUITE##*/}" == "he-basic-suite-master" ]]; then
         env_copy_repo_file
     fi
@@ -50,6 +50,9 @@ except ImportError:
 from lago import utils
 from ovirtlago import testlib
 
+from ost_utils import readiness
+from ost_utils import waiter
+
 import logging
 LOGGER = logging.getLogger(__name__)
 
@@ -89,7 +92,10 @@ GLANCE_AVAIL = False
 GUEST_IMAGE_NAME = versioning.guest_os_image_name()
 GLANCE_DISK_NAME = versioning.guest_os_glance_disk_name()
 TEMPLATE_GUEST = versioning.guest_os_template_name()
-GLANCE_SERVER_URL = 'http://glance.ovirt.org:9292/'
+# Set by run_suite.sh when the images are served from a local mirror
+GLANCE_SERVER_URL = os.environ.get(
+    'OST_GLANCE_MIRROR_URL', 'http://glance.ovirt.org:9292/'
+)
 
 # Network
 VLAN200_NET = 'VLAN200_Network'
@@ -202,19 +208,28 @@ def add_he_hosts_4(prefix):
             deploy_hosted_engine=True,
         )
 
-    def _he_host_is_up_4():
-        host_service = hosts_service.host_service(api_host.id)
-        host_obj = host_service.get()
+    def _he_host_is_up_4(host_obj):
+        if host_obj is None:
+            return False
         if host_obj.status == sdk4.types.HostStatus.UP:
             return True
 
         if host_obj.status == sdk4.types.HostStatus.NON_OPERATIONAL:
-            raise RuntimeError('Host %s is in non operational state' % api_host.name)
+            raise RuntimeError('Host %s is in non operational state' % host_obj.name)
         if host_obj.status == sdk4.types.HostStatus.INSTALL_FAILED:
-            raise RuntimeError('Host %s installation failed' % api_host.name)
+            raise RuntimeError('Host %s installation failed' % host_obj.name)
         if host_obj.status == sdk4.types.HostStatus.NON_RESPONSIVE:
-            raise RuntimeError('Host %s is in non responsive state' % api_host.name)
-
+            raise RuntimeError('Host %s is in non responsive state' % host_obj.name)
+        return False
+
+    def _he_host_is_active_4(host_id):
+        host_obj = hosts_service.host_service(host_id).get(all_content=True)
+        hosted_engine = host_obj.hosted_engine
+        return (
+            hosted_engine is not None and
+            hosted_engine.active and
+            (hosted_engine.score or 0) > 0
+        )
 
     hosts = sorted(prefix.virt_env.host_vms(), key=lambda host: host.name())[1:]
     vec = utils.func_vector(_add_he_host_4, [(h,) for h in hosts])
@@ -222,9 +237,35 @@ def add_he_hosts_4(prefix):
     vt.start_all()
     nt.assert_true(all(vt.join_all()))
 
+    # All the hosts are fetched with one call per probe, and a host failing
+    # to install fails the wait right away
     api_hosts = hosts_service.list()
-    for api_host in api_hosts:
-        testlib.assert_true_within(_he_host_is_up_4, timeout=15*60)
+    timeout = 15 * 60
+    start = time.time()
+    waiter.wait_all(
+        [
+            waiter.EntityCondition(
+                hosts_service, api_host.name, _he_host_is_up_4,
+                name='host %s up' % api_host.name,
+            )
+            for api_host in api_hosts
+        ],
+        timeout,
+        name='hosted engine hosts up',
+    )
+    # A host is ready to run the engine VM only once its HA agent reports
+    # a score, which happens some time after the host is up
+    waiter.wait_all(
+        [
+            waiter.Condition(
+                functools.partial(_he_host_is_active_4, api_host.id),
+                name='hosted engine active on %s' % api_host.name,
+            )
+            for api_host in api_hosts
+        ],
+        max(0, timeout - (time.time() - start)),
+        name='hosted engine hosts active',
+    )
 
     for host in hosts:
         host.ssh(['rm', '-rf', '/var/cache/yum/*', '/var/cache/dnf/*'])
@@ -518,6 +559,7 @@ def list_glance_images(api):
             raise SkipTest('%s GLANCE storage domain is not available.' % list_glance_images.__name__ )
         glance_domain_list = api.system_service().storage_domains_service().list(search=search_query)
 
+    use_glance_mirror(api)
     if not check_glance_connectivity(api):
         raise SkipTest('%s: GLANCE connectivity test failed' % list_glance_images.__name__ )
 
@@ -574,6 +616,22 @@ def add_glance(api):
     return glance.pop()
 
 
+def use_glance_mirror(api):
+    """
+    Points the provider created by engine-setup at GLANCE_SERVER_URL, if
+    it's the local mirror
+    """
+    if 'OST_GLANCE_MIRROR_URL' not in os.environ:
+        return
+    providers_service = api.system_service().openstack_image_providers_service()
+    for provider in providers_service.list():
+        if (provider.name == SD_GLANCE_NAME and
+                provider.url != GLANCE_SERVER_URL):
+            providers_service.provider_service(provider.id).update(
+                sdk4.types.OpenStackImageProvider(url=GLANCE_SERVER_URL)
+            )
+
+
 def check_glance_connectivity(api):
     avail = False
     providers_service = api.system_service().openstack_image_providers_service()
@@ -774,8 +832,15 @@ def run_log_collector(prefix):
     )
 
 @testlib.with_ovirt_prefix
-def sleep(prefix):
-    time.sleep(120)
+def wait_he_ready(prefix):
+    host0 = sorted(prefix.virt_env.host_vms(), key=lambda h: h.name())[0]
+    engine = prefix.virt_env.engine_vm()
+    readiness.wait_for_he_ready(
+        host0,
+        engine,
+        system_service=engine.get_api_v4().system_service(),
+        dc_name=DC_NAME,
+    )
 
 
 @testlib.with_ovirt_prefix
@@ -856,7 +921,7 @@ _TEST_LIST = [
     add_master_storage_domain,
     he_vm_status,
     he_get_shared_config,
-    sleep,
+    wait_he_ready,
     add_he_hosts,
     he_check_ha_agent,
     list_glance_images,
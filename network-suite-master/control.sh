@@ -43,6 +43,7 @@ setup_env() {
 
 start_env() {
     env_start
+    env_glance_mirror_start
     env_copy_repo_file
     env_copy_config_file
     env_status
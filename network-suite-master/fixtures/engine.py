@@ -24,6 +24,7 @@ from ovirtsdk4 import Connection
 
 from ovirtlib import eventlib
 from ovirtlib import syncutil
+from ovirtlib.system import SDKSystemRoot
 from testlib import suite
 
 
@@ -60,6 +61,23 @@ def engine(fqdn, env, artifacts_path):
         yield engine
 
 
+@pytest.fixture(scope='session', autouse=True)
+def engine_events_watcher(engine):
+    # the watcher polls from a thread of its own, with a connection of its own
+    watcher_system = SDKSystemRoot()
+    watcher_system.connect(
+        url='https://{}/ovirt-engine/api'.format(engine.ip()),
+        username='admin@internal',
+        password=engine.metadata['ovirt-engine-password'],
+    )
+    watcher = eventlib.EngineEventsWatcher(watcher_system)
+    watcher.start()
+    syncutil.set_watcher(watcher)
+    yield watcher
+    syncutil.set_watcher(None)
+    watcher.stop()
+
+
 def _get_engine_api(engine):
     try:
         return engine.get_api_v4()
@@ -30,7 +30,10 @@ from ovirtlib.providerlib import OpenStackNetworkProvider
 OPENSTACK_AUTH_URL = 'https://{}:35357/v2.0'
 OPENSTACK_USERNAME = 'admin@internal'
 OVIRT_IMAGE_REPO_NAME = 'ovirt-image-repository'
-OVIRT_IMAGE_REPO_URL = 'http://glance.ovirt.org:9292/'
+# Set by run_suite.sh when the images are served from a local mirror
+OVIRT_IMAGE_REPO_URL = os.environ.get(
+    'OST_GLANCE_MIRROR_URL', 'http://glance.ovirt.org:9292/'
+)
 OPENSTACK_CLIENT_CONFIG_FILE = 'clouds.yml'
 DEFAULT_CLOUD = 'ovirt'
 DEFAULT_OVN_PROVIDER_NAME = 'ovirt-provider-ovn'
@@ -45,6 +48,9 @@ def ovirt_image_repo(system):
     openstack_image_providers = OpenStackImageProviders(system)
     if openstack_image_providers.is_provider_available(OVIRT_IMAGE_REPO_NAME):
         openstack_image_providers.import_by_name(OVIRT_IMAGE_REPO_NAME)
+        provider = openstack_image_providers.get_sdk_type()
+        if provider.url != OVIRT_IMAGE_REPO_URL:
+            openstack_image_providers.update(url=OVIRT_IMAGE_REPO_URL)
     else:
         openstack_image_providers.create(name=OVIRT_IMAGE_REPO_NAME,
                                          url=OVIRT_IMAGE_REPO_URL,
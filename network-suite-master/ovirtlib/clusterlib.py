@@ -24,6 +24,7 @@ import ovirtsdk4
 from ovirtsdk4 import types
 
 from ovirtlib import datacenterlib
+from ovirtlib import querylib
 
 from ovirtlib.sdkentity import SDKRootEntity
 from ovirtlib.sdkentity import SDKSubEntity
@@ -103,10 +104,6 @@ class MacPool(SDKRootEntity):
 
 class Cluster(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     def create(self, data_center, cluster_name):
         sdk_type = types.Cluster(
             name=cluster_name,
@@ -128,15 +125,18 @@ class Cluster(SDKRootEntity):
         networks = []
         for sdk_net in self._service.networks_service().list():
             cluster_network = ClusterNetwork(self)
-            cluster_network.import_by_id(sdk_net.id)
+            cluster_network.import_sdk_type(sdk_net)
             networks.append(cluster_network)
         return networks
 
     def host_ids(self):
         return [
             sdk_host.id
-            for sdk_host in self.system.hosts_service.list()
-            if sdk_host.cluster.id == self.id
+            for sdk_host in querylib.search(
+                self.system.hosts_service,
+                'cluster={}'.format(querylib.quote(self.name)),
+                lambda sdk_host: sdk_host.cluster.id == self.id
+            )
         ]
 
     def mgmt_network(self):
@@ -155,15 +155,16 @@ class Cluster(SDKRootEntity):
 
     def sync_all_networks(self):
         self.service.sync_all_networks()
+        self.invalidate()
 
     def _get_parent_service(self, system):
         return system.clusters_service
 
     @staticmethod
     def iterate(system):
-        for sdk_obj in system.clusters_service.list():
+        for sdk_obj in querylib.iterate(system.clusters_service):
             cluster = Cluster(system)
-            cluster.import_by_id(sdk_obj.id)
+            cluster.import_sdk_type(sdk_obj)
             yield cluster
 
 
@@ -173,12 +174,12 @@ class ClusterNetwork(SDKSubEntity):
         pass
 
     def assign(self, dc_network, required=False):
-        sdk_type = dc_network.get_sdk_type()
+        sdk_type = dc_network.get_sdk_type(fresh=True)
         sdk_type.required = required
 
         self._parent_service.add(sdk_type)
         service = self._parent_service.service(dc_network.id)
-        self._set_service(service)
+        self._set_service(service, dc_network.id)
 
     def _get_parent_service(self, cluster):
         return cluster.service.networks_service()
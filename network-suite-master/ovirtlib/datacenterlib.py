@@ -23,6 +23,7 @@ from ovirtsdk4 import types
 
 from ovirtlib import error
 from ovirtlib import netlib
+from ovirtlib import querylib
 from ovirtlib import storagelib
 from ovirtlib import syncutil
 from ovirtlib.sdkentity import SDKRootEntity
@@ -30,10 +31,6 @@ from ovirtlib.sdkentity import SDKRootEntity
 
 class DataCenter(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     @property
     def status(self):
         return self.get_sdk_type().status
@@ -41,9 +38,11 @@ class DataCenter(SDKRootEntity):
     def attach_storage_domain(self, sd):
         sds_service = self._service.storage_domains_service()
         sds_service.add(sd.get_sdk_type())
+        sd.invalidate()
 
     def deactivate_storage_domain(self, sd):
         self._sd_service(sd).deactivate()
+        sd.invalidate()
 
     def deactivate_storage_domain_sync(self, sd):
         syncutil.sync(
@@ -55,7 +54,7 @@ class DataCenter(SDKRootEntity):
         qos_entities = []
         for qos in self._service.qoss_service().list():
             qos_entity = netlib.QoS(self)
-            qos_entity.import_by_name(name=qos.name)
+            qos_entity.import_sdk_type(qos)
             qos_entities.append(qos_entity)
         return qos_entities
 
@@ -91,7 +90,7 @@ class DataCenter(SDKRootEntity):
         return self._service.storage_domains_service().service(sd.id)
 
     def _wait_for_status(self, status):
-        syncutil.sync(exec_func=lambda: self.status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s == status,
                       timeout=60 * 5)
@@ -104,9 +103,9 @@ class DataCenter(SDKRootEntity):
         `search` should be a search query string understood by oVirt.
         Cf. http://ovirt.github.io/ovirt-engine-api-model/master/#_searching
         """
-        for sdk_obj in system.data_centers_service.list(search=search):
+        for sdk_obj in querylib.iterate(system.data_centers_service, search):
             dc = DataCenter(system)
-            dc.import_by_id(sdk_obj.id)
+            dc.import_sdk_type(sdk_obj)
             yield dc
 
 
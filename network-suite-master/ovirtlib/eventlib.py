@@ -17,12 +17,18 @@
 #
 # Refer to the README and COPYING files for full details of the license
 #
+import logging
 import random
+import threading
 
 import ovirtsdk4
 
 from ovirtlib.sdkentity import SDKRootEntity
 
+LOGGER = logging.getLogger(__name__)
+
+EVENTS_POLL_INTERVAL = 1
+
 
 class EngineEvents(SDKRootEntity):
 
@@ -42,3 +48,74 @@ class EngineEvents(SDKRootEntity):
                 ovirtsdk4.types.LogSeverity.NORMAL
             )
         ))
+
+
+class EngineEventsWatcher(object):
+    """Polls the engine events and jobs from a thread of its own, and sets
+    the events of its subscribers whenever something changed, see
+    syncutil.set_watcher.
+
+    The watcher polls with the system it is given, which must not be used by
+    any other thread: SDK connections can't be shared between threads.
+    """
+
+    def __init__(self, system, interval=EVENTS_POLL_INTERVAL):
+        self._system = system
+        self._interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_event_id = None
+        self._jobs_state = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='engine-events-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def subscribe(self):
+        event = threading.Event()
+        with self._lock:
+            self._subscribers.add(event)
+        return event
+
+    def unsubscribe(self, event):
+        with self._lock:
+            self._subscribers.discard(event)
+
+    def _poll(self):
+        jobs_state = frozenset((job.id, str(job.status))
+                               for job in self._system.jobs_service.list())
+        if self._last_event_id is None:
+            events = self._system.events_service.list(max=1)
+            self._last_event_id = int(events[0].id) if events else 0
+            self._jobs_state = jobs_state
+            return False
+
+        changed = jobs_state != self._jobs_state
+        self._jobs_state = jobs_state
+        events = self._system.events_service.list(from_=self._last_event_id)
+        if events:
+            self._last_event_id = max(int(event.id) for event in events)
+            changed = True
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                changed = self._poll()
+            except Exception:
+                LOGGER.debug('Failed to poll the engine events',
+                             exc_info=True)
+                continue
+            if changed:
+                with self._lock:
+                    for event in self._subscribers:
+                        event.set()
@@ -24,6 +24,7 @@ from ovirtsdk4 import types
 from ovirtlib import clusterlib
 from ovirtlib import netattachlib
 from ovirtlib import netlib
+from ovirtlib import querylib
 from ovirtlib import syncutil
 from ovirtlib.sdkentity import SDKRootEntity
 
@@ -72,10 +73,6 @@ class Host(SDKRootEntity):
         super(Host, self).__init__(parent_sdk_system)
         self._root_password = None
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     @property
     def address(self):
         return self.get_sdk_type().address
@@ -108,6 +105,7 @@ class Host(SDKRootEntity):
 
     def activate(self):
         self._service.activate()
+        self.invalidate()
 
     def deactivate(self):
         self.wait_for_up_status()
@@ -117,6 +115,7 @@ class Host(SDKRootEntity):
             timeout=3 * 60,
             error_criteria=Host._is_error_non_transient
         )
+        self.invalidate()
         self.wait_for_maintenance_status()
 
     def change_cluster(self, cluster):
@@ -167,12 +166,17 @@ class Host(SDKRootEntity):
             synced_net_attachment_values = (
                 modified_network_attachments.values()
             )
-        return self.service.setup_networks(
-            modified_network_attachments=modified_network_attachments.values(),
-            removed_network_attachments=removed_network_attachments,
-            synchronized_network_attachments=synced_net_attachment_values,
-            check_connectivity=True
-        )
+        try:
+            return self.service.setup_networks(
+                modified_network_attachments=(
+                    modified_network_attachments.values()
+                ),
+                removed_network_attachments=removed_network_attachments,
+                synchronized_network_attachments=synced_net_attachment_values,
+                check_connectivity=True
+            )
+        finally:
+            self.invalidate()
 
     def remove_networks(self, removed_networks):
         removed_network_ids = [
@@ -184,10 +188,13 @@ class Host(SDKRootEntity):
             if attachment.network.id in removed_network_ids
         ]
 
-        return self.service.setup_networks(
-            removed_network_attachments=removed_attachments,
-            check_connectivity=True
-        )
+        try:
+            return self.service.setup_networks(
+                removed_network_attachments=removed_attachments,
+                check_connectivity=True
+            )
+        finally:
+            self.invalidate()
 
     def networks_in_sync(self, networks=None):
         attachments = self._get_attachments_for_networks(networks)
@@ -197,13 +204,15 @@ class Host(SDKRootEntity):
         attachments = self._get_attachments_for_networks(networks)
         return all(not att.in_sync for att in attachments)
 
-    def _get_attachments_for_networks(self, networks):
+    def _get_attachments_for_networks(self, networks, follow=None):
         if networks is None:
-            attachments = self._get_existing_attachments()
+            attachments = self._get_existing_attachments(follow)
         else:
             network_ids = {net.id for net in networks}
-            attachments = [att for att in self._get_existing_attachments()
-                           if att.network.id in network_ids]
+            attachments = [
+                att for att in self._get_existing_attachments(follow)
+                if att.network.id in network_ids
+            ]
         return attachments
 
     def clean_networks(self):
@@ -213,24 +222,26 @@ class Host(SDKRootEntity):
         self.service.setup_networks(
             removed_network_attachments=removed_attachments
         )
+        self.invalidate()
 
     def sync_all_networks(self):
         self.service.sync_all_networks()
+        self.invalidate()
 
     def wait_for_up_status(self, timeout=HOST_TIMEOUT_SHORT):
-        syncutil.sync(exec_func=lambda: self.get_sdk_type().status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=self._host_up_status_success_criteria,
                       timeout=timeout)
 
     def wait_for_non_operational_status(self):
         NONOP = HostStatus.NON_OPERATIONAL
-        syncutil.sync(exec_func=lambda: self.get_sdk_type().status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s == NONOP)
 
     def wait_for_maintenance_status(self):
-        syncutil.sync(exec_func=lambda: self.get_sdk_type().status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s == HostStatus.MAINTENANCE)
 
@@ -268,12 +279,15 @@ class Host(SDKRootEntity):
         return self._get_network_by_id(mgmt_net_id)
 
     def _get_attachment_data_for_networks(self, networks):
-        network_attachments = self._get_attachments_for_networks(networks)
+        network_attachments = self._get_attachments_for_networks(
+            networks, follow='host_nic'
+        )
         network_attachments_data = []
+        dc = self._get_data_center()
         for attachment in network_attachments:
             datum = netattachlib.NetworkAttachmentData(
-                self._get_network_by_id(attachment.network.id),
-                self._get_nic_name(attachment.host_nic.id),
+                self._get_network_by_id(attachment.network.id, dc),
+                self._get_nic_name(attachment.host_nic),
                 id=attachment.id,
                 in_sync=attachment.in_sync
             )
@@ -281,12 +295,15 @@ class Host(SDKRootEntity):
             network_attachments_data.append(datum)
         return network_attachments_data
 
-    def _get_nic_name(self, nic_id):
+    def _get_nic_name(self, host_nic):
+        if host_nic.name is not None:
+            return host_nic.name
         return (self.system.hosts_service.host_service(self.id)
-                .nics_service().nic_service(nic_id).get().name)
+                .nics_service().nic_service(host_nic.id).get().name)
 
-    def _get_network_by_id(self, network_id):
-        dc = self._get_data_center()
+    def _get_network_by_id(self, network_id, dc=None):
+        if dc is None:
+            dc = self._get_data_center()
         network = netlib.Network(dc)
         network.import_by_id(network_id)
         return network
@@ -302,8 +319,10 @@ class Host(SDKRootEntity):
     def _get_mgmt_cluster_network(self):
         return self.get_cluster().mgmt_network()
 
-    def _get_existing_attachments(self):
-        return list(self.service.network_attachments_service().list())
+    def _get_existing_attachments(self, follow=None):
+        return querylib.search(
+            self.service.network_attachments_service(), None, follow=follow
+        )
 
     @staticmethod
     def _is_error_non_transient(error):
@@ -319,6 +338,7 @@ class Host(SDKRootEntity):
 
     def refresh_capabilities(self):
         self.service.refresh()
+        self.invalidate()
 
 
 @contextlib.contextmanager
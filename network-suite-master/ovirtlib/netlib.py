@@ -22,6 +22,7 @@ import contextlib
 
 from ovirtsdk4 import types
 
+from ovirtlib import querylib
 from ovirtlib.sdkentity import EntityCreationError
 from ovirtlib.sdkentity import SDKSubEntity
 from ovirtlib.sdkentity import SDKRootEntity
@@ -59,10 +60,6 @@ class VnicInterfaceType(object):
 
 class Network(SDKSubEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     def create(self,
                name,
                vlan=None,
@@ -114,10 +111,6 @@ class Network(SDKSubEntity):
 
 class VnicProfile(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     def create(self, name, network, qos=None):
         qos_type = None if qos is None else qos.get_sdk_type()
         sdk_type = types.VnicProfile(
@@ -147,9 +140,9 @@ class VnicProfile(SDKRootEntity):
 
     @staticmethod
     def iterate(system):
-        for sdk_obj in system.vnic_profiles_service.list():
+        for sdk_obj in querylib.iterate(system.vnic_profiles_service):
             profile = VnicProfile(system)
-            profile.import_by_id(sdk_obj.id)
+            profile.import_sdk_type(sdk_obj)
             yield profile
 
     @property
@@ -166,27 +159,26 @@ class VnicProfile(SDKRootEntity):
             types.CustomProperty(name=p.name, value=p.value)
             for p in properties]
         self.service.update(service)
+        self.invalidate()
 
 
 class Vnic(SDKSubEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     @property
     def linked(self):
         return self.get_sdk_type().linked
 
     def set_mac_addr(self, address):
-        sdk_type = self.get_sdk_type()
+        sdk_type = self.get_sdk_type(fresh=True)
         sdk_type.mac.address = address
         self._service.update(sdk_type)
+        self.invalidate()
 
     def set_linked(self, linked):
-        sdk_type = self.get_sdk_type()
+        sdk_type = self.get_sdk_type(fresh=True)
         sdk_type.linked = linked
         self._service.update(sdk_type)
+        self.invalidate()
 
     @property
     def mac_address(self):
@@ -220,9 +212,11 @@ class Vnic(SDKSubEntity):
 
     def hotunplug(self):
         self._service.deactivate()
+        self.invalidate()
 
     def hotplug(self):
         self._service.activate()
+        self.invalidate()
 
     def _get_parent_service(self, vm):
         return vm.service.nics_service()
@@ -239,19 +233,16 @@ class Vnic(SDKSubEntity):
 
     @vnic_profile.setter
     def vnic_profile(self, new_profile):
-        sdk_nic = self.get_sdk_type()
+        sdk_nic = self.get_sdk_type(fresh=True)
         if sdk_nic.vnic_profile is None:
             sdk_nic.vnic_profile = new_profile.get_sdk_type()
         sdk_nic.vnic_profile.id = new_profile.id
         self.service.update(sdk_nic)
+        self.invalidate()
 
 
 class NetworkFilter(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     def _get_parent_service(self, system):
         return system.network_filters_service
 
@@ -260,18 +251,14 @@ class NetworkFilter(SDKRootEntity):
 
     @staticmethod
     def iterate(system):
-        for sdk_obj in system.network_filters_service.list():
+        for sdk_obj in querylib.iterate(system.network_filters_service):
             network_filter = NetworkFilter(system)
-            network_filter.import_by_id(sdk_obj.id)
+            network_filter.import_sdk_type(sdk_obj)
             yield network_filter
 
 
 class QoS(SDKSubEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     def create(self,
                name,
                qos_type,
@@ -21,6 +21,7 @@ from contextlib import contextmanager
 
 from ovirtsdk4 import types
 
+from ovirtlib import querylib
 from ovirtlib import syncutil
 from ovirtlib.sdkentity import SDKRootEntity
 from ovirtlib.sdkentity import SDKSubEntity
@@ -39,13 +40,8 @@ class OpenStackImageProviders(SDKRootEntity):
 
     def is_provider_available(self, provider_name):
         providers_service = self.system.openstack_image_providers_service
-        try:
-            provider = next(provider for provider in providers_service.list()
-                            if provider.name == provider_name)
-        except StopIteration:
-            return False
-        provider_service = providers_service.service(provider.id)
-        return provider_service is not None
+        provider = querylib.find_by_name(providers_service, provider_name)
+        return provider is not None
 
     def wait_until_available(self):
         syncutil.sync(
@@ -84,6 +80,7 @@ class OpenStackNetworkProvider(SDKRootEntity):
         self.service.update(
             types.OpenStackNetworkProvider(auto_sync=False)
         )
+        self.invalidate()
         try:
             yield
         finally:
@@ -91,6 +88,7 @@ class OpenStackNetworkProvider(SDKRootEntity):
                 self.service.update(
                     types.OpenStackNetworkProvider(auto_sync=orig_auto_sync)
                 )
+                self.invalidate()
 
 
 class OpenStackNetwork(SDKSubEntity):
@@ -0,0 +1,156 @@
+#
+# Copyright 2017 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+import inspect
+import threading
+
+import ovirtsdk4
+
+#: Number of entities fetched per request by iterate()
+PAGE_SIZE = 100
+
+_list_params = {}
+
+
+def service_key(service):
+    """
+    Key of the entity or collection a service is of, the same for all the
+    service objects of it
+    """
+    return getattr(service, '_path', None) or id(service)
+
+
+def supports(service, param):
+    """
+    :param service: collection service
+    :param param: str, e.g. 'search' or 'follow'
+    :return: True if the list method of the service accepts the parameter
+    """
+    service_type = type(service)
+    if service_type not in _list_params:
+        try:
+            params = inspect.signature(service.list).parameters
+        except AttributeError:
+            params = inspect.getargspec(service.list).args
+        _list_params[service_type] = frozenset(params)
+    return param in _list_params[service_type]
+
+
+def quote(value):
+    return '"{}"'.format(str(value).replace('"', '\\"'))
+
+
+def search(service, query, predicate=lambda sdk_obj: True, follow=None):
+    """
+    Lists the entities of a collection that match the predicate. The query
+    is sent to the engine if the collection supports searching, to only
+    fetch the entities it matches, so the predicate has to accept at least
+    the entities the query matches.
+
+    :param service: collection service
+    :param query: str, search query understood by the engine
+    :param predicate: callable, gets an sdk object and returns True if it
+    is one of the wanted ones
+    :param follow: str, links to fetch along with the entities, if the
+    collection supports it
+    :return: []sdk objects
+    """
+    kwargs = {}
+    if query and supports(service, 'search'):
+        kwargs['search'] = query
+    if follow and supports(service, 'follow'):
+        kwargs['follow'] = follow
+    return [sdk_obj for sdk_obj in service.list(**kwargs)
+            if predicate(sdk_obj)]
+
+
+def find_by_name(service, name, index=None):
+    """
+    :param service: collection service
+    :param name: str
+    :param index: CollectionIndex, to look the name up in if the collection
+    doesn't support searching, instead of listing it each time
+    :return: the sdk object of the entity with the name, or None
+    """
+    if not supports(service, 'search') and index is not None:
+        return index.find(service, name)
+    return next(iter(search(service, 'name={}'.format(quote(name)),
+                            lambda sdk_obj: sdk_obj.name == name)), None)
+
+
+def iterate(service, query=None, page_size=PAGE_SIZE):
+    """
+    Iterates over the entities of a collection, fetching them page by page
+    if the collection supports searching, and all at once otherwise. Pages
+    are sorted by name, unless the query sorts them, so the entities don't
+    move between pages while they are fetched.
+
+    :param service: collection service
+    :param query: str, search query understood by the engine
+    :param page_size: int
+    """
+    if not supports(service, 'search'):
+        for sdk_obj in service.list():
+            yield sdk_obj
+        return
+
+    query = (query or '').strip()
+    if 'sortby' not in query.split():
+        query = '{} sortby name asc'.format(query).strip()
+    page = 1
+    while True:
+        page_query = '{} page {}'.format(query, page)
+        sdk_objs = service.list(search=page_query, max=page_size)
+        for sdk_obj in sdk_objs:
+            yield sdk_obj
+        if len(sdk_objs) < page_size:
+            return
+        page += 1
+
+
+class CollectionIndex(object):
+    """
+    Index of the entities of the collections that don't support searching,
+    by name. A collection is listed when it's first looked up, and listed
+    again when a name isn't found in it, or the entity found for a name
+    was removed or renamed since.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def find(self, service, name):
+        key = service_key(service)
+        with self._lock:
+            sdk_obj = self._indexes.get(key, {}).get(name)
+        if sdk_obj is not None:
+            try:
+                current = service.service(sdk_obj.id).get()
+            except ovirtsdk4.NotFoundError:
+                current = None
+            if current is not None and current.name == name:
+                return current
+        index = {}
+        for sdk_obj in service.list():
+            # the first entity listed wins, as in a lookup of the list
+            index.setdefault(sdk_obj.name, sdk_obj)
+        with self._lock:
+            self._indexes[key] = index
+        return index.get(name)
@@ -18,11 +18,19 @@
 # Refer to the README and COPYING files for full details of the license
 #
 import abc
+import threading
+import time
 
 import six
 
 import ovirtsdk4
 
+from ovirtlib import querylib
+
+#: Seconds a snapshot of the state of an entity is used for, unless it's
+#: invalidated earlier
+SNAPSHOT_TTL = 5
+
 
 class EntityAlreadyInitialized(Exception):
     pass
@@ -36,6 +44,58 @@ class EntityCreationError(Exception):
     pass
 
 
+class EntitySnapshots(object):
+    """
+    Snapshots of the state of entities, as returned by the GET of their
+    services. They are keyed by the path of the service, so all the
+    SDKEntity objects of the same engine entity share them, e.g. the hosts
+    imported by several tests of the same SDKSystemRoot.
+
+    A snapshot is returned for `ttl` seconds after it was read, unless a
+    fresh one is asked for or it was invalidated, which entities do after
+    changing themselves.
+    """
+
+    def __init__(self, ttl=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, service, fresh=False):
+        key = querylib.service_key(service)
+        if not fresh:
+            with self._lock:
+                snapshot = self._snapshots.get(key)
+            if snapshot is not None and \
+                    time.time() - snapshot[0] < self.ttl:
+                return snapshot[1]
+        sdk_type = service.get()
+        with self._lock:
+            self._snapshots[key] = (time.time(), sdk_type)
+        return sdk_type
+
+    def put(self, service, sdk_type):
+        """
+        Stores a snapshot of an entity read otherwise than with the GET of
+        its service, e.g. by listing its collection
+        """
+        with self._lock:
+            self._snapshots[querylib.service_key(service)] = (
+                time.time(), sdk_type
+            )
+
+    def invalidate(self, service=None):
+        """
+        Drops the snapshot of the entity of the service, or all of them if
+        no service is given
+        """
+        with self._lock:
+            if service is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(querylib.service_key(service), None)
+
+
 @six.add_metaclass(abc.ABCMeta)
 class SDKEntity(object):
 
@@ -43,10 +103,21 @@ class SDKEntity(object):
         self._service = None
         self._parent_service = None
         self._parent_sdk_system = None
+        self._id = None
+        self._name = None
+        self._own_snapshots = None
 
     @property
     def id(self):
-        return self._service.get().id
+        if self._id is None:
+            self._id = self.get_sdk_type().id
+        return self._id
+
+    @property
+    def name(self):
+        if self._name is None:
+            self._name = self.get_sdk_type().name
+        return self._name
 
     @property
     def service(self):
@@ -56,8 +127,28 @@ class SDKEntity(object):
     def system(self):
         return self._parent_sdk_system
 
-    def get_sdk_type(self):
-        return self._service.get()
+    def get_sdk_type(self, fresh=False):
+        """
+        :param fresh: bool, read the state of the entity from the engine
+        even if a snapshot of it was read less than SNAPSHOT_TTL seconds ago
+        """
+        return self._snapshots.get(self._service, fresh)
+
+    def invalidate(self):
+        """
+        Drops the snapshot of the state of the entity, to be called after
+        changing it
+        """
+        self._snapshots.invalidate(self._service)
+
+    @property
+    def _snapshots(self):
+        snapshots = getattr(self._parent_sdk_system, 'entity_snapshots', None)
+        if snapshots is not None:
+            return snapshots
+        if self._own_snapshots is None:
+            self._own_snapshots = EntitySnapshots()
+        return self._own_snapshots
 
     @abc.abstractmethod
     def create(self, *args, **kwargs):
@@ -67,29 +158,45 @@ class SDKEntity(object):
         pass
 
     def import_by_name(self, name):
-        entities = (entity for entity in self._parent_service.list()
-                    if entity.name == name)
-        try:
-            entity_id = next(entities).id
-        except StopIteration:
+        sdk_type = querylib.find_by_name(
+            self._parent_service, name,
+            getattr(self._parent_sdk_system, 'collection_index', None)
+        )
+        if sdk_type is None:
             raise EntityNotFoundError(
                 'entity "{}" was not found.'.format(name)
             )
-        service = self._parent_service.service(entity_id)
-        self._set_service(service)
+        self.import_sdk_type(sdk_type)
 
     def import_by_id(self, entity_id):
         service = self._parent_service.service(entity_id)
-        self._set_service(service)
+        self._set_service(service, entity_id)
+
+    def import_sdk_type(self, sdk_type):
+        """
+        Imports the entity of an sdk object listed from its collection, and
+        keeps the object as the snapshot of the entity
+        """
+        self.import_by_id(sdk_type.id)
+        self._name = sdk_type.name
+        self._snapshots.put(self._service, sdk_type)
 
     def remove(self):
-        self._service.remove()
+        try:
+            self._service.remove()
+        finally:
+            self.invalidate()
 
     def update(self, **kwargs):
-        sdk_type = self.get_sdk_type()
+        sdk_type = self.get_sdk_type(fresh=True)
         for key, value in six.viewitems(kwargs):
             setattr(sdk_type, key, value)
-        self._service.update(sdk_type)
+        try:
+            self._service.update(sdk_type)
+        finally:
+            self.invalidate()
+            if 'name' in kwargs:
+                self._name = None
 
     def _create_sdk_entity(self, sdk_type):
         try:
@@ -97,12 +204,13 @@ class SDKEntity(object):
         except ovirtsdk4.Error as err:
             raise EntityCreationError(err.args[0])
         service = self._parent_service.service(entity_id)
-        self._set_service(service)
+        self._set_service(service, entity_id)
 
-    def _set_service(self, service):
+    def _set_service(self, service, entity_id=None):
         if self._service is not None:
             raise EntityAlreadyInitialized
         self._service = service
+        self._id = entity_id
 
 
 @six.add_metaclass(abc.ABCMeta)
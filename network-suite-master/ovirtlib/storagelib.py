@@ -22,6 +22,7 @@ import contextlib
 from ovirtsdk4 import types
 
 from ovirtlib import error
+from ovirtlib import querylib
 from ovirtlib import syncutil
 from ovirtlib.sdkentity import SDKRootEntity
 
@@ -117,10 +118,6 @@ class StorageDomainStatus(object):
 
 class StorageDomain(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     @property
     def status(self):
         return self.get_sdk_type().status
@@ -151,7 +148,10 @@ class StorageDomain(SDKRootEntity):
         self._create_sdk_entity(sdk_type)
 
     def destroy(self):
-        self._service.remove(destroy=True)
+        try:
+            self._service.remove(destroy=True)
+        finally:
+            self.invalidate()
 
     def destroy_sync(self):
         syncutil.sync(
@@ -163,7 +163,7 @@ class StorageDomain(SDKRootEntity):
         return system.storage_domains_service
 
     def _wait_for_status(self, status):
-        syncutil.sync(exec_func=lambda: self.status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s == status)
 
@@ -175,11 +175,10 @@ class StorageDomain(SDKRootEntity):
         :type template_name: string
         """
         images_service = repo.service.images_service()
-        images = images_service.list()
-        try:
-            image = next(image for image in images
-                         if image.name == image_name)
-        except StopIteration:
+        image = querylib.find_by_name(
+            images_service, image_name, self.system.collection_index
+        )
+        if image is None:
             raise ImageNotFoundError
         image_service = images_service.service(image.id)
 
@@ -232,7 +231,7 @@ class Disk(SDKRootEntity):
         return system.disks_service
 
     def wait_for_up_status(self):
-        syncutil.sync(exec_func=lambda: self.status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s == types.DiskStatus.OK)
 
@@ -19,10 +19,28 @@
 #
 import collections
 import os
+import random
 import time
 
 
 DEFAULT_TIMEOUT = 120
+BACKOFF_INITIAL = 0.25
+BACKOFF_FACTOR = 1.5
+BACKOFF_MAX = 3
+BACKOFF_JITTER = 0.1
+
+_watcher = None
+
+
+def set_watcher(watcher):
+    """Set the watcher waking up the syncs that aren't given a wakeup event
+
+    :param watcher: object with subscribe() returning a threading.Event set
+                    whenever the state may have changed, and unsubscribe(event)
+                    (e.g. eventlib.EngineEventsWatcher), or None for none
+    """
+    global _watcher
+    _watcher = watcher
 
 
 class Timeout(Exception):
@@ -39,7 +57,8 @@ def sync(exec_func,
          exec_func_args,
          success_criteria=lambda result: True,
          error_criteria=lambda error: True,
-         timeout=DEFAULT_TIMEOUT):
+         timeout=DEFAULT_TIMEOUT,
+         wakeup=None):
     """Sync an operation until it either:
 
     - succeeds (according to the success_criteria specified)
@@ -63,15 +82,34 @@ def sync(exec_func,
     all results and all errors to return and raise respectively. The default
     timeout is 120 seconds.
 
+    Retries start fast and back off exponentially (with some jitter) up to
+    3 seconds between attempts. A caller may pass a wakeup threading.Event,
+    set whenever the state may have changed (e.g. on a new engine event), to
+    retry right away instead of waiting for the current backoff step. With
+    no wakeup, the watcher set with set_watcher is subscribed to, if any.
+
     :param exec_func: callable
     :param exec_func_args: tuple/dict
     :param success_criteria: callable
     :param error_criteria: callable
     :param timeout: int
+    :param wakeup: threading.Event
     :return: the result of running the exec_func
     """
     end_time = _monothonic_time() + timeout
+    watcher = _watcher if wakeup is None else None
+    if watcher is not None:
+        wakeup = watcher.subscribe()
+    try:
+        return _sync(exec_func, exec_func_args, success_criteria,
+                     error_criteria, end_time, wakeup)
+    finally:
+        if watcher is not None:
+            watcher.unsubscribe(wakeup)
 
+
+def _sync(exec_func, exec_func_args, success_criteria, error_criteria,
+          end_time, wakeup):
     if isinstance(exec_func_args, collections.Mapping):
         kwargs = exec_func_args
         args = ()
@@ -89,8 +127,11 @@ def sync(exec_func,
         if success_criteria(result):
             return result
 
-    while _monothonic_time() < end_time:
-        time.sleep(3)
+    for delay in _backoff():
+        remaining = end_time - _monothonic_time()
+        if remaining <= 0:
+            break
+        _sleep(min(delay, remaining), wakeup)
         try:
             result = exec_func(*args, **kwargs)
         except Exception as e:
@@ -104,5 +145,20 @@ def sync(exec_func,
     raise Timeout(result)
 
 
+def _backoff():
+    delay = BACKOFF_INITIAL
+    while True:
+        yield delay * (1 + random.uniform(-BACKOFF_JITTER, BACKOFF_JITTER))
+        delay = min(delay * BACKOFF_FACTOR, BACKOFF_MAX)
+
+
+def _sleep(seconds, wakeup):
+    if wakeup is None:
+        time.sleep(seconds)
+    else:
+        wakeup.wait(seconds)
+        wakeup.clear()
+
+
 def _monothonic_time():
     return os.times()[4]
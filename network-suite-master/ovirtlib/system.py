@@ -18,11 +18,16 @@
 #
 from ovirtsdk4 import Connection
 
+from ovirtlib.querylib import CollectionIndex
+from ovirtlib.sdkentity import EntitySnapshots
+
 
 class SDKSystemRoot(object):
 
     def __init__(self):
         self._system_service = None
+        self.entity_snapshots = EntitySnapshots()
+        self.collection_index = CollectionIndex()
 
     @property
     def disks_service(self):
@@ -72,6 +77,10 @@ class SDKSystemRoot(object):
     def events_service(self):
         return self._system_service.events_service()
 
+    @property
+    def jobs_service(self):
+        return self._system_service.jobs_service()
+
     @property
     def openstack_network_providers_service(self):
         return self._system_service.openstack_network_providers_service()
@@ -30,6 +30,7 @@ from ovirtsdk4 import types
 
 from ovirtlib import netlib
 from ovirtlib import clusterlib
+from ovirtlib import querylib
 from ovirtlib import syncutil
 from ovirtlib.sdkentity import EntityNotFoundError
 from ovirtlib.sdkentity import SDKRootEntity
@@ -61,10 +62,6 @@ class SnapshotNotInPreviewError(Exception):
 
 class Vm(SDKRootEntity):
 
-    @property
-    def name(self):
-        return self.get_sdk_type().name
-
     @property
     def host(self):
         return self.get_sdk_type().host
@@ -75,6 +72,7 @@ class Vm(SDKRootEntity):
 
     def run(self):
         self._service.start()
+        self.invalidate()
 
     def run_once(self, cloud_init_hostname=None):
         vm_definition = self._cloud_init_vm_definition(cloud_init_hostname)
@@ -82,6 +80,7 @@ class Vm(SDKRootEntity):
             use_cloud_init=self._uses_cloud_init(vm_definition),
             vm=vm_definition
         )
+        self.invalidate()
 
     def _cloud_init_vm_definition(self, cloud_init_hostname):
         if cloud_init_hostname:
@@ -104,18 +103,21 @@ class Vm(SDKRootEntity):
             if VM_IS_NOT_RUNNING in e.args[0]:
                 return
             raise
+        finally:
+            self.invalidate()
 
     def snapshots(self, snapshot_id=None):
         snapshots = []
         for ss in self._service.snapshots_service().list():
             if snapshot_id is None or snapshot_id == ss.id:
                 snapshot = VmSnapshot(self)
-                snapshot.import_by_id(ss.id)
+                snapshot.import_sdk_type(ss)
                 snapshots.append(snapshot)
         return snapshots
 
     def migrate(self, dst_host_name):
         self._service.migrate(host=types.Host(name=dst_host_name))
+        self.invalidate()
 
     def create_vnic(self, vnic_name, vnic_profile, mac_addr=None):
         vnic = netlib.Vnic(self)
@@ -130,9 +132,9 @@ class Vm(SDKRootEntity):
         return vnic
 
     def vnics(self):
-        for nic_service in self._service.nics_service().list():
+        for sdk_nic in self._service.nics_service().list():
             vnic = netlib.Vnic(self)
-            vnic.import_by_id(nic_service.id)
+            vnic.import_sdk_type(sdk_nic)
             yield vnic
 
     def attach_disk(self, disk, interface=types.DiskInterface.VIRTIO,
@@ -145,6 +147,7 @@ class Vm(SDKRootEntity):
         )
         disk_attachments_service = self._service.disk_attachments_service()
         disk_attachment = disk_attachments_service.add(params)
+        self.invalidate()
         return disk_attachment.id
 
     def remove(self):
@@ -213,7 +216,7 @@ class Vm(SDKRootEntity):
         return system.vms_service
 
     def _wait_for_status(self, statuses):
-        syncutil.sync(exec_func=lambda: self.status,
+        syncutil.sync(exec_func=lambda: self.get_sdk_type(fresh=True).status,
                       exec_func_args=(),
                       success_criteria=lambda s: s in statuses)
 
@@ -241,9 +244,9 @@ class Vm(SDKRootEntity):
 
     @staticmethod
     def iterate(system):
-        for sdk_obj in system.vms_service.list():
+        for sdk_obj in querylib.iterate(system.vms_service):
             vm = Vm(system)
-            vm.import_by_id(sdk_obj.id)
+            vm.import_sdk_type(sdk_obj)
             yield vm
 
 
@@ -263,16 +266,19 @@ class VmSnapshot(SDKSubEntity):
         if self.get_sdk_type().snapshot_status != SnapshotStatus.IN_PREVIEW:
             raise SnapshotNotInPreviewError
         self._parent_sdk_entity.service.commit_snapshot()
+        self._invalidate_with_vm()
 
     def preview(self):
         self._parent_sdk_entity.service.preview_snapshot(
             snapshot=self.get_sdk_type()
         )
+        self._invalidate_with_vm()
 
     def undo_preview(self):
         if self.get_sdk_type().snapshot_status != SnapshotStatus.IN_PREVIEW:
             raise SnapshotNotInPreviewError
         self._parent_sdk_entity.service.undo_snapshot()
+        self._invalidate_with_vm()
 
     def restore(self):
         if self.get_sdk_type().snapshot_status == SnapshotStatus.IN_PREVIEW:
@@ -281,17 +287,22 @@ class VmSnapshot(SDKSubEntity):
             self._service.restore(
                 restore_memory=self.get_sdk_type().persist_memorystate
             )
+        self._invalidate_with_vm()
+
+    def _invalidate_with_vm(self):
+        self.invalidate()
+        self._parent_sdk_entity.invalidate()
 
     def wait_for_ready_status(self):
         syncutil.sync(
-            exec_func=lambda: self.get_sdk_type().snapshot_status,
+            exec_func=lambda: self.get_sdk_type(fresh=True).snapshot_status,
             exec_func_args=(),
             success_criteria=lambda status: status == SnapshotStatus.READY
         )
 
     def wait_for_preview_status(self):
         syncutil.sync(
-            exec_func=lambda: self.get_sdk_type().snapshot_status,
+            exec_func=lambda: self.get_sdk_type(fresh=True).snapshot_status,
             exec_func_args=(),
             success_criteria=lambda status: status == SnapshotStatus.IN_PREVIEW
         )
@@ -305,7 +316,7 @@ class VmSnapshot(SDKSubEntity):
 
     def _is_snapshot_present(self):
         try:
-            self.get_sdk_type()
+            self.get_sdk_type(fresh=True)
         except ovirtsdk4.NotFoundError:
             return False
         return True
@@ -17,15 +17,30 @@
 #
 # Refer to the README and COPYING files for full details of the license
 #
-import BaseHTTPServer
+import logging
 import os
+import re
 import threading
-from SimpleHTTPServer import SimpleHTTPRequestHandler
+import time
 
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.SimpleHTTPServer import SimpleHTTPRequestHandler
 
-def create_repo_server(workdir, lago_env):
-    REPO_SERVER_PORT = 8585
 
+LOGGER = logging.getLogger(__name__)
+
+REPO_SERVER_PORT = 8585
+# Seconds an idle persistent connection is kept open
+KEEP_ALIVE_TIMEOUT = 30
+# Connections waiting to be accepted, yum on every host opens a few
+LISTEN_BACKLOG = 128
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def create_repo_server(workdir, lago_env):
     mgmt_net = next(net for net in lago_env.get_nets().values() if
                     net.is_management())
     gw = mgmt_net.gw()
@@ -40,16 +55,94 @@ def create_repo_server(workdir, lago_env):
 
 
 def _create_http_server(listen_ip, listen_port, root_dir):
-    return BaseHTTPServer.HTTPServer(
+    return _ThreadingHTTPServer(
         (listen_ip, listen_port),
         _generate_request_handler(root_dir),
     )
 
 
+class _Stats(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.sent_bytes = 0
+        self.seconds = 0.0
+        self.slowest = (0.0, None)
+
+    def add(self, path, sent_bytes, seconds):
+        with self._lock:
+            self.requests += 1
+            self.sent_bytes += sent_bytes
+            self.seconds += seconds
+            self.slowest = max(self.slowest, (seconds, path))
+
+    def __str__(self):
+        with self._lock:
+            return (
+                '{} requests, {:.1f} MB sent, {:.3f}s average latency, '
+                'slowest {} in {:.3f}s'.format(
+                    self.requests,
+                    self.sent_bytes / 2.0 ** 20,
+                    self.seconds / self.requests if self.requests else 0,
+                    self.slowest[1],
+                    self.slowest[0],
+                )
+            )
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    """
+    Serves each connection in a thread of its own, so the hosts installing
+    packages at the same time don't wait for each other
+    """
+
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.stats = _Stats()
+
+    def shutdown(self):
+        BaseHTTPServer.HTTPServer.shutdown(self)
+        self.server_close()
+        LOGGER.info('Repo server: %s', self.stats)
+
+
+# Same as parse_range in common/scripts/glance_mirror.py, keep them in sync.
+# The network suite does not depend on ost_utils or on the common scripts,
+# so it has its own copy.
+def _parse_range(header, size):
+    """
+    :return: the first and last bytes of the single range requested by the
+    header, None if the whole file should be sent
+    :raise ValueError: if the range can't be satisfied
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        first, last = max(0, size - int(last)), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError('Range {} is out of {} bytes'.format(header, size))
+    return first, last
+
+
 def _generate_request_handler(root_dir):
     class _BetterHTTPRequestHandler(SimpleHTTPRequestHandler):
         __root_dir = root_dir
 
+        protocol_version = 'HTTP/1.1'
+        timeout = KEEP_ALIVE_TIMEOUT
+
         def translate_path(self, path):
             t_path = SimpleHTTPRequestHandler.translate_path(self, path)
             short_t_path = t_path[len(os.getcwd()):].lstrip('/')
@@ -59,4 +152,96 @@ def _generate_request_handler(root_dir):
         def log_message(self, *args, **kwargs):
             pass
 
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def _serve(self, send_body):
+            start = time.time()
+            path = self.translate_path(self.path)
+            if os.path.isfile(path):
+                sent = self._send_file(path, send_body)
+            else:
+                # directory listings, redirects and errors, that may be sent
+                # with no length
+                self.close_connection = True
+                if send_body:
+                    SimpleHTTPRequestHandler.do_GET(self)
+                else:
+                    SimpleHTTPRequestHandler.do_HEAD(self)
+                sent = 0
+            latency = time.time() - start
+            self.server.stats.add(self.path, sent, latency)
+            LOGGER.debug(
+                '%s %s %s: %s bytes in %.3fs', self.client_address[0],
+                self.command, self.path, sent, latency
+            )
+
+        def _send_file(self, path, send_body):
+            try:
+                f = open(path, 'rb')
+            except IOError:
+                self.send_error(404, 'File not found')
+                return 0
+            with f:
+                stat = os.fstat(f.fileno())
+                size = stat.st_size
+                try:
+                    byte_range = _parse_range(self.headers.get('Range'), size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header(
+                        'Content-Range', 'bytes */{}'.format(size)
+                    )
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return 0
+
+                if byte_range is None:
+                    first, last = 0, size - 1
+                    self.send_response(200)
+                else:
+                    first, last = byte_range
+                    self.send_response(206)
+                    self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                        first, last, size
+                    ))
+                self.send_header('Content-Type', self.guess_type(path))
+                self.send_header('Content-Length', str(last - first + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header(
+                    'Last-Modified', self.date_time_string(stat.st_mtime)
+                )
+                self.end_headers()
+                if not send_body or size == 0:
+                    return 0
+                sent = self._copy(f, first, last - first + 1)
+                if sent < last - first + 1:
+                    # the file was truncated, the client can't tell where
+                    # the response ends
+                    self.close_connection = True
+                return sent
+
+        def _copy(self, f, offset, count):
+            """
+            Sends 'count' bytes of the file from 'offset', with sendfile
+            where it's available. python 2 has no socket.sendfile, and
+            os.sendfile fails on sockets with a timeout.
+            """
+            self.wfile.flush()
+            if hasattr(self.connection, 'sendfile'):
+                return self.connection.sendfile(f, offset, count)
+
+            f.seek(offset)
+            remaining = count
+            while remaining > 0:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+            return count - remaining
+
     return _BetterHTTPRequestHandler
@@ -18,11 +18,17 @@
 # Refer to the README and COPYING files for full details of the license
 #
 import contextlib
+import logging
 import os
+import shutil
+import subprocess
+import sys
 
 import pytest
 
 
+LOGGER = logging.getLogger(__name__)
+
 SUITE_NAME = os.path.split(os.environ['SUITE'])[-1]
 
 
@@ -52,4 +58,25 @@ def collect_artifacts(env, artifacts_path, module_name):
     finally:
         p = os.path.join(artifacts_path, module_name)
         os.makedirs(p)
-        env.collect_artifacts(output_dir=p, ignore_nopath=True)
+        _collect_artifacts(env, p)
+
+
+def _collect_artifacts(env, output_dir):
+    """
+    Stream the artifacts of all the VMs in parallel, and fall back to the
+    sequential lago collection if that fails
+    """
+    try:
+        collector = os.path.join(
+            os.environ['OST_REPO_ROOT'], 'common', 'scripts',
+            'collect_artifacts.py'
+        )
+        subprocess.check_call([
+            sys.executable, collector, '--full', os.environ['PREFIX'],
+            output_dir
+        ])
+    except (KeyError, OSError, subprocess.CalledProcessError) as err:
+        LOGGER.warning('Streamed artifact collection failed: %s', err)
+        shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+        env.collect_artifacts(output_dir=output_dir, ignore_nopath=True)
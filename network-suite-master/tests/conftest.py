@@ -38,6 +38,7 @@ from fixtures.host import install_hosts_to_save_time  # NOQA: F401
 
 from fixtures.engine import engine  # NOQA: F401
 from fixtures.engine import api  # NOQA: F401
+from fixtures.engine import engine_events_watcher  # NOQA: F401
 from fixtures.engine import test_invocation_logger  # NOQA: F401
 
 from fixtures.fqdn import fqdn  # NOQA: F401
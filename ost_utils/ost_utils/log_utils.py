@@ -21,13 +21,17 @@
 This module defines the special logging tools that lago uses
 """
 from future.builtins import super
+import gzip
 import logging
 import logging.config
+import logging.handlers
 import os
 import re
+import shutil
 import traceback
 import datetime
 import threading
+import time
 import uuid as uuid_m
 import sys
 from collections import (
@@ -36,6 +40,11 @@ from collections import (
 )
 from functools import wraps
 
+import six
+from six.moves import queue
+
+from ost_utils import profiler
+
 #: Message to be shown when a task is started
 START_TASK_MSG = ''
 #: Message template that will trigger a task
@@ -53,6 +62,86 @@ END_TASK_REG = re.compile('end task(?P<task_name>.*)')
 ALWAYS_SHOW_TRIGGER_MSG = 'force-show:%s'
 #: Regexp that will match the above template
 ALWAYS_SHOW_REG = re.compile('force-show:(?P<message>.*)')
+#: Prefixes of all the trigger messages, to skip the regexps for any other
+TRIGGER_MSG_PREFIXES = ('start task', 'end task', 'force-show:')
+#: Log record attribute that marks a task boundary, and its values
+TASK_EVENT_ATTR = 'ost_task_event'
+TASK_NAME_ATTR = 'ost_task_name'
+TASK_START = 'start'
+TASK_END = 'end'
+#: Environment variable with the path of the file to record the start and
+#: end times of tasks and tests in, to align them with the host metrics (see
+#: common/scripts/stream_metrics.py)
+EVENTS_FILE_ENV = 'OST_METRICS_EVENTS'
+
+
+def _task_event_extra(event, task):
+    return {TASK_EVENT_ATTR: event, TASK_NAME_ATTR: task}
+
+
+def record_event(source, event, name):
+    """
+    Appends an event line to the events file, if one is set in the
+    ``OST_METRICS_EVENTS`` environment variable. The lines are appended with
+    a single write, so several threads and processes can share the file.
+
+    Args:
+        source (str): what the event is about, 'task', 'test' or 'scenario'
+        event (str): ``TASK_START`` or ``TASK_END``
+        name (str): name of the task, test or scenario
+    """
+    path = os.environ.get(EVENTS_FILE_ENV)
+    if not path:
+        return
+
+    name = re.sub(r'\s', ' ', name)
+    line = '%.3f\t%s\t%s\t%s\n' % (time.time(), source, event, name)
+    if not isinstance(line, bytes):
+        line = line.encode('utf-8')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _get_task_event(record):
+    """
+    Args:
+        record (logging.LogRecord): log record to check
+
+    Returns:
+        tuple of str, str: the task event (``TASK_START``, ``TASK_END`` or
+            None) and the task name, or the message to force showing if the
+            event is None
+    """
+    event = getattr(record, TASK_EVENT_ATTR, None)
+    if event is not None:
+        return event, getattr(record, TASK_NAME_ATTR)
+
+    # Records logged with the plain trigger messages, without the structured
+    # attributes
+    msg = record.msg
+    if not isinstance(msg, six.string_types) or \
+            not msg.startswith(TRIGGER_MSG_PREFIXES):
+        return None, None
+
+    is_start = START_TASK_REG.match(msg)
+    if is_start:
+        return TASK_START, is_start.groupdict()['task_name']
+
+    is_end = END_TASK_REG.match(msg)
+    if is_end:
+        return TASK_END, is_end.groupdict()['task_name']
+
+    force_show_record = ALWAYS_SHOW_REG.match(msg)
+    if force_show_record:
+        return None, force_show_record.groupdict()['message']
+
+    return None, None
 
 
 class LevelFilter(logging.Filter):
@@ -182,6 +271,53 @@ class ContextLock(object):
         self.lock.release()
 
 
+#: Thread names, and the name of the thread whose log tasks they inherit
+_log_context_parents = {}
+
+
+def inherit_log_context(parent_thread_name):
+    """
+    Nest the log tasks of the current thread under the tasks that are
+    currently open in the given thread, instead of under the main thread
+    ones
+
+    Args:
+        parent_thread_name (str): name of the thread to inherit the tasks of
+
+    Returns:
+        None
+    """
+    _log_context_parents[threading.current_thread().name] = parent_thread_name
+
+
+def forget_log_context():
+    """
+    Undo :func:`inherit_log_context` for the current thread
+
+    Returns:
+        None
+    """
+    _log_context_parents.pop(threading.current_thread().name, None)
+
+
+def _get_log_context_parents(thread_name):
+    """
+    Args:
+        thread_name (str): name of the thread to get the parents of
+
+    Returns:
+        list of str: names of the threads whose tasks the given thread
+            inherits, the closest first and the main thread last
+    """
+    parents = []
+    while thread_name != 'MainThread':
+        thread_name = _log_context_parents.get(thread_name, 'MainThread')
+        if thread_name in parents:
+            break
+        parents.append(thread_name)
+    return parents
+
+
 class TaskHandler(logging.StreamHandler):
     """
     This log handler will use the concept of tasks, to hide logs, and will show
@@ -219,8 +355,13 @@ class TaskHandler(logging.StreamHandler):
             reached
         main_failed (bool): used to flag from a child thread that the main
             should fail any current task
+        flush_interval (float): max seconds to keep the shown records in the
+            stream buffer, task headers and warnings are flushed right away,
+            and the rest by a timer if no other record comes in meanwhile
         _tasks_lock (ContextLock): Lock for the tasks_by_thread dict
         _main_thread_lock (ContextLock): Lock for the main_failed bool
+        _local (threading.local): the current thread name and tasks, to avoid
+            looking them up for every record
     """
     #: List of chars to show as task prefix, to ease distinguishing them
     TASK_INDICATORS = ['@', '#', '*', '-', '~']
@@ -233,6 +374,7 @@ class TaskHandler(logging.StreamHandler):
         dump_level=logging.ERROR,
         level=logging.NOTSET,
         formatter=ColorFormatter,
+        flush_interval=0.5,
     ):
         super().__init__()
         self.formatter = formatter
@@ -243,8 +385,13 @@ class TaskHandler(logging.StreamHandler):
         self.task_tree_depth = task_tree_depth
         self.level = level
         self.main_failed = False
+        self.flush_interval = flush_interval
         self._tasks_lock = ContextLock()
         self._main_thread_lock = ContextLock()
+        self._local = threading.local()
+        self._defer_flush = False
+        self._last_flush = 0
+        self._flush_timer = None
 
     @property
     def cur_task(self):
@@ -252,7 +399,8 @@ class TaskHandler(logging.StreamHandler):
         Returns:
             str: the current active task
         """
-        return self.tasks.keys()[-1] if self.tasks else None
+        tasks = self.tasks
+        return next(reversed(tasks)) if tasks else None
 
     @property
     def cur_thread(self):
@@ -260,7 +408,11 @@ class TaskHandler(logging.StreamHandler):
         Returns:
             str: Name of the current thread
         """
-        return threading.current_thread().name
+        try:
+            return self._local.thread_name
+        except AttributeError:
+            self._local.thread_name = threading.current_thread().name
+            return self._local.thread_name
 
     @property
     def tasks(self):
@@ -269,7 +421,11 @@ class TaskHandler(logging.StreamHandler):
             OrderedDict of str, Task: list of task names and log records for
                 each for the current thread
         """
-        return self.get_tasks(thread_name=self.cur_thread)
+        try:
+            return self._local.tasks
+        except AttributeError:
+            self._local.tasks = self.get_tasks(thread_name=self.cur_thread)
+            return self._local.tasks
 
     def get_tasks(self, thread_name):
         """
@@ -294,7 +450,8 @@ class TaskHandler(logging.StreamHandler):
         """
         cur_level = self.initial_depth
         if not self.am_i_main_thread:
-            cur_level += len(self.get_tasks(thread_name='MainThread'))
+            for thread_name in _get_log_context_parents(self.cur_thread):
+                cur_level += len(self.get_tasks(thread_name=thread_name))
 
         return cur_level + len(self.tasks)
 
@@ -304,7 +461,7 @@ class TaskHandler(logging.StreamHandler):
         Returns:
             bool: if the current thread is the main thread
         """
-        return threading.current_thread().name == 'MainThread'
+        return self.cur_thread == 'MainThread'
 
     def mark_main_tasks_as_failed(self):
         """
@@ -405,7 +562,7 @@ class TaskHandler(logging.StreamHandler):
             return
 
         while self.tasks:
-            next_task = reversed(self.tasks.keys()).next()
+            next_task = next(reversed(self.tasks))
             if next_task == parent_task_name:
                 break
             del self.tasks[next_task]
@@ -533,9 +690,61 @@ class TaskHandler(logging.StreamHandler):
                 '  ' * (task_level - 1) + extra_prefix + str(record.msg)
             )
 
-        super().emit(record)
+        # StreamHandler.emit flushes after every record, headers and
+        # warnings are flushed right away, anything else is flushed at most
+        # once per flush_interval
+        self._defer_flush = (
+            not is_header and record.levelno < logging.WARNING
+        )
+        try:
+            super().emit(record)
+        finally:
+            self._defer_flush = False
+
+    def flush(self):
+        """
+        Flush the stream, unless called while emitting a deferred record
+        less than ``flush_interval`` seconds after the last flush, in which
+        case the flush is left to a timer
+
+        Returns:
+            None
+        """
+        now = time.time()
+        if self._defer_flush and now - self._last_flush < self.flush_interval:
+            self._schedule_flush()
+            return
+        self._last_flush = now
         super().flush()
 
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(
+            self.flush_interval, self._idle_flush
+        )
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _idle_flush(self):
+        self.acquire()
+        try:
+            self._flush_timer = None
+            self.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        finally:
+            self.release()
+        self.flush()
+        super().close()
+
     def emit(self, record):
         """
         Handle the given record, this is the entry point from the python
@@ -547,26 +756,26 @@ class TaskHandler(logging.StreamHandler):
         Returns:
             None
         """
-        record.task = self.cur_task
+        cur_task = self.cur_task
+        record.task = cur_task
 
-        if record.levelno >= self.dump_level and self.cur_task:
-            self.tasks[self.cur_task].failed = True
-            self.tasks[self.cur_task].force_show = True
+        if record.levelno >= self.dump_level and cur_task:
+            self.tasks[cur_task].failed = True
+            self.tasks[cur_task].force_show = True
 
         # Makes no sense to start a task with an error log
-        is_start = START_TASK_REG.match(str(record.msg))
-        if is_start:
-            self.handle_new_task(is_start.groupdict()['task_name'], record)
+        event, value = _get_task_event(record)
+        if event == TASK_START:
+            self.handle_new_task(value, record)
             return
 
-        is_end = END_TASK_REG.match(str(record.msg))
-        if is_end:
-            self.handle_closed_task(is_end.groupdict()['task_name'], record)
+        if event == TASK_END:
+            self.handle_closed_task(value, record)
             return
 
-        force_show_record = ALWAYS_SHOW_REG.match(str(record.msg))
+        force_show_record = value is not None
         if force_show_record:
-            record.msg = force_show_record.groupdict()['message']
+            record.msg = value
             self.pretty_emit(record)
 
         if (
@@ -576,8 +785,8 @@ class TaskHandler(logging.StreamHandler):
             self.pretty_emit(record)
             return
 
-        if self.cur_task:
-            self.tasks[self.cur_task].append(record)
+        if cur_task:
+            self.tasks[cur_task].append(record)
 
 
 class LogTask(object):
@@ -609,7 +818,7 @@ class LogTask(object):
 
 
     def __enter__(self):
-        getattr(self.logger, self.level)(START_TASK_TRIGGER_MSG % self.header)
+        start_log_task(self.header, logger=self.logger, level=self.level)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -619,8 +828,7 @@ class LogTask(object):
             self.logger.debug(str_tb)
             return False
         else:
-            getattr(self.logger,
-                    self.level)(END_TASK_TRIGGER_MSG % self.header)
+            end_log_task(self.header, logger=self.logger, level=self.level)
 
 
 def log_task(
@@ -652,7 +860,7 @@ def log_task(
     return decorator
 
 
-def start_log_task(task, logger=logging, level='info'):
+def start_log_task(task, logger=logging, level='info', source='task'):
     """
     Starts a log task
 
@@ -660,14 +868,21 @@ def start_log_task(task, logger=logging, level='info'):
         task (str): name of the log task to start
         logger (logging.Logger): logger to use
         level (str): log level to use
+        source (str): what the task is, for the events file and the
+            profiler, e.g. 'task' or 'test'
 
     Returns:
         None
     """
-    getattr(logger, level)(START_TASK_TRIGGER_MSG % task)
+    record_event(source, TASK_START, task)
+    profiler.start_span(task, source)
+    getattr(logger, level)(
+        START_TASK_TRIGGER_MSG % task,
+        extra=_task_event_extra(TASK_START, task),
+    )
 
 
-def end_log_task(task, logger=logging, level='info'):
+def end_log_task(task, logger=logging, level='info', source='task'):
     """
     Ends a log task
 
@@ -675,11 +890,17 @@ def end_log_task(task, logger=logging, level='info'):
         task (str): name of the log task to end
         logger (logging.Logger): logger to use
         level (str): log level to use
+        source (str): what the task is, as given to :func:`start_log_task`
 
     Returns:
         None
     """
-    getattr(logger, level)(END_TASK_TRIGGER_MSG % task)
+    getattr(logger, level)(
+        END_TASK_TRIGGER_MSG % task,
+        extra=_task_event_extra(TASK_END, task),
+    )
+    profiler.end_span(name=task)
+    record_event(source, TASK_END, task)
 
 
 def log_always(message):
@@ -697,6 +918,209 @@ def log_always(message):
     return ALWAYS_SHOW_TRIGGER_MSG % message
 
 
+#: What to do with a record when the log queue is full: wait for room in it
+#: (the default), or drop records under WARNING (warnings and errors always
+#: wait), which keeps the logging thread from waiting for the disk but loses
+#: the records, so it must be asked for
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+#: Max number of records waiting to be written by the log writer thread
+LOG_QUEUE_SIZE = 10000
+#: Max number of records written between two flushes of the log file
+LOG_WRITE_BATCH = 500
+
+
+class QueueHandler(logging.Handler):
+    """
+    Handler that only puts the records in a bounded queue, so the logging
+    thread does not wait for the disk. The records are written by a
+    :class:`QueueListener`.
+
+    Attributes:
+        queue (queue.Queue): queue to put the records into
+        overflow (str): ``OVERFLOW_BLOCK`` or ``OVERFLOW_DROP``
+        dropped (int): number of records dropped since the last report
+        total_dropped (int): number of records dropped since the start
+    """
+
+    def __init__(self, queue, overflow=OVERFLOW_BLOCK):
+        super().__init__()
+        self.queue = queue
+        self.overflow = overflow
+        self.dropped = 0
+        self.total_dropped = 0
+        self.listener = None
+
+    def prepare(self, record):
+        """
+        Copy the record and resolve its message, so its arguments and
+        traceback are not kept alive, nor changed by other handlers, until it
+        is written
+
+        Args:
+            record (logging.LogRecord): record to prepare
+
+        Returns:
+            logging.LogRecord: the copy to queue
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging._defaultFormatter.formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if (
+                self.overflow == OVERFLOW_BLOCK or
+                record.levelno >= logging.WARNING
+            ):
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self.total_dropped += 1
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def pop_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class QueueListener(object):
+    """
+    Writer thread for the records of a :class:`QueueHandler`. Writes them in
+    batches, flushing the handlers once per batch, and logs how many records
+    were dropped if the queue overflowed.
+
+    Attributes:
+        handler (QueueHandler): handler to get the queue from
+        targets (list of logging.Handler): handlers to write the records with
+    """
+    _STOP = object()
+
+    def __init__(self, handler, targets, batch=LOG_WRITE_BATCH):
+        self.handler = handler
+        self.targets = targets
+        self.batch = batch
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name='log-writer'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        self.handler.listener = self
+
+    def _write(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def _warn(self, msg):
+        self._write(
+            logging.makeLogRecord({
+                'name': __name__,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': msg,
+            })
+        )
+
+    def _report_dropped(self):
+        dropped = self.handler.pop_dropped()
+        if dropped:
+            self._warn('Log queue full, dropped %d records' % dropped)
+
+    def _run(self):
+        pending = self.handler.queue
+        stop = False
+        while not stop:
+            records = [pending.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._report_dropped()
+            for record in records:
+                if record is self._STOP:
+                    stop = True
+                    continue
+                self._write(record)
+
+            for target in self.targets:
+                target.flush()
+
+    def stop(self):
+        """
+        Write all the queued records and stop the writer thread
+
+        Returns:
+            None
+        """
+        if self._thread is None:
+            return
+        self.handler.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+        if self.handler.total_dropped:
+            message = (
+                'Log queue overflowed, dropped %d records under WARNING' %
+                self.handler.total_dropped
+            )
+            self._warn(message)
+            sys.stderr.write('WARNING: %s\n' % message)
+        for target in self.targets:
+            target.close()
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    :class:`logging.handlers.RotatingFileHandler` that gzips the rotated
+    segments (``lago.log.1.gz``, ``lago.log.2.gz``...)
+    """
+
+    def _segment(self, index):
+        return '%s.%d.gz' % (self.baseFilename, index)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if self.backupCount > 0:
+            for index in range(self.backupCount - 1, 0, -1):
+                if os.path.exists(self._segment(index)):
+                    os.rename(self._segment(index), self._segment(index + 1))
+
+            if os.path.exists(self.baseFilename):
+                with open(self.baseFilename, 'rb') as src:
+                    with gzip.open(self._segment(1), 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+
+        # Truncates the current segment
+        self.mode = 'w'
+        self.stream = self._open()
+
+
 def hide_paramiko_logs():
     paramiko_logger = logging.getLogger('paramiko.transport')
     paramiko_logger.propagate = False
@@ -704,7 +1128,14 @@ def hide_paramiko_logs():
 
 
 
-def setup_prefix_logging(logdir):
+def setup_prefix_logging(
+    logdir,
+    async_write=True,
+    queue_size=LOG_QUEUE_SIZE,
+    overflow=OVERFLOW_BLOCK,
+    max_bytes=0,
+    backup_count=5,
+):
     """
     Sets up a file logger that will create a log in the given logdir (usually a
     lago prefix)
@@ -712,6 +1143,15 @@ def setup_prefix_logging(logdir):
     Args:
         logdir (str): path to create the log into, will be created if it does
             not exist
+        async_write (bool): if True, the records are written to the file by a
+            background thread instead of the logging one
+        queue_size (int): max number of records waiting to be written
+        overflow (str): ``OVERFLOW_BLOCK`` (the default) to wait for room
+            in the queue, or ``OVERFLOW_DROP`` to drop the records under
+            WARNING that do not fit in it
+        max_bytes (int): if not 0, size of the log to rotate it at, the
+            rotated segments are compressed
+        backup_count (int): number of rotated segments to keep
 
     Returns:
         None
@@ -719,12 +1159,26 @@ def setup_prefix_logging(logdir):
     if not os.path.exists(logdir):
         os.mkdir(logdir)
 
-    file_handler = logging.FileHandler(
-        filename=os.path.join(logdir, 'lago.log'),
-    )
+    filename = os.path.join(logdir, 'lago.log')
+    if max_bytes:
+        file_handler = CompressedRotatingFileHandler(
+            filename=filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+        )
+    else:
+        file_handler = logging.FileHandler(filename=filename)
     file_formatter = get_default_log_formatter()
     file_handler.setFormatter(file_formatter)
-    logging.root.addHandler(file_handler)
+
+    if async_write:
+        queue_handler = QueueHandler(
+            queue.Queue(maxsize=queue_size), overflow=overflow
+        )
+        QueueListener(queue_handler, [file_handler]).start()
+        logging.root.addHandler(queue_handler)
+    else:
+        logging.root.addHandler(file_handler)
     hide_paramiko_logs()
 
 
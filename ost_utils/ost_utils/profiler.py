@@ -0,0 +1,260 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Records the log tasks, tests, waits and SSH commands of a run as spans, with
+the span they ran in and the thread that ran them, to find out afterwards
+what the run spent its time on (see common/scripts/profile_report.py).
+
+Spans are only recorded if the ``OST_PROFILE`` environment variable is set,
+to the path of the file to append them to, one JSON object per line.
+Several threads and processes can share the file. The spans of a process
+that started outside of any other span of it are nested under the span
+in ``OST_PROFILE_PARENT``, if set, e.g. the scenario the process runs.
+
+Spans that may overlap others in the same thread, like the tests run
+concurrently by :mod:`ost_utils.pytest.scheduler`, are opened with
+:func:`open_span`, out of the stack of the thread, and the code running for
+them, in any thread, is nested under them with :func:`activate`.
+"""
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+
+#: Environment variable with the path of the file to record the spans in
+PROFILE_FILE_ENV = 'OST_PROFILE'
+#: Environment variable with the id of the span to nest the spans of the
+#: process under
+PROFILE_PARENT_ENV = 'OST_PROFILE_PARENT'
+
+#: Thread names, and the spans currently open in them, the innermost last
+_open_spans = {}
+_ids = itertools.count(1)
+
+
+class Span(object):
+
+    def __init__(self, name, category, parent, args):
+        self.id = '%d-%d' % (os.getpid(), next(_ids))
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.args = args
+        self.thread = threading.current_thread()
+        self.start = time.time()
+        self.ended = False
+
+    def to_dict(self, end):
+        return {
+            'id': self.id,
+            'parent': self.parent,
+            'name': self.name,
+            'cat': self.category,
+            'pid': os.getpid(),
+            'tid': self.thread.ident,
+            'thread': self.thread.name,
+            'start': round(self.start, 6),
+            'end': round(end, 6),
+            'args': self.args,
+        }
+
+
+def enabled():
+    return bool(os.environ.get(PROFILE_FILE_ENV))
+
+
+def _parent_thread_names(thread_name):
+    # imported here, as log_utils records its tasks with this module
+    try:
+        from ost_utils import log_utils
+    except ImportError:
+        return [] if thread_name == 'MainThread' else ['MainThread']
+    return log_utils._get_log_context_parents(thread_name)
+
+
+def _current_parent():
+    thread_name = threading.current_thread().name
+    for name in [thread_name] + _parent_thread_names(thread_name):
+        spans = _open_spans.get(name)
+        if spans:
+            return spans[-1].id
+    return os.environ.get(PROFILE_PARENT_ENV) or None
+
+
+def _write(span_dict):
+    line = json.dumps(span_dict) + '\n'
+    if not isinstance(line, bytes):
+        line = line.encode('utf-8')
+    try:
+        fd = os.open(
+            os.environ[PROFILE_FILE_ENV],
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except (KeyError, OSError):
+        pass
+
+
+def start_span(name, category, **args):
+    """
+    Opens a span in the current thread, nested under the innermost span open
+    in it or in the threads it inherits the log context of.
+
+    Args:
+        name (str): name of the span
+        category (str): kind of span, e.g. 'task', 'test', 'wait' or 'ssh'
+        **args: details to record with the span
+
+    Returns:
+        Span: the opened span, or None if profiling is disabled
+    """
+    if not enabled():
+        return None
+    span = Span(name, category, _current_parent(), args)
+    _open_spans.setdefault(span.thread.name, []).append(span)
+    return span
+
+
+def open_span(name, category, parent=None, **args):
+    """
+    Opens a span out of the stack of the current thread: it is nested under
+    the given parent, or the span in ``OST_PROFILE_PARENT``, and the spans
+    opened later in the thread are not nested under it, unless it is
+    activated with :func:`activate`.
+
+    Args:
+        name (str): name of the span
+        category (str): kind of span
+        parent (Span): span to nest it under
+        **args: details to record with the span
+
+    Returns:
+        Span: the opened span, or None if profiling is disabled
+    """
+    if not enabled():
+        return None
+    if parent is not None:
+        parent_id = parent.id
+    else:
+        parent_id = os.environ.get(PROFILE_PARENT_ENV) or None
+    return Span(name, category, parent_id, args)
+
+
+def _remove(spans, span):
+    for index in range(len(spans) - 1, -1, -1):
+        if spans[index] is span:
+            del spans[index]
+            return
+
+
+@contextlib.contextmanager
+def activate(span):
+    """
+    Nests the spans the current thread opens in the block under the given
+    span, which may have been opened by another thread or with
+    :func:`open_span`
+
+    Args:
+        span (Span): span to nest under, nothing is done if None
+    """
+    if span is None:
+        yield
+        return
+    spans = _open_spans.setdefault(threading.current_thread().name, [])
+    spans.append(span)
+    try:
+        yield
+    finally:
+        _remove(spans, span)
+
+
+def _close(span, end):
+    if not span.ended:
+        span.ended = True
+        _write(span.to_dict(end))
+
+
+def end_span(span=None, name=None):
+    """
+    Closes a span and records it. A span given by itself is closed alone. A
+    span given by its name is looked up in the current thread, and the
+    spans opened in it by the thread that are still open are closed with
+    it.
+
+    Args:
+        span (Span): span to close, as returned by :func:`start_span` or
+            :func:`open_span`
+        name (str): name of the span to close, the innermost one with that
+            name if several are open in the current thread
+
+    Returns:
+        None
+    """
+    if not enabled() or (span is None and name is None):
+        return
+    end = time.time()
+    if span is not None:
+        _remove(_open_spans.get(span.thread.name, []), span)
+        _close(span, end)
+        return
+
+    current = threading.current_thread()
+    spans = _open_spans.get(current.name)
+    if not spans:
+        return
+    for index in range(len(spans) - 1, -1, -1):
+        if spans[index].name == name and spans[index].thread is current:
+            break
+    else:
+        return
+
+    closed = [
+        closed_span for closed_span in spans[index:]
+        if closed_span.thread is current
+    ]
+    spans[index:] = [
+        other for other in spans[index:] if other.thread is not current
+    ]
+    for closed_span in reversed(closed):
+        _close(closed_span, end)
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    """
+    Context manager recording the code it wraps as a span, see
+    :func:`start_span`
+
+    Example:
+        >>> with span('copy image', 'task', host='host-0'):
+        ...     pass
+    """
+    opened = start_span(name, category, **args)
+    try:
+        yield opened
+    finally:
+        if opened is not None:
+            end_span(opened)
@@ -0,0 +1,93 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Pytest plugin that records the start and end times of the tests in the
+events file set in ``OST_METRICS_EVENTS``, to align them with the host
+metrics collected during the run (see common/scripts/stream_metrics.py),
+records the tests as spans for the profiler (see
+:mod:`ost_utils.profiler`), and reports the waits of the run (see
+:mod:`ost_utils.waiter`).
+
+run_suite.sh enables it for the pytest scenarios with
+``-p ost_utils.pytest.events`` when the metrics or the profiling are
+enabled, and only if it can be imported, so it can't fail the scenarios.
+"""
+from __future__ import absolute_import
+
+import pytest
+
+from ost_utils import profiler
+from ost_utils import waiter
+from ost_utils.log_utils import TASK_END
+from ost_utils.log_utils import TASK_START
+from ost_utils.log_utils import record_event
+
+#: Spans of the running tests, by node id. The tests may overlap, see
+#: ost_utils.pytest.scheduler, so their spans are not kept in the stack of
+#: the thread logging them.
+_test_spans = {}
+
+
+def get_test_span(nodeid):
+    """
+    Returns:
+        profiler.Span: span of the running test, None if there is none
+    """
+    return _test_spans.get(nodeid)
+
+
+def pytest_runtest_logstart(nodeid, location):
+    record_event('test', TASK_START, nodeid)
+    span = profiler.open_span(nodeid, 'test')
+    if span is not None:
+        _test_spans[nodeid] = span
+
+
+def pytest_runtest_logfinish(nodeid, location):
+    profiler.end_span(_test_spans.pop(nodeid, None))
+    record_event('test', TASK_END, nodeid)
+
+
+# The spans opened by the setup, call and teardown of a test are nested
+# under the span of the test, in whatever thread they run: the scheduler
+# calls the tests in worker threads
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    with profiler.activate(get_test_span(item.nodeid)):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    with profiler.activate(get_test_span(item.nodeid)):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    with profiler.activate(get_test_span(item.nodeid)):
+        yield
+
+
+def pytest_terminal_summary(terminalreporter):
+    terminalreporter.write_sep('-', 'waits')
+    terminalreporter.write_line(waiter.format_wait_summary())
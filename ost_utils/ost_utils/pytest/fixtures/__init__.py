@@ -22,10 +22,16 @@ import os
 
 import ovirtlago
 import ovirtlago.prefix
+import ovirtsdk4 as sdk4
 import pytest
 
 from ovirtlago import testlib
 
+from ost_utils import waiter
+from ost_utils.sdk_utils import SDKConnectionManager
+from ost_utils.sdk_utils import ThreadLocalConnection
+from ost_utils.sdk_utils import connect_v4
+
 
 @pytest.fixture(scope="session")
 def prefix():
@@ -34,4 +40,22 @@ def prefix():
 
 @pytest.fixture(scope="session")
 def api_v4(prefix):
-    yield prefix.virt_env.engine_vm().get_api(api_ver=4)
+    # SDK connections can't be shared between threads, and the steps of a
+    # scenario may run concurrently, see ost_utils.pytest.scheduler
+    engine = prefix.virt_env.engine_vm()
+    connections = SDKConnectionManager(
+        factory=lambda: connect_v4(
+            engine.ip(), engine.metadata['ovirt-engine-password']
+        ),
+        retry_exceptions=(sdk4.AuthError, sdk4.ConnectionError),
+    )
+    # wake up the waits of the scenario as soon as the engine state changes
+    watcher = waiter.EngineEventWatcher(
+        lambda: connections.get().system_service()
+    )
+    watcher.start()
+    previous_watcher = waiter.set_default_watcher(watcher)
+    yield ThreadLocalConnection(connections)
+    waiter.set_default_watcher(previous_watcher)
+    watcher.stop()
+    connections.close()
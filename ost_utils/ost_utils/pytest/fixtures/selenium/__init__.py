@@ -24,8 +24,7 @@ import os
 
 import pytest
 
-import ost_utils.selenium.docker as docker
-import ost_utils.selenium.podman as podman
+import ost_utils.selenium.manager as manager
 
 from ost_utils.pytest.fixtures import prefix
 from ost_utils.pytest.fixtures.engine import engine_fqdn
@@ -64,11 +63,7 @@ def hub_url(engine_fqdn, engine_ip):
         yield env_url
     else:
         backend = _grid_backend()
-        if backend == "podman":
-            with podman.grid(engine_fqdn, engine_ip) as hub_url:
-                yield hub_url
-        elif backend == "docker":
-            with docker.grid(engine_fqdn, engine_ip) as hub_url:
-                yield hub_url
-        else:
+        if backend is None:
             raise RuntimeError("No container backend available to set up the grid")
+        with manager.leased_grid(backend, engine_fqdn, engine_ip) as hub_url:
+            yield hub_url
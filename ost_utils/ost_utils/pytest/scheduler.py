@@ -0,0 +1,268 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Pytest plugin that runs the steps of a scenario concurrently, as allowed by
+their declared dependencies.
+
+Steps marked with ``@pytest.mark.depends('test_a', 'test_b')`` only wait for
+the named steps (and for the last unmarked step before them), so independent
+steps run at the same time. Unmarked steps keep the usual semantics: they
+run alone, after all the steps before them. With no marked steps, or with
+``OST_PARALLEL_STEPS=1``, the run is exactly the usual serial one.
+
+Fixtures are set up and torn down, and all the reports are made, by the main
+thread. Only the calls of the test functions run in worker threads.
+
+Setting up a step tears down the fixtures of the collectors it is not part
+of, including the previous step itself, so a step only runs concurrently
+with steps of the same module and class, and only if it uses no function
+scoped fixtures (nor ``request``), which would be torn down while it runs.
+
+Enable it in a scenario with::
+
+    pytest_plugins = ('ost_utils.pytest.scheduler',)
+
+The phases of the steps are run through the public ``pytest_runtest_*``
+hooks, but the reports need the ``CallInfo`` of ``_pytest.runner``, which
+changes between major versions, hence pytest is pinned in the requirements
+of ost_utils (and in the suites installing it).
+"""
+from __future__ import absolute_import
+
+import bdb
+import os
+import threading
+
+import pytest
+from _pytest.runner import CallInfo
+from six.moves import queue
+
+#: Max number of steps running at the same time
+DEFAULT_PARALLEL_STEPS = 4
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'depends(*names): run after the named tests only, concurrently with '
+        'other independent tests',
+    )
+
+
+def _parallel_steps():
+    return int(os.environ.get('OST_PARALLEL_STEPS', DEFAULT_PARALLEL_STEPS))
+
+
+def _declared_dependencies(item):
+    marker = item.get_closest_marker('depends')
+    return None if marker is None else marker.args
+
+
+def build_dependencies(items):
+    """
+    Args:
+        items (list of pytest.Item): the items, in their serial order
+
+    Returns:
+        dict of pytest.Item: set of pytest.Item: the items each item has to
+            wait for
+
+    Raises:
+        pytest.UsageError: if an item depends on an unknown, or later, item
+    """
+    dependencies = {}
+    seen = {}
+    barrier = None
+    for item in items:
+        declared = _declared_dependencies(item)
+        if declared is None:
+            # Runs alone, after everything before it
+            dependencies[item] = set(seen.values())
+            barrier = item
+        else:
+            deps = set([barrier]) if barrier is not None else set()
+            for name in declared:
+                if name not in seen:
+                    raise pytest.UsageError(
+                        '{} depends on {}, which is not a test that runs '
+                        'before it'.format(item.nodeid, name)
+                    )
+                deps.add(seen[name])
+            dependencies[item] = deps
+        seen[item.name] = item
+    return dependencies
+
+
+def _is_exclusive(item):
+    fixture_defs = getattr(item, '_fixtureinfo', None)
+    if fixture_defs is None or 'request' in item.fixturenames:
+        return True
+    return _declared_dependencies(item) is None or any(
+        fixturedef.scope == 'function'
+        for fixturedefs in fixture_defs.name2fixturedefs.values()
+        for fixturedef in fixturedefs
+    )
+
+
+def _reraise(item):
+    reraise = (pytest.exit.Exception,)
+    if not item.config.getoption('usepdb', False):
+        reraise += (KeyboardInterrupt,)
+    return reraise
+
+
+def _is_interactive(call, report):
+    return (
+        call.excinfo is not None and
+        not hasattr(report, 'wasxfail') and
+        not call.excinfo.errisinstance((pytest.skip.Exception, bdb.BdbQuit))
+    )
+
+
+def _report(item, call):
+    report = item.ihook.pytest_runtest_makereport(item=item, call=call)
+    item.ihook.pytest_runtest_logreport(report=report)
+    if _is_interactive(call, report):
+        item.ihook.pytest_exception_interact(
+            node=item, call=call, report=report
+        )
+    return report
+
+
+def _run_phase(item, when, **kwargs):
+    hook = getattr(item.ihook, 'pytest_runtest_' + when)
+    call = CallInfo.from_call(
+        lambda: hook(item=item, **kwargs), when=when, reraise=_reraise(item)
+    )
+    return _report(item, call)
+
+
+class _Scheduler(object):
+
+    def __init__(self, session, max_workers):
+        self.session = session
+        self.max_workers = max_workers
+        self.pending = build_dependencies(session.items)
+        self.order = dict((item, i) for i, item in enumerate(session.items))
+        self.done = set()
+        self.running = set()
+        self.results = queue.Queue()
+
+    def _ready(self):
+        return sorted(
+            (item for item, deps in self.pending.items()
+             if deps <= self.done),
+            key=self.order.get,
+        )
+
+    def _next_item(self, item):
+        # The first item still running, if any, so its collectors are not
+        # torn down
+        remaining = (self.running - set([item])) or set(self.pending)
+        return min(remaining, key=self.order.get) if remaining else None
+
+    def _stopping(self):
+        return self.session.shouldfail or self.session.shouldstop
+
+    def _can_start(self, item, exclusive):
+        if len(self.running) >= self.max_workers:
+            return False
+        if exclusive:
+            return not self.running
+        return all(
+            not _is_exclusive(other) and other.parent is item.parent
+            for other in self.running
+        )
+
+    def _setup(self, item):
+        item.ihook.pytest_runtest_logstart(
+            nodeid=item.nodeid, location=item.location
+        )
+        return _run_phase(item, 'setup')
+
+    def _call(self, item):
+        call = CallInfo.from_call(
+            lambda: item.ihook.pytest_runtest_call(item=item),
+            when='call',
+            reraise=_reraise(item),
+        )
+        self.results.put((item, call))
+
+    def _start(self, item):
+        del self.pending[item]
+        self.running.add(item)
+        if self._setup(item).passed:
+            thread = threading.Thread(
+                target=self._call, args=(item,), name=item.name
+            )
+            thread.daemon = True
+            thread.start()
+        else:
+            self.results.put((item, None))
+
+    def _finish(self, item, call):
+        if call is not None:
+            _report(item, call)
+        self.running.discard(item)
+        _run_phase(item, 'teardown', nextitem=self._next_item(item))
+        item.ihook.pytest_runtest_logfinish(
+            nodeid=item.nodeid, location=item.location
+        )
+        self.done.add(item)
+
+    def run(self):
+        while self.pending or self.running:
+            if not self._stopping():
+                for item in self._ready():
+                    exclusive = _is_exclusive(item)
+                    if not self._can_start(item, exclusive):
+                        break
+                    self._start(item)
+                    if exclusive or self._stopping():
+                        break
+
+            if not self.running:
+                # Failed fast, nothing left to wait for
+                break
+            item, call = self.results.get()
+            self._finish(item, call)
+
+        if self.session.shouldfail:
+            raise self.session.Failed(self.session.shouldfail)
+        if self.session.shouldstop:
+            raise self.session.Interrupted(self.session.shouldstop)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    max_workers = _parallel_steps()
+    if (
+        session.testsfailed or
+        session.config.option.collectonly or
+        session.config.option.setuponly or
+        max_workers < 2 or
+        not any(_declared_dependencies(item) is not None
+                for item in session.items)
+    ):
+        # Leave it to the default serial loop
+        return None
+
+    _Scheduler(session, max_workers).run()
+    return True
@@ -0,0 +1,234 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Readiness probes for the hosts and the engine, to wait until the system
+is actually ready instead of sleeping for a fixed time.
+
+The probes return False (or None) when something is not ready yet, and can
+be combined with the conditions of :mod:`ost_utils.waiter`.
+"""
+import json
+import logging
+
+import ovirtsdk4.types as types
+
+from ost_utils import waiter
+
+LOGGER = logging.getLogger(__name__)
+
+#: Services that have to be running on a hosted engine host
+HA_SERVICES = ('ovirt-ha-agent', 'ovirt-ha-broker')
+ENGINE_HEALTH_URL = 'http://localhost/ovirt-engine/services/health'
+ENGINE_CERTS_DIR = '/etc/pki/ovirt-engine/certs'
+HE_STORAGE_DOMAIN_NAME = 'hosted_storage'
+#: Default seconds to wait for a hosted engine setup to be ready
+HE_READY_TIMEOUT = 10 * 60
+#: Default number of status updates of the HA agents to wait for
+HE_AGENT_UPDATES = 2
+
+
+def he_vm_status(host):
+    """
+    Args:
+        host (lago.plugins.vm.VMPlugin): hosted engine host to ask
+
+    Returns:
+        dict: output of 'hosted-engine --vm-status --json', or None if the
+            status isn't available yet
+    """
+    result = host.ssh(['hosted-engine', '--vm-status', '--json'])
+    if result.code != 0:
+        return None
+    try:
+        return json.loads(result.out)
+    except ValueError:
+        return None
+
+
+def he_host_entries(status):
+    """
+    Returns:
+        list of dict: the entries of the hosts in a hosted engine status, the
+            other keys (e.g. 'global_maintenance') are not hosts
+    """
+    return [
+        entry for entry in (status or {}).values() if isinstance(entry, dict)
+    ]
+
+
+def he_engine_health_good(status):
+    """
+    Returns:
+        bool: True if a host with live data reports the engine VM as healthy
+    """
+    return any(
+        entry.get('live-data') and
+        entry.get('engine-status', {}).get('health') == 'good'
+        for entry in he_host_entries(status)
+    )
+
+
+def ha_services_active(host):
+    result = host.ssh(['systemctl', 'is-active'] + list(HA_SERVICES))
+    return result.code == 0
+
+
+def vdsm_responsive(host):
+    return host.ssh(['vdsm-client', 'Host', 'ping2']).code == 0
+
+
+def engine_healthy(engine_vm):
+    """
+    Returns:
+        bool: True if the engine health servlet reports that the engine and
+            its database are up
+    """
+    result = engine_vm.ssh(['curl', '-sf', ENGINE_HEALTH_URL])
+    return result.code == 0 and 'DB Up' in result.out
+
+
+def engine_certificate_count(engine_vm):
+    """
+    Returns:
+        int: number of certificates signed by the engine CA, None if they
+            couldn't be counted
+    """
+    result = engine_vm.ssh(['ls', '-1', ENGINE_CERTS_DIR])
+    if result.code != 0:
+        return None
+    return len(
+        [name for name in result.out.splitlines() if name.endswith('.cer')]
+    )
+
+
+def storage_domain_active(system_service, dc_name, sd_name):
+    """
+    Returns:
+        bool: True if the storage domain is active in the data center
+    """
+    dcs_service = system_service.data_centers_service()
+    dcs = dcs_service.list(search='name=%s' % dc_name)
+    if not dcs:
+        return False
+    sds_service = dcs_service.data_center_service(dcs[0].id) \
+        .storage_domains_service()
+    return any(
+        sd.name == sd_name and sd.status == types.StorageDomainStatus.ACTIVE
+        for sd in sds_service.list()
+    )
+
+
+class HeStatusUpdates(object):
+    """
+    Probe of the hosted engine status that is met once the HA agents
+    published ``updates`` new statuses since the probe was created, and the
+    engine VM is healthy. Waiting for fresh statuses makes sure the agents
+    went through their monitoring loop after a change.
+    """
+
+    def __init__(self, host, updates=HE_AGENT_UPDATES):
+        self.host = host
+        self.updates = updates
+        self.seen = 0
+        self.last_ts = self._latest_ts(he_vm_status(host))
+        self.__name__ = 'hosted engine status of %s' % host.name()
+
+    @staticmethod
+    def _latest_ts(status):
+        timestamps = [
+            entry.get('host-ts', 0) for entry in he_host_entries(status)
+        ]
+        return max(timestamps) if timestamps else None
+
+    def __call__(self):
+        status = he_vm_status(self.host)
+        latest_ts = self._latest_ts(status)
+        if latest_ts is not None and latest_ts != self.last_ts:
+            self.last_ts = latest_ts
+            self.seen += 1
+        return self.seen >= self.updates and he_engine_health_good(status)
+
+
+def wait_for_he_ready(
+    host,
+    engine_vm,
+    system_service=None,
+    dc_name='Default',
+    timeout=HE_READY_TIMEOUT,
+    agent_updates=HE_AGENT_UPDATES,
+):
+    """
+    Wait until a hosted engine setup is ready: the HA services are running
+    and VDSM responds on ``host``, the HA agents published fresh statuses
+    with a healthy engine VM, the engine reports it's up and, if
+    ``system_service`` is given, the hosted engine storage domain is active.
+
+    Raises:
+        waiter.WaitTimeout: if the setup wasn't ready in time
+    """
+    conditions = [
+        waiter.Condition(
+            lambda: ha_services_active(host), name='HA services running'
+        ),
+        waiter.Condition(
+            lambda: vdsm_responsive(host), name='VDSM responsive'
+        ),
+        waiter.Condition(
+            HeStatusUpdates(host, agent_updates),
+            name='fresh HA agent status with healthy engine VM',
+        ),
+        waiter.Condition(
+            lambda: engine_healthy(engine_vm), name='engine healthy'
+        ),
+    ]
+    if system_service is not None:
+        conditions.append(
+            waiter.Condition(
+                lambda: storage_domain_active(
+                    system_service, dc_name, HE_STORAGE_DOMAIN_NAME
+                ),
+                name='%s storage domain active' % HE_STORAGE_DOMAIN_NAME,
+            )
+        )
+    waiter.wait_all(conditions, timeout, name='hosted engine ready')
+
+
+def wait_for_certificate_enrolled(engine_vm, count_before, timeout):
+    """
+    Wait until the engine CA signed a new certificate, e.g. for a host that
+    is being added.
+
+    Returns:
+        bool: True if a certificate was signed in time, False otherwise
+    """
+    try:
+        waiter.wait_for(
+            lambda: engine_certificate_count(engine_vm),
+            timeout,
+            success=lambda count: count is not None and
+            count > (count_before or 0),
+            name='certificate enrolled',
+        )
+    except waiter.WaitTimeout:
+        LOGGER.warning(
+            'No new certificate was signed after %s seconds', timeout
+        )
+        return False
+    return True
@@ -38,6 +38,7 @@ from signal import signal, SIGTERM, SIGHUP
 import datetime
 
 import log_utils
+from ost_utils import waiter
 
 LOGGER = logging.getLogger(__name__)
 LogTask = functools.partial(log_utils.LogTask, logger=LOGGER)
@@ -184,6 +185,7 @@ def run_test(path, junitxml_file=None):
             addplugins=addplugins,
         )
         LOGGER.info('Results located at %s' % results_path)
+        LOGGER.info('Waits: %s', waiter.format_wait_summary())
 
         return result
 
@@ -209,7 +211,9 @@ class TaskLogNosePlugin(nose.plugins.Plugin):
 
     def startTest(self, test):
         log_utils.start_log_task(
-            test.shortDescription() or str(test), logger=self.logger
+            test.shortDescription() or str(test),
+            logger=self.logger,
+            source='test',
         )
     def stopTest(self, test):
         desc = test.shortDescription() or str(test)
@@ -226,7 +230,9 @@ class TaskLogNosePlugin(nose.plugins.Plugin):
         if any(test.exc_info()):
             level = 'error'
 
-        log_utils.end_log_task(desc, logger=self.logger, level=level)
+        log_utils.end_log_task(
+            desc, logger=self.logger, level=level, source='test'
+        )
 
     def addError(self, test, err):
         desc = test.shortDescription() or str(test)
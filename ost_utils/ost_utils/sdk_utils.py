@@ -18,8 +18,23 @@
 # Refer to the README and COPYING files for full details of the license
 #
 import functools
+import logging
 import pkg_resources
 import sys
+import threading
+import time
+
+from ost_utils import waiter
+
+LOGGER = logging.getLogger(__name__)
+
+#: Seconds a connection is trusted after a successful health check
+SDK_CONNECTION_TTL = 60
+#: Max number of unused connections to keep for reuse
+SDK_CONNECTION_POOL_SIZE = 8
+#: Seconds to wait for a new SDK v4 connection to pass its test call
+API_TEST_TIMEOUT = 60
+ENGINE_USERNAME = 'admin@internal'
 
 
 def get_data_file(basename):
@@ -69,7 +84,284 @@ def require_sdk(version, modules=None):
     return wrap
 
 
+def connect_v4(engine_ip, password, username=ENGINE_USERNAME,
+               timeout=API_TEST_TIMEOUT):
+    """
+    Args:
+        engine_ip (str): address of the engine
+        password (str): password of the user
+        username (str): user to authenticate as
+        timeout (float): seconds to wait for the engine to answer
+
+    Returns:
+        ovirtsdk4.Connection: a new connection, that passed its test call
+
+    Raises:
+        RuntimeError: if the engine didn't answer in time
+    """
+    import ovirtsdk4
+
+    connection = ovirtsdk4.Connection(
+        url='https://%s/ovirt-engine/api' % engine_ip,
+        username=username,
+        password=password,
+        insecure=True,
+    )
+    try:
+        waiter.wait_for(connection.test, timeout, name='engine api test')
+    except waiter.WaitTimeout:
+        connection.close()
+        raise RuntimeError('Failed to connect to the engine')
+    return connection
+
+
 def partial(func, *args, **kwargs):
     partial_func = functools.partial(func, *args, **kwargs)
     functools.update_wrapper(partial_func, func)
     return partial_func
+
+
+class _PooledConnection(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.verified_at = time.time()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as err:
+            LOGGER.debug('Failed to close SDK connection: %s', err)
+
+
+class SDKConnectionManager(object):
+    """
+    Hands out authenticated SDK connections and reuses them. SDK connections
+    can not be used by many threads at once, so each thread gets its own,
+    and the connections of finished threads go back to the pool.
+
+    Connections are health checked at most once per ``ttl`` seconds: the
+    pooled ones by a background thread, the ones in use when their thread
+    asks for its connection again. A connection that fails the check, or
+    that is invalidated after a failed request, is closed and a new one is
+    created (and authenticated) on the next request for it.
+
+    Attributes:
+        ttl (float): seconds a connection is trusted after a health check
+        pool_size (int): max number of unused connections to keep
+    """
+
+    def __init__(
+        self,
+        factory,
+        ttl=SDK_CONNECTION_TTL,
+        pool_size=SDK_CONNECTION_POOL_SIZE,
+        retry_exceptions=(),
+    ):
+        """
+        Args:
+            factory (callable): returns a new, verified connection
+            ttl (float): seconds a connection is trusted after a health check
+            pool_size (int): max number of unused connections to keep
+            retry_exceptions (tuple of Exception): exceptions of a request
+                that mean its connection must be replaced, see :meth:`call`
+        """
+        self._factory = factory
+        self.ttl = ttl
+        self.pool_size = pool_size
+        self.retry_exceptions = tuple(retry_exceptions)
+        self._lock = threading.Lock()
+        self._owned = {}
+        self._idle = []
+        self._stop = threading.Event()
+        self._checker = None
+
+    def _reclaim(self):
+        """
+        Move the connections of finished threads to the pool, must be
+        called with the lock held
+        """
+        for thread in list(self._owned):
+            if not thread.is_alive():
+                self._idle.append(self._owned.pop(thread))
+        while len(self._idle) > self.pool_size:
+            self._idle.pop(0).close()
+
+    def _start_checker(self):
+        if self._checker is not None:
+            return
+        self._checker = threading.Thread(
+            target=self._check_idle, name='sdk-connection-checker'
+        )
+        self._checker.daemon = True
+        self._checker.start()
+
+    def _check_idle(self):
+        while not self._stop.wait(self.ttl):
+            with self._lock:
+                self._reclaim()
+                idle, self._idle = self._idle, []
+
+            healthy = []
+            for entry in idle:
+                if entry.connection.test():
+                    entry.verified_at = time.time()
+                    healthy.append(entry)
+                else:
+                    LOGGER.debug('Dropping unhealthy pooled SDK connection')
+                    entry.close()
+
+            with self._lock:
+                self._idle.extend(healthy)
+
+    def get(self):
+        """
+        Returns:
+            object: the healthy connection of the current thread
+        """
+        thread = threading.current_thread()
+        with self._lock:
+            entry = self._owned.get(thread)
+            if entry is None:
+                self._reclaim()
+                if self._idle:
+                    entry = self._owned[thread] = self._idle.pop()
+            self._start_checker()
+
+        if entry is not None and time.time() - entry.verified_at > self.ttl:
+            if entry.connection.test():
+                entry.verified_at = time.time()
+            else:
+                LOGGER.debug('SDK connection failed its health check')
+                self.invalidate()
+                entry = None
+
+        if entry is None:
+            entry = _PooledConnection(self._factory())
+            with self._lock:
+                self._owned[thread] = entry
+
+        return entry.connection
+
+    def release(self):
+        """
+        Give the connection of the current thread back to the pool, to be
+        reused by the next thread that needs one
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._owned.pop(threading.current_thread(), None)
+            if entry is not None:
+                self._idle.append(entry)
+                self._reclaim()
+
+    def invalidate(self):
+        """
+        Close the connection of the current thread, so the next :meth:`get`
+        creates and authenticates a new one
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._owned.pop(threading.current_thread(), None)
+        if entry is not None:
+            entry.close()
+
+    def call(self, func):
+        """
+        Call ``func`` with the connection of the current thread, and if it
+        fails with one of the ``retry_exceptions`` call it once more with a
+        new connection
+
+        Args:
+            func (callable): gets the connection and makes the request
+
+        Returns:
+            object: what ``func`` returned
+        """
+        try:
+            return func(self.get())
+        except self.retry_exceptions as err:
+            LOGGER.debug('SDK request failed, reconnecting: %s', err)
+            self.invalidate()
+            return func(self.get())
+
+    def close(self):
+        """
+        Close all the connections and stop the health checks
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._checker is not None:
+            self._checker.join()
+        with self._lock:
+            entries = list(self._owned.values()) + self._idle
+            self._owned = {}
+            self._idle = []
+        for entry in entries:
+            entry.close()
+
+
+def _connection_function(name):
+    import ovirtsdk4
+
+    method = getattr(ovirtsdk4.Connection, name)
+    # unbound methods of python 2 only take instances of their class
+    return getattr(method, '__func__', method)
+
+
+class ThreadLocalConnection(object):
+    """
+    Stands for the connection of the current thread of a
+    :class:`SDKConnectionManager`, for code that keeps a single connection
+    object but may use it from many threads.
+
+    The services it creates send each request with the connection of the
+    calling thread, and wait for it on the same connection. A connection
+    that fails with one of the ``retry_exceptions`` of the manager is
+    replaced on the next request. Closing it only gives the connection of
+    the current thread back to the manager, which owns the connections.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+        self._sent = {}
+
+    def __getattr__(self, name):
+        return getattr(self._manager.get(), name)
+
+    def system_service(self):
+        return _connection_function('system_service')(self)
+
+    def service(self, path):
+        return _connection_function('service')(self, path)
+
+    def follow_link(self, obj):
+        return _connection_function('follow_link')(self, obj)
+
+    def close(self):
+        self._manager.release()
+
+    def send(self, request):
+        connection, context = self._manager.call(
+            lambda connection: (connection, connection.send(request))
+        )
+        self._sent[id(context)] = (context, connection)
+        return context
+
+    def wait(self, context):
+        _, connection = self._sent.pop(id(context))
+        try:
+            return connection.wait(context)
+        except Exception:
+            # the request may have been done, so it's not sent again, and
+            # the ones still pending on the connection are lost with it
+            for key, (_, sent_by) in list(self._sent.items()):
+                if sent_by is connection:
+                    self._sent.pop(key, None)
+            self._manager.invalidate()
+            raise
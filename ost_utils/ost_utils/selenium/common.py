@@ -21,46 +21,120 @@
 import contextlib
 import json
 import os
+import sys
+import threading
 import time
 
+try:
+    from http.client import HTTPException
+    from urllib.request import ProxyHandler
+    from urllib.request import build_opener
+except ImportError:
+    from httplib import HTTPException
+    from urllib2 import ProxyHandler
+    from urllib2 import build_opener
+
 from ost_utils.shell import shell
 from ost_utils.shell import ShellError
 
 
-GRID_STARTUP_WAIT_RETRIES = 300
+GRID_STARTUP_TIMEOUT = 30
+GRID_POLL_INTERVAL = 0.1
 GRID_URL_TEMPLATE = "http://{}:{}/wd/hub"
+HTTP_TIMEOUT = 2
 
+# the grid always runs locally, so don't go through the CI proxy
+_OPENER = build_opener(ProxyHandler({}))
 
-def grid_health_check(hub_url, expected_node_count=None):
-    status_url = hub_url + "/status"
 
-    for i in range(GRID_STARTUP_WAIT_RETRIES):
-        try:
-            out = shell(["curl", "-sSL", status_url])
-            if json.loads(out)["value"]["ready"] == True:
-                break
-        except ShellError:
-            pass
-        time.sleep(0.1)
-    else:
+def _get_json(url):
+    response = _OPENER.open(url, timeout=HTTP_TIMEOUT)
+    try:
+        return json.loads(response.read().decode("utf-8"))
+    finally:
+        response.close()
+
+
+def _grid_api_url(hub_url):
+    return "/".join(hub_url.split("/")[:-2] + ["grid/api/hub"])
+
+
+def grid_is_ready(hub_url):
+    try:
+        return _get_json(hub_url + "/status")["value"]["ready"] == True
+    except (EnvironmentError, HTTPException, ValueError, KeyError,
+            TypeError):
+        return False
+
+
+def grid_node_count(hub_url):
+    try:
+        return _get_json(_grid_api_url(hub_url))["slotCounts"]["total"]
+    except (EnvironmentError, HTTPException, ValueError, KeyError,
+            TypeError):
+        return None
+
+
+def _wait_for(condition, deadline):
+    while True:
+        if condition():
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(GRID_POLL_INTERVAL)
+
+
+def grid_health_check(hub_url, expected_node_count=None,
+                      timeout=GRID_STARTUP_TIMEOUT):
+    deadline = time.time() + timeout
+
+    if not _wait_for(lambda: grid_is_ready(hub_url), deadline):
         raise RuntimeError("Selenium grid didn't start up properly")
 
     if expected_node_count is not None:
-        api_url = "/".join(hub_url.split("/")[:-2] + ["grid/api/hub"])
-
-        for i in range(GRID_STARTUP_WAIT_RETRIES):
-            try:
-                out = shell(["curl", "-sSL", api_url])
-                node_count = json.loads(out)["slotCounts"]["total"]
-                if node_count == expected_node_count:
-                    break
-            except ShellError:
-                pass
-            time.sleep(0.1)
-        else:
+        if not _wait_for(
+            lambda: grid_node_count(hub_url) == expected_node_count,
+            deadline
+        ):
             raise RuntimeError("Not enough nodes in selenium grid")
 
 
+def run_containers(commands):
+    """
+    Run the 'run -d' container commands in parallel and return
+    the names of the containers, in the order of the commands.
+    If any of them fails, the containers that did start are removed
+    and the failure is raised.
+    """
+    names = [None] * len(commands)
+    errors = []
+
+    def run(index):
+        try:
+            names[index] = shell(commands[index]).strip()
+        except Exception:
+            errors.append(sys.exc_info())
+
+    threads = [
+        threading.Thread(target=run, args=(i,)) for i in range(len(commands))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        for command, name in zip(commands, names):
+            if name is not None:
+                try:
+                    shell([command[0], "rm", "-f", name])
+                except ShellError:
+                    pass
+        raise errors[0][1]
+
+    return names
+
+
 @contextlib.contextmanager
 def http_proxy_disabled():
     # proxy is used in CI -- turn off proxy for webdriver
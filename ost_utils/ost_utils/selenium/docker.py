@@ -28,6 +28,7 @@ from ost_utils.selenium import FIREFOX_CONTAINER_IMAGE
 from ost_utils.selenium import HUB_CONTAINER_IMAGE
 from ost_utils.selenium import common
 from ost_utils.shell import shell
+from ost_utils.shell import ShellError
 
 
 HUB_PORT = 4444
@@ -56,37 +57,16 @@ def _get_ip(name):
     return ip
 
 
-@contextlib.contextmanager
-def _network(network_name):
-    shell(["docker", "network", "create", network_name])
-
-    try:
-        yield
-    finally:
-        shell(["docker", "network", "rm", network_name])
-
-
-@contextlib.contextmanager
-def _hub(image, port, network_name):
-    name = shell([
-        "docker", "run", "-d",
-        "-p", "{0}:{0}".format(port),
-        "--net", network_name,
-        image
-    ]).strip()
-
+def _rm(args):
     try:
-        yield name, _get_ip(name)
-    finally:
-        shell(["docker", "rm", "-f", name])
+        shell(args)
+    except ShellError as e:
+        LOGGER.warning("'%s' failed: %s" % (" ".join(args), e.err))
 
 
-@contextlib.contextmanager
-def _nodes(images, hub_ip, hub_port, network_name, engine_dns_entry):
-    names = []
-
-    for image in images:
-        name = shell([
+def _node_commands(images, hub_ip, hub_port, network_name, engine_dns_entry):
+    return [
+        [
             "docker", "run", "-d",
             "--add-host={}".format(engine_dns_entry),
             "--net", network_name,
@@ -94,15 +74,52 @@ def _nodes(images, hub_ip, hub_port, network_name, engine_dns_entry):
             "-e", "HUB_PORT={}".format(hub_port),
             "-v", "/dev/shm:/dev/shm",
             image
-        ]).strip()
+        ]
+        for image in images
+    ]
+
 
-        names.append(name)
+def start(engine_dns_entry, node_images, hub_image=HUB_CONTAINER_IMAGE,
+          hub_port=HUB_PORT, network_name=NETWORK_NAME):
+    """
+    Start a grid and return the resources of it that 'stop' needs.
+    If starting fails, whatever was started is removed.
+    """
+    resources = {"network": None, "hub": None, "nodes": []}
 
     try:
-        yield names
-    finally:
-        for name in names:
-            shell(["docker", "rm", "-f", name])
+        shell(["docker", "network", "create", network_name])
+        resources["network"] = network_name
+        resources["hub"] = shell([
+            "docker", "run", "-d",
+            "-p", "{0}:{0}".format(hub_port),
+            "--net", network_name,
+            hub_image
+        ]).strip()
+        hub_ip = _get_ip(resources["hub"])
+        commands = _node_commands(node_images, hub_ip, hub_port,
+                                  network_name, engine_dns_entry)
+        resources["nodes"] = common.run_containers(commands)
+        resources["url"] = common.GRID_URL_TEMPLATE.format(hub_ip, hub_port)
+        try:
+            common.grid_health_check(resources["url"], len(node_images))
+        except RuntimeError:
+            _log_issues(resources["hub"], resources["nodes"])
+            raise
+    except Exception:
+        stop(resources)
+        raise
+
+    return resources
+
+
+def stop(resources):
+    for name in resources["nodes"]:
+        _rm(["docker", "rm", "-f", name])
+    if resources["hub"] is not None:
+        _rm(["docker", "rm", "-f", resources["hub"]])
+    if resources["network"] is not None:
+        _rm(["docker", "network", "rm", resources["network"]])
 
 
 @contextlib.contextmanager
@@ -115,14 +132,9 @@ def grid(engine_fqdn, engine_ip, node_images=None,
     engine_dns_entry="{}:{}".format(engine_fqdn, engine_ip)
 
     with common.http_proxy_disabled():
-        with _network(network_name):
-            with _hub(hub_image, hub_port, network_name) as (hub_name, hub_ip):
-                with _nodes(node_images, hub_ip, hub_port, network_name,
-                            engine_dns_entry) as node_names:
-                    url = common.GRID_URL_TEMPLATE.format(hub_ip, hub_port)
-                    try:
-                        common.grid_health_check(url, len(node_images))
-                    except RuntimeError:
-                        _log_issues(hub_name, node_names)
-                        raise
-                    yield url
+        resources = start(engine_dns_entry, node_images, hub_image, hub_port,
+                          network_name)
+        try:
+            yield resources["url"]
+        finally:
+            stop(resources)
@@ -0,0 +1,252 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+# Keeps a selenium grid running between UI runs on the same machine.
+#
+# The grid is described by a state file. Every process using the grid
+# holds a lease on it - its pid in the state file. When the last lease is
+# released, a reaper process is started, which removes the grid if nobody
+# took a lease on it for 'idle_timeout' seconds. A later run with the same
+# backend, images and engine address attaches to the running grid instead
+# of starting a new one.
+
+from __future__ import absolute_import
+
+import contextlib
+import errno
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import ost_utils.selenium.docker as docker
+import ost_utils.selenium.podman as podman
+
+from ost_utils.selenium import CHROME_CONTAINER_IMAGE
+from ost_utils.selenium import FIREFOX_CONTAINER_IMAGE
+from ost_utils.selenium import HUB_CONTAINER_IMAGE
+from ost_utils.selenium import common
+
+
+ATTACH_HEALTH_CHECK_TIMEOUT = 1
+DEFAULT_IDLE_TIMEOUT = 900
+LOGGER = logging.getLogger(__name__)
+STATE_FILE = os.path.join(tempfile.gettempdir(), "ost-selenium-grid.json")
+
+_BACKENDS = {
+    "docker": docker,
+    "podman": podman,
+}
+
+
+def _state_file():
+    return os.environ.get("OST_SELENIUM_GRID_STATE", STATE_FILE)
+
+
+def idle_timeout_from_env():
+    return int(
+        os.environ.get("OST_SELENIUM_GRID_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)
+    )
+
+
+@contextlib.contextmanager
+def _locked_state():
+    """
+    Yield the grid state (None if there's no grid) and a function saving
+    it, with the state file locked.
+    """
+    path = _state_file()
+    with open(path + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (IOError, ValueError):
+                state = None
+
+            def save(new_state):
+                if new_state is None:
+                    try:
+                        os.unlink(path)
+                    except OSError as e:
+                        if e.errno != errno.ENOENT:
+                            raise
+                    return
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(new_state, f)
+                os.rename(tmp_path, path)
+
+            yield state, save
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def _live_leases(state):
+    return [pid for pid in state["leases"] if _pid_alive(pid)]
+
+
+def _matches(state, backend, engine_dns_entry, node_images, hub_image):
+    return (
+        state["backend"] == backend and
+        state["engine_dns_entry"] == engine_dns_entry and
+        state["node_images"] == node_images and
+        state["hub_image"] == hub_image
+    )
+
+
+def _healthy(state):
+    try:
+        common.grid_health_check(state["url"], len(state["node_images"]),
+                                 timeout=ATTACH_HEALTH_CHECK_TIMEOUT)
+    except RuntimeError:
+        return False
+    return True
+
+
+def _teardown(state):
+    LOGGER.info("Removing selenium grid at %s", state["url"])
+    _BACKENDS[state["backend"]].stop(state["resources"])
+
+
+def _spawn_reaper(grid_id, idle_timeout):
+    with open(os.devnull, "r+") as devnull:
+        subprocess.Popen(
+            [
+                sys.executable, "-m", "ost_utils.selenium.manager",
+                grid_id, str(idle_timeout)
+            ],
+            stdin=devnull, stdout=devnull, stderr=devnull,
+            close_fds=True, preexec_fn=os.setsid,
+        )
+
+
+def _acquire(backend, engine_dns_entry, node_images, hub_image):
+    with _locked_state() as (state, save):
+        if state is not None:
+            if (_matches(state, backend, engine_dns_entry, node_images,
+                         hub_image) and _healthy(state)):
+                LOGGER.info("Reusing selenium grid at %s", state["url"])
+            elif _live_leases(state):
+                raise RuntimeError(
+                    "Selenium grid at %s is used by other runs and "
+                    "can't be reused by this one" % state["url"]
+                )
+            else:
+                _teardown(state)
+                state = None
+
+        if state is None:
+            resources = _BACKENDS[backend].start(engine_dns_entry,
+                                                 node_images, hub_image)
+            state = {
+                "id": uuid.uuid4().hex,
+                "backend": backend,
+                "engine_dns_entry": engine_dns_entry,
+                "node_images": node_images,
+                "hub_image": hub_image,
+                "resources": resources,
+                "url": resources["url"],
+                "leases": [],
+            }
+
+        state["leases"] = _live_leases(state) + [os.getpid()]
+        state["last_used"] = time.time()
+        save(state)
+        return state
+
+
+def _release(grid_id, idle_timeout):
+    with _locked_state() as (state, save):
+        if state is None or state["id"] != grid_id:
+            return
+        state["leases"] = [
+            pid for pid in _live_leases(state) if pid != os.getpid()
+        ]
+        state["last_used"] = time.time()
+        if state["leases"]:
+            save(state)
+        elif idle_timeout <= 0:
+            _teardown(state)
+            save(None)
+        else:
+            save(state)
+            _spawn_reaper(grid_id, idle_timeout)
+
+
+def reap(grid_id, idle_timeout):
+    """
+    Remove the grid once nobody used it for 'idle_timeout' seconds.
+    Returns as soon as somebody takes a lease on it, as whoever
+    releases the last lease starts a new reaper.
+    """
+    while True:
+        with _locked_state() as (state, save):
+            if state is None or state["id"] != grid_id:
+                return
+            if _live_leases(state):
+                return
+            idle_until = state["last_used"] + idle_timeout
+            if time.time() >= idle_until:
+                _teardown(state)
+                save(None)
+                return
+        time.sleep(max(0, idle_until - time.time()))
+
+
+@contextlib.contextmanager
+def leased_grid(backend, engine_fqdn, engine_ip, node_images=None,
+                hub_image=HUB_CONTAINER_IMAGE, idle_timeout=None):
+    """
+    Yield the url of a running grid, started or attached to, and keep
+    the grid running for 'idle_timeout' seconds after the last user
+    of it is done. An 'idle_timeout' of 0 removes the grid right away.
+    """
+    if node_images is None:
+        node_images = [CHROME_CONTAINER_IMAGE, FIREFOX_CONTAINER_IMAGE]
+    if idle_timeout is None:
+        idle_timeout = idle_timeout_from_env()
+
+    engine_dns_entry = "{}:{}".format(engine_fqdn, engine_ip)
+
+    with common.http_proxy_disabled():
+        state = _acquire(backend, engine_dns_entry, node_images, hub_image)
+        try:
+            yield state["url"]
+        finally:
+            _release(state["id"], idle_timeout)
+
+
+if __name__ == "__main__":
+    reap(sys.argv[1], int(sys.argv[2]))
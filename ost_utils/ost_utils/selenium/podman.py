@@ -28,6 +28,7 @@ from ost_utils.selenium import FIREFOX_CONTAINER_IMAGE
 from ost_utils.selenium import HUB_CONTAINER_IMAGE
 from ost_utils.selenium import common
 from ost_utils.shell import shell
+from ost_utils.shell import ShellError
 
 
 HUB_IP = "127.0.0.1"
@@ -45,22 +46,11 @@ def _log_issues(hub_name, node_names):
         )
 
 
-@contextlib.contextmanager
-def _pod(hub_port):
-    name = shell(["podman", "pod", "create", "-p", str(hub_port)]).strip()
-    try:
-        yield name
-    finally:
-        shell(["podman", "pod", "rm", name])
-
-
-@contextlib.contextmanager
-def _hub(image, pod_name):
-    name = shell(["podman", "run", "-d", "--pod", pod_name, image]).strip()
+def _rm(args):
     try:
-        yield name
-    finally:
-        shell(["podman", "rm", "-f", name])
+        shell(args)
+    except ShellError as e:
+        LOGGER.warning("'%s' failed: %s" % (" ".join(args), e.err))
 
 
 # When running multiple containers in a pod, they compete over
@@ -69,12 +59,9 @@ def _hub(image, pod_name):
 # the ports they're using by default and the 'DISPLAY' variable
 # (we're using debug images which run VNC server) to some unique
 # values.
-@contextlib.contextmanager
-def _nodes(images, hub_port, pod_name, engine_dns_entry):
-    names = []
-
-    for image in images:
-        name = shell([
+def _node_commands(images, hub_port, pod_name, engine_dns_entry):
+    return [
+        [
             "podman", "run", "-d",
             "--add-host={}".format(engine_dns_entry),
             "-e", "HUB_HOST={}".format(HUB_IP),
@@ -83,14 +70,49 @@ def _nodes(images, hub_port, pod_name, engine_dns_entry):
             "-e", "DISPLAY=:{}".format(next(NODE_DISPLAY_ADDR_GEN)),
             "--pod", pod_name,
             image
-        ]).strip()
-        names.append(name)
+        ]
+        for image in images
+    ]
+
+
+def start(engine_dns_entry, node_images, hub_image=HUB_CONTAINER_IMAGE,
+          hub_port=HUB_PORT):
+    """
+    Start a grid and return the resources of it that 'stop' needs.
+    If starting fails, whatever was started is removed.
+    """
+    resources = {"pod": None, "hub": None, "nodes": []}
 
     try:
-        yield names
-    finally:
-        for name in names:
-            shell(["podman", "rm", "-f", name])
+        resources["pod"] = shell(
+            ["podman", "pod", "create", "-p", str(hub_port)]
+        ).strip()
+        resources["hub"] = shell(
+            ["podman", "run", "-d", "--pod", resources["pod"], hub_image]
+        ).strip()
+        commands = _node_commands(node_images, hub_port, resources["pod"],
+                                  engine_dns_entry)
+        resources["nodes"] = common.run_containers(commands)
+        resources["url"] = common.GRID_URL_TEMPLATE.format(HUB_IP, hub_port)
+        try:
+            common.grid_health_check(resources["url"], len(node_images))
+        except RuntimeError:
+            _log_issues(resources["hub"], resources["nodes"])
+            raise
+    except Exception:
+        stop(resources)
+        raise
+
+    return resources
+
+
+def stop(resources):
+    for name in resources["nodes"]:
+        _rm(["podman", "rm", "-f", name])
+    if resources["hub"] is not None:
+        _rm(["podman", "rm", "-f", resources["hub"]])
+    if resources["pod"] is not None:
+        _rm(["podman", "pod", "rm", resources["pod"]])
 
 
 @contextlib.contextmanager
@@ -102,14 +124,8 @@ def grid(engine_fqdn, engine_ip, node_images=None,
     engine_dns_entry="{}:{}".format(engine_fqdn, engine_ip)
 
     with common.http_proxy_disabled():
-        with _pod(hub_port) as pod_name:
-            with _hub(hub_image, pod_name) as hub_name:
-                with _nodes(node_images, hub_port, pod_name,
-                            engine_dns_entry) as node_names:
-                    url = common.GRID_URL_TEMPLATE.format(HUB_IP, hub_port)
-                    try:
-                        common.grid_health_check(url, len(node_images))
-                    except RuntimeError:
-                        _log_issues(hub_name, node_names)
-                        raise
-                    yield url
+        resources = start(engine_dns_entry, node_images, hub_image, hub_port)
+        try:
+            yield resources["url"]
+        finally:
+            stop(resources)
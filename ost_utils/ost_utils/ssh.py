@@ -1,10 +1,15 @@
 import array
+import atexit
+import collections
+import contextlib
 import fcntl
 import functools
+import hashlib
 import select
 import socket
 import sys
 import termios
+import threading
 import time
 import tty
 import uuid
@@ -16,9 +21,19 @@ from . import (
     vm,
     utils,
     log_utils,
+    profiler,
 )
 SSH_TIMEOUT_DEFAULT = 100
 SSH_TRIES_DEFAULT = 20
+SSH_POOL_MAX_PER_HOST = 4
+SSH_POOL_MAX_CHANNELS = 10
+SSH_POOL_IDLE_TIMEOUT = 300
+#: Max number of bytes to read from a channel stream in a single call
+DRAIN_CHUNK_SIZE = 64 * 1024
+#: Default number of bytes kept by a RingBuffer
+DRAIN_RING_BUFFER_SIZE = 1024 * 1024
+#: How often (in seconds) to check the terminal size when echoing to a tty
+TTY_RESIZE_INTERVAL = 0.5
 LOGGER = logging.getLogger(__name__)
 LogTask = functools.partial(log_utils.LogTask, logger=LOGGER)
 log_task = functools.partial(log_utils.log_task, logger=LOGGER)
@@ -34,9 +49,11 @@ def ssh(
     ssh_key=None,
     username='root',
     password='vagrant',
+    out_sink=None,
+    err_sink=None,
 ):
     host_name = host_name or ip_addr
-    client = get_ssh_client(
+    session = _SSH_POOL.session(
         ip_addr=ip_addr,
         host_name=host_name,
         propagate_fail=propagate_fail,
@@ -45,30 +62,31 @@ def ssh(
         username=username,
         password=password,
     )
-    transport = client.get_transport()
-    channel = transport.open_session()
     joined_command = ' '.join(command)
-    command_id = _gen_ssh_command_id()
-    LOGGER.debug(
-        'Running %s on %s: %s%s',
-        command_id,
-        host_name,
-        joined_command,
-        data is not None and (' < "%s"' % data) or '',
-    )
-    channel.exec_command(joined_command)
-    if data is not None:
-        channel.send(data)
-    channel.shutdown_write()
-    return_code, out, err = drain_ssh_channel(
-        channel, **(show_output and {} or {
-            'stdout': None,
-            'stderr': None
-        })
-    )
-    channel.close()
-    transport.close()
-    client.close()
+    with session as channel, profiler.span(
+        joined_command, 'ssh', host=host_name
+    ):
+        command_id = _gen_ssh_command_id()
+        LOGGER.debug(
+            'Running %s on %s: %s%s',
+            command_id,
+            host_name,
+            joined_command,
+            data is not None and (' < "%s"' % data) or '',
+        )
+        channel.exec_command(joined_command)
+        if data is not None:
+            channel.send(data)
+        channel.shutdown_write()
+        return_code, out, err = drain_ssh_channel(
+            channel,
+            out_sink=out_sink,
+            err_sink=err_sink,
+            **(show_output and {} or {
+                'stdout': None,
+                'stderr': None
+            })
+        )
 
     LOGGER.debug(
         'Command %s on %s returned with %d',
@@ -201,12 +219,103 @@ def interactive_ssh(
         client.close()
 
 
-def drain_ssh_channel(chan, stdin=None, stdout=sys.stdout, stderr=sys.stderr):
+class RingBuffer(object):
+    """
+    Bounded output sink that keeps only the last ``maxlen`` bytes written to
+    it, useful to keep the tail of a huge command output without holding all
+    of it in memory
+
+    Attributes:
+        maxlen(int): Maximum number of bytes to keep
+        dropped(int): Number of bytes that were discarded so far
+    """
+
+    def __init__(self, maxlen=DRAIN_RING_BUFFER_SIZE):
+        self.maxlen = maxlen
+        self.dropped = 0
+        self._chunks = collections.deque()
+        self._size = 0
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._size > self.maxlen:
+            excess = self._size - self.maxlen
+            first = self._chunks[0]
+            if len(first) <= excess:
+                self._chunks.popleft()
+                excess = len(first)
+            else:
+                self._chunks[0] = first[excess:]
+            self._size -= excess
+            self.dropped += excess
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+
+def _get_sink_writer(sink):
+    if sink is None:
+        return None
+    return getattr(sink, 'write', sink)
+
+
+def _drain_channel_stream(is_ready, recv, write, echo):
+    wrote = False
+    while is_ready():
+        try:
+            chunk = recv(DRAIN_CHUNK_SIZE)
+        except socket.error:
+            break
+        if not chunk:
+            break
+        write(chunk)
+        if echo:
+            echo.write(chunk)
+            wrote = True
+
+    if wrote:
+        echo.flush()
+
+
+def drain_ssh_channel(
+    chan,
+    stdin=None,
+    stdout=sys.stdout,
+    stderr=sys.stderr,
+    out_sink=None,
+    err_sink=None,
+):
+    """
+    Read everything from the given channel until it's closed, while feeding
+    it the given stdin and echoing its output to stdout and stderr
+
+    The output is read in large chunks as soon as the channel signals that
+    there is data to read (or that it was closed), instead of polling it.
+
+    Args:
+        chan(paramiko.Channel): Channel to drain, after the command was
+            started on it
+        stdin(file): If given, file to read and send to the channel
+        stdout(file): If given, file to echo the channel stdout to
+        stderr(file): If given, file to echo the channel stderr to
+        out_sink(file, callable or RingBuffer): If given, where to write the
+            channel stdout to instead of collecting it in memory, either an
+            object with a ``write`` method or a callable that gets each chunk
+        err_sink(file, callable or RingBuffer): Same as ``out_sink``, for the
+            channel stderr
+
+    Returns:
+        tuple of int, str, str: The exit status, and the stdout and stderr
+            of the command. If a sink was given for a stream, the returned
+            value is the sink's ``getvalue()`` if it has one (as
+            :class:`RingBuffer` does), and an empty string otherwise.
+    """
     chan.settimeout(0)
-    out_queue = []
     out_all = []
-    err_queue = []
     err_all = []
+    write_out = _get_sink_writer(out_sink) or out_all.append
+    write_err = _get_sink_writer(err_sink) or err_all.append
 
     try:
         stdout_is_tty = stdout.isatty()
@@ -214,8 +323,12 @@ def drain_ssh_channel(chan, stdin=None, stdout=sys.stdout, stderr=sys.stderr):
     except AttributeError:
         stdout_is_tty = False
 
-    done = False
-    while not done:
+    # Without a tty there is nothing to poll for, the channel wakes the
+    # select up by itself when it has data or when it's closed
+    select_timeout = TTY_RESIZE_INTERVAL if stdout_is_tty else None
+    stdin_open = stdin is not None and not stdin.closed
+
+    while True:
         if stdout_is_tty:
             arr = array.array('h', range(4))
             if not fcntl.ioctl(stdout.fileno(), termios.TIOCGWINSZ, arr):
@@ -223,59 +336,41 @@ def drain_ssh_channel(chan, stdin=None, stdout=sys.stdout, stderr=sys.stderr):
                     tty_h, tty_w = arr[:2]
                     chan.resize_pty(width=tty_w, height=tty_h)
 
-        read_streams = []
-        if not chan.closed:
-            read_streams.append(chan)
+        read_streams = [chan]
+        if stdin_open:
+            read_streams.append(stdin)
 
-            if stdin and not stdin.closed:
-                read_streams.append(stdin)
+        read, _, _ = select.select(read_streams, [], [], select_timeout)
 
-        write_streams = []
-        if stdout and out_queue:
-            write_streams.append(stdout)
-        if stderr and err_queue:
-            write_streams.append(stderr)
-
-        read, write, _ = select.select(
-            read_streams,
-            write_streams,
-            [],
-            0.1,
-        )
-
-        if stdin in read:
+        if stdin_open and stdin in read:
             chunk = utils.read_nonblocking(stdin)
             if chunk:
                 chan.send(chunk)
             else:
                 chan.shutdown_write()
+                stdin_open = False
 
-        try:
-            if chan.recv_ready():
-                chunk = chan.recv(1024)
-                if stdout:
-                    out_queue.append(chunk)
-                out_all.append(chunk)
-
-            if chan.recv_stderr_ready():
-                chunk = chan.recv_stderr(1024)
-                if stderr:
-                    err_queue.append(chunk)
-                err_all.append(chunk)
-        except socket.error:
-            pass
+        _drain_channel_stream(chan.recv_ready, chan.recv, write_out, stdout)
+        _drain_channel_stream(
+            chan.recv_stderr_ready, chan.recv_stderr, write_err, stderr
+        )
 
-        if stdout in write:
-            stdout.write(out_queue.pop(0))
-            stdout.flush()
-        if stderr in write:
-            stderr.write(err_queue.pop(0))
-            stderr.flush()
+        if (
+            chan.closed and not chan.recv_ready()
+            and not chan.recv_stderr_ready()
+        ):
+            break
 
-        if chan.closed and not out_queue and not err_queue:
-            done = True
+    if out_sink is not None:
+        out = getattr(out_sink, 'getvalue', lambda: '')()
+    else:
+        out = ''.join(out_all)
+    if err_sink is not None:
+        err = getattr(err_sink, 'getvalue', lambda: '')()
+    else:
+        err = ''.join(err_all)
 
-    return (chan.exit_status, ''.join(out_all), ''.join(err_all))
+    return (chan.exit_status, out, err)
 
 
 def interactive_ssh_channel(chan, command=None, stdin=sys.stdin):
@@ -388,3 +483,272 @@ def get_ssh_client(
 
 class OSTSSHTimeoutException(Exception):
     pass
+
+
+def _is_client_alive(client):
+    transport = client.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    try:
+        transport.send_ignore()
+    except (socket.error, EOFError, paramiko.ssh_exception.SSHException):
+        return False
+    return True
+
+
+class _PooledClient(object):
+    def __init__(self, client=None):
+        self.client = client
+        self.channels = 0
+        self.last_used = time.time()
+
+
+class SSHConnectionPool(object):
+    """
+    Thread safe pool of connected SSH clients, keyed by the endpoint and the
+    credentials used to reach it. Every command opens a new channel on an
+    already authenticated transport instead of going through a full TCP and
+    SSH handshake.
+
+    Up to ``max_per_host`` connections are opened for the same key, each
+    command going to the least busy one. Once they are all busy, more
+    channels are opened on the existing connections, up to
+    ``max_channels`` per connection (sshd allows 10 sessions per
+    connection by default); only callers beyond that wait for a channel to
+    be released.
+
+    Attributes:
+        max_per_host(int): Maximum number of connections to keep for the
+            same key
+        max_channels(int): Maximum number of channels open concurrently on
+            the same connection
+        idle_timeout(int): Seconds after which an unused connection is closed
+    """
+
+    def __init__(
+        self,
+        max_per_host=SSH_POOL_MAX_PER_HOST,
+        max_channels=SSH_POOL_MAX_CHANNELS,
+        idle_timeout=SSH_POOL_IDLE_TIMEOUT,
+    ):
+        self.max_per_host = max_per_host
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self._clients = collections.defaultdict(list)
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _key(ip_addr, username, ssh_key, password):
+        if isinstance(ssh_key, list):
+            ssh_key = tuple(ssh_key)
+        if password is not None:
+            password = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return (ip_addr, username, ssh_key, password)
+
+    def _evict_idle(self):
+        deadline = time.time() - self.idle_timeout
+        for key, clients in self._clients.items():
+            for entry in clients[:]:
+                if (
+                    entry.client is not None and not entry.channels
+                    and entry.last_used < deadline
+                ):
+                    LOGGER.debug('Closing idle ssh connection to %s', key[0])
+                    clients.remove(entry)
+                    entry.client.close()
+
+    def _find(self, key, client):
+        for entry in self._clients[key]:
+            if entry.client is client:
+                return entry
+        return None
+
+    def acquire(
+        self, ip_addr, username='root', ssh_key=None, password=None, **kwargs
+    ):
+        """
+        Get a connected client from the pool to open a channel on, the least
+        busy healthy one, or a new one if all of them are busy and the per
+        host limit allows it
+
+        Args:
+            ip_addr(str): IP address of the endpoint
+            username(str): The username to authenticate with
+            ssh_key(str or list of str): Path to the private key file(s)
+            password(str): Used for password authentication
+                or for private key decryption
+            **kwargs: Any other param to pass to :func:`get_ssh_client`
+
+        Returns:
+            paramiko.SSHClient: Connected client, which must be given back
+                with :meth:`release` once its channel is closed
+        """
+        key = self._key(ip_addr, username, ssh_key, password)
+        with self._cond:
+            while True:
+                self._evict_idle()
+                clients = self._clients[key]
+                for entry in clients[:]:
+                    if (
+                        entry.client is not None and not entry.channels
+                        and not _is_client_alive(entry.client)
+                    ):
+                        clients.remove(entry)
+                        entry.client.close()
+
+                connected = sorted(
+                    (entry for entry in clients if entry.client is not None),
+                    key=lambda entry: entry.channels,
+                )
+                if connected and (
+                    not connected[0].channels
+                    or len(clients) >= self.max_per_host
+                ) and connected[0].channels < self.max_channels:
+                    connected[0].channels += 1
+                    return connected[0].client
+
+                if len(clients) < self.max_per_host:
+                    # reserve the slot while connecting
+                    pending = _PooledClient()
+                    pending.channels = 1
+                    clients.append(pending)
+                    break
+
+                self._cond.wait(1)
+
+        try:
+            client = get_ssh_client(
+                ip_addr=ip_addr,
+                username=username,
+                ssh_key=ssh_key,
+                password=password,
+                **kwargs
+            )
+        except Exception:
+            with self._cond:
+                self._clients[key].remove(pending)
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            pending.client = client
+            self._cond.notify_all()
+        return client
+
+    def release(
+        self,
+        client,
+        ip_addr,
+        username='root',
+        ssh_key=None,
+        password=None,
+        discard=False,
+    ):
+        """
+        Give back a client obtained with :meth:`acquire`
+
+        Args:
+            client(paramiko.SSHClient): The client to give back
+            ip_addr(str): IP address of the endpoint
+            username(str): The username the client authenticated with
+            ssh_key(str or list of str): Path to the private key file(s)
+            password(str): The password the client authenticated with
+            discard(bool): If True, close the client instead of keeping it,
+                failing the other channels open on it
+        """
+        key = self._key(ip_addr, username, ssh_key, password)
+        with self._cond:
+            entry = self._find(key, client)
+            if entry is not None:
+                entry.channels -= 1
+                entry.last_used = time.time()
+                if discard or not _is_client_alive(client):
+                    self._clients[key].remove(entry)
+                    entry = None
+            if entry is None:
+                client.close()
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def session(
+        self, ip_addr, username='root', ssh_key=None, password=None, **kwargs
+    ):
+        """
+        Context manager that opens a session channel on a pooled connection,
+        and closes the channel and gives back the connection when done.
+
+        If the channel can't be opened on a reused connection (for example,
+        the host was rebooted), all the idle connections to that endpoint are
+        dropped and a fresh one is used.
+
+        Args:
+            ip_addr(str): IP address of the endpoint
+            username(str): The username to authenticate with
+            ssh_key(str or list of str): Path to the private key file(s)
+            password(str): Used for password authentication
+                or for private key decryption
+            **kwargs: Any other param to pass to :func:`get_ssh_client`
+
+        Yields:
+            paramiko.Channel: The opened session channel
+        """
+        pool_args = (ip_addr, username, ssh_key, password)
+        for attempt in range(2):
+            client = self.acquire(*pool_args, **kwargs)
+            try:
+                channel = client.get_transport().open_session()
+                break
+            except (socket.error, EOFError,
+                    paramiko.ssh_exception.SSHException) as err:
+                self.release(client, *pool_args, discard=True)
+                if attempt:
+                    raise
+                LOGGER.debug(
+                    'Failed to open ssh channel to %s, reconnecting: %s',
+                    ip_addr,
+                    err,
+                )
+                self.close(ip_addr)
+
+        discard = False
+        try:
+            yield channel
+        except (socket.error, EOFError, paramiko.ssh_exception.SSHException):
+            discard = True
+            raise
+        finally:
+            channel.close()
+            self.release(client, *pool_args, discard=discard)
+
+    def close(self, ip_addr=None):
+        """
+        Close the idle connections, connections that are in use are closed
+        when they are released if they are not healthy anymore
+
+        Args:
+            ip_addr(str): If given, close only the connections to this
+                endpoint
+        """
+        with self._cond:
+            for key, clients in self._clients.items():
+                if ip_addr is not None and key[0] != ip_addr:
+                    continue
+                for entry in clients[:]:
+                    if entry.client is not None and not entry.channels:
+                        clients.remove(entry)
+                        entry.client.close()
+
+
+_SSH_POOL = SSHConnectionPool()
+atexit.register(_SSH_POOL.close)
+
+
+def close_ssh_connections(ip_addr=None):
+    """
+    Close the pooled ssh connections, useful after a host was rebooted or
+    its keys were changed
+
+    Args:
+        ip_addr(str): If given, close only the connections to this endpoint
+    """
+    _SSH_POOL.close(ip_addr)
@@ -21,13 +21,12 @@ import datetime
 import functools
 import logging
 import os
-import time
 import unittest.case
 import nose.plugins
 from nose.plugins.skip import SkipTest
-import utils
 
 
+from ost_utils import waiter
 from ost_utils.vm import VagrantHosts
 
 LOGGER = logging.getLogger(__name__)
@@ -35,6 +34,7 @@ SHORT_TIMEOUT = 3 * 60
 LONG_TIMEOUT = 10 * 60
 
 _test_prefix = None
+_event_watcher = None
 
 
 def get_test_prefix():
@@ -68,10 +68,26 @@ def with_ovirt_api(func):
     return wrapper
 
 
+def _start_event_watcher(prefix):
+    """
+    Start the default watcher of the waits, so the tests talking to the
+    engine stop waiting as soon as the engine reports a change
+    """
+    global _event_watcher
+    if _event_watcher is None:
+        engine = prefix.virt_env.engine_vm()
+        _event_watcher = waiter.EngineEventWatcher(
+            engine.get_api_v4_system_service
+        )
+        _event_watcher.start()
+        waiter.set_default_watcher(_event_watcher)
+
+
 def with_ovirt_api4(func):
     @functools.wraps(func)
     @with_ovirt_prefix
     def wrapper(prefix, *args, **kwargs):
+        _start_event_watcher(prefix)
         return func(
             prefix.virt_env.engine_vm().get_api(api_ver=4), *args, **kwargs
         )
@@ -83,6 +99,7 @@ def with_ovirt_api4_service(func):
     @functools.wraps(func)
     @with_ovirt_prefix
     def wrapper(prefix, *args, **kwargs):
+        _start_event_watcher(prefix)
         return func(
             prefix.virt_env.engine_vm().get_api_v4_system_service(), *args,
             **kwargs
@@ -139,40 +156,37 @@ def _instance_of_any(obj, cls_list):
 
 
 def assert_equals_within(
-    func, value, timeout, allowed_exceptions=None, initial_wait=10,
-    error_message=None
+    func, value, timeout, allowed_exceptions=None, initial_wait=0,
+    error_message=None, watcher=None
 ):
     allowed_exceptions = allowed_exceptions or []
-    with utils.EggTimer(timeout) as timer:
-        while not timer.elapsed():
-            try:
-                res = func()
-                if res == value:
-                    return
-            except Exception as exc:
-                if _instance_of_any(exc, allowed_exceptions):
-                    time.sleep(3)
-                    continue
-
-                LOGGER.exception("Unhandled exception in %s", func)
-                raise
-
-            if initial_wait == 0:
-                time.sleep(3)
-            else:
-                time.sleep(initial_wait)
-                initial_wait = 0
+    backoff = None
+    if initial_wait:
+        backoff = waiter.Backoff(initial=initial_wait)
     try:
+        waiter.wait_for(
+            func,
+            timeout,
+            success=lambda res: res == value,
+            allowed_exceptions=allowed_exceptions,
+            backoff=backoff,
+            watcher=watcher,
+        )
+    except waiter.WaitTimeout as exc:
+        res = exc.args[0]
+        # if func repeatedly raises any of the allowed exceptions, there is
+        # no result to compare
+        if _instance_of_any(res, allowed_exceptions):
+            raise AssertionError(
+                '%s failed to evaluate after %s seconds' %
+                (func.__name__, timeout)
+            )
         if error_message is None:
             error_message = '%s != %s after %s seconds' % (res, value, timeout)
         raise AssertionError(error_message)
-    # if func repeatedly raises any of the allowed exceptions, res remains
-    # unbound throughout the function, resulting in an UnboundLocalError.
-    except UnboundLocalError:
-        raise AssertionError(
-            '%s failed to evaluate after %s seconds' %
-            (func.__name__, timeout)
-        )
+    except Exception:
+        LOGGER.exception("Unhandled exception in %s", func)
+        raise
 
 
 def assert_equals_within_short(func, value, allowed_exceptions=None,
@@ -22,6 +22,7 @@ import collections
 import datetime
 import fcntl
 import functools
+import itertools
 import json
 import logging
 import os
@@ -38,6 +39,7 @@ from io import StringIO
 import argparse
 import configparser
 import uuid as uuid_m
+import log_utils
 from log_utils import (LogTask, setup_prefix_logging)
 import hashlib
 
@@ -56,61 +58,210 @@ class TimerException(Exception):
     pass
 
 
-def _ret_via_queue(func, queue):
+#: Default max number of threads to run parallel calls on, VectorThread is
+#: not bounded unless asked to, as its callables may wait for each other
+DEFAULT_MAX_WORKERS = 16
+_worker_ids = itertools.count()
+
+
+def _call(target):
     try:
-        queue.put({'return': func()})
+        return {'return': target()}
     except Exception:
         LOGGER.debug(
             'Error while running thread %s',
             threading.current_thread().name,
             exc_info=True
         )
-        queue.put({'exception': sys.exc_info()})
+        return {'exception': sys.exc_info()}
+
+
+def _reraise(exc_info):
+    raise exc_info[0], exc_info[1], exc_info[2]
 
 
 def func_vector(target, args_sequence):
     return [functools.partial(target, *args) for args in args_sequence]
 
 
+class BoundedExecutor(object):
+    """
+    Runs callables in parallel, on at most ``max_workers`` threads.
+
+    The worker threads inherit the log tasks of the thread that started
+    them, so their logs are nested under the task that is running them.
+
+    Attributes:
+        max_workers (int or None): max number of callables to run at the
+            same time, if None all of them run at once
+        fail_fast (bool): If True, the first failure cancels all the
+            callables that didn't start yet and is raised right away.
+            Otherwise, all the callables run, and the first failure is
+            raised once they are all done.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, fail_fast=True):
+        self.max_workers = max_workers
+        self.fail_fast = fail_fast
+
+    def _outcomes(self, targets, parent_thread=None):
+        targets = list(targets)
+        if not targets:
+            return
+
+        pending = Queue.Queue()
+        for item in enumerate(targets):
+            pending.put(item)
+        done = Queue.Queue()
+        cancelled = threading.Event()
+        if parent_thread is None:
+            parent_thread = threading.current_thread().name
+        max_workers = self.max_workers or len(targets)
+
+        def worker():
+            log_utils.inherit_log_context(parent_thread)
+            try:
+                while not cancelled.is_set():
+                    try:
+                        index, target = pending.get_nowait()
+                    except Queue.Empty:
+                        return
+                    done.put((index, _call(target)))
+            finally:
+                log_utils.forget_log_context()
+
+        for _ in range(min(max_workers, len(targets))):
+            thread = threading.Thread(
+                target=worker,
+                name='%s-worker-%d' % (parent_thread, next(_worker_ids)),
+            )
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for _ in range(len(targets)):
+                # A blocking get without a timeout can't be interrupted by
+                # signals in python 2
+                while True:
+                    try:
+                        yield done.get(timeout=1)
+                        break
+                    except Queue.Empty:
+                        pass
+        finally:
+            cancelled.set()
+
+    def as_completed(self, targets):
+        """
+        Run the given callables, yielding their results as they complete
+
+        Args:
+            targets (iterable of callable): callables to run, without
+                arguments
+
+        Yields:
+            tuple of int, object: the index of the callable in ``targets``
+                and its return value
+        """
+        first_failure = None
+        outcomes = self._outcomes(targets)
+        try:
+            for index, outcome in outcomes:
+                if 'exception' in outcome:
+                    if self.fail_fast:
+                        _reraise(outcome['exception'])
+                    first_failure = first_failure or outcome['exception']
+                    continue
+                yield index, outcome['return']
+        finally:
+            outcomes.close()
+
+        if first_failure is not None:
+            _reraise(first_failure)
+
+    def map(self, targets):
+        """
+        Run the given callables and wait for all of them
+
+        Args:
+            targets (iterable of callable): callables to run, without
+                arguments
+
+        Returns:
+            list: the return values, in the order of ``targets``
+        """
+        targets = list(targets)
+        results = [None] * len(targets)
+        for index, result in self.as_completed(targets):
+            results[index] = result
+        return results
+
+
 class VectorThread:
-    def __init__(self, targets):
+    """
+    Compatibility wrapper that runs the given callables with a
+    :class:`BoundedExecutor`, all of them at once unless ``max_workers`` is
+    given
+    """
+
+    def __init__(self, targets, max_workers=None):
         self.targets = targets
         self.results = None
+        self._executor = BoundedExecutor(max_workers, fail_fast=False)
+        self._outcomes = [None] * len(targets)
+        self._runner = None
+
+    def _run(self, parent_thread):
+        outcomes = self._executor._outcomes(self.targets, parent_thread)
+        for index, outcome in outcomes:
+            self._outcomes[index] = outcome
 
     def start_all(self):
-        self.thread_handles = []
-        for target in self.targets:
-            q = Queue.Queue()
-            t = threading.Thread(target=_ret_via_queue, args=(target, q))
-            self.thread_handles.append((t, q))
-            t.start()
+        # The workers are started by the runner thread, but belong to the
+        # log tasks of the caller
+        parent_thread = threading.current_thread().name
+        self._runner = threading.Thread(
+            target=self._run, args=(parent_thread,)
+        )
+        self._runner.start()
 
     def join_all(self, raise_exceptions=True):
         if self.results:
             return self.results
 
-        for t, q in self.thread_handles:
-            t.join()
-
-        self.results = map(lambda (t, q): q.get(), self.thread_handles)
+        self._runner.join()
+        self.results = self._outcomes
         if raise_exceptions:
             for result in self.results:
                 if 'exception' in result:
-                    exc_info = result['exception']
-                    raise exc_info[1], None, exc_info[2]
+                    _reraise(result['exception'])
         return map(lambda x: x.get('return', None), self.results)
 
 
-def invoke_in_parallel(func, *args_sequences):
-    vt = VectorThread(func_vector(func, zip(*args_sequences)))
-    vt.start_all()
-    return vt.join_all()
+def invoke_in_parallel(func, *args_sequences, **kwargs):
+    """
+    Call ``func`` in parallel once for each set of arguments
 
+    Args:
+        func (callable): function to call
+        *args_sequences: sequences of the arguments to call ``func`` with,
+            one sequence for each of its positional arguments
+        max_workers (int): max number of parallel calls
 
-def invoke_different_funcs_in_parallel(*funcs):
-    vt = VectorThread(funcs)
-    vt.start_all()
-    return vt.join_all()
+    Returns:
+        list: the return values, in the order of the arguments
+    """
+    executor = BoundedExecutor(
+        kwargs.get('max_workers', DEFAULT_MAX_WORKERS)
+    )
+    return executor.map(func_vector(func, zip(*args_sequences)))
+
+
+def invoke_different_funcs_in_parallel(*funcs, **kwargs):
+    executor = BoundedExecutor(
+        kwargs.get('max_workers', DEFAULT_MAX_WORKERS)
+    )
+    return executor.map(funcs)
 
 
 def service_is_enabled(name):
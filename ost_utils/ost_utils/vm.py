@@ -18,14 +18,20 @@ from functools import wraps
 import collections
 import io
 import service
-import time
 import warnings
 import logging
 import yaml
 from itertools import chain
 from collections import OrderedDict
 import testlib
-from ost_utils.sdk_utils import available_sdks, require_sdk
+from ost_utils.sdk_utils import (
+    API_TEST_TIMEOUT,
+    SDKConnectionManager,
+    ThreadLocalConnection,
+    available_sdks,
+    require_sdk,
+)
+from ost_utils import waiter
 from ost_utils.log_utils import LevelFilter
 
 import ovirtsdk.api
@@ -35,8 +41,9 @@ import utils
 try:
     import ovirtsdk4 as sdk4
     import ovirtsdk4.types as otypes
+    _SDK4_RETRY_EXCEPTIONS = (sdk4.AuthError, sdk4.ConnectionError)
 except ImportError:
-    pass
+    _SDK4_RETRY_EXCEPTIONS = ()
 
 LOGGER = logging.getLogger(__name__)
 # sh is bombing the log, handle it.
@@ -351,7 +358,11 @@ class EngineVM(VM):
         self._username = kwargs.get('ovirt-engine-user', 'admin@internal')
         self._password = str(kwargs.get('ovirt-engine-password', u'123'))
         self._api_v3 = None
-        self._api_v4 = None
+        self._api_v4 = SDKConnectionManager(
+            factory=lambda: self._get_api(api_ver=4),
+            retry_exceptions=_SDK4_RETRY_EXCEPTIONS,
+        )
+        self._api_v4_connection = ThreadLocalConnection(self._api_v4)
         self._metadata = {}
         self._metadata['ovirt-engine-password'] = self._password
 
@@ -380,16 +391,13 @@ class EngineVM(VM):
                 insecure=True,
             )
         if api_ver == 4:
-            import logging
-            logging.basicConfig(level=logging.DEBUG,filename='/tmp/x.log')
             if '4' not in available_sdks():
                 raise RuntimeError('oVirt Python SDK v4 not found.')
             return sdk4.Connection(
-                url= url.encode('ascii'),
+                url=url.encode('ascii'),
                 username=self.username,
                 password=self.password.encode('ascii'),
                 insecure=True,
-                debug=True,
             )
         raise RuntimeError('Unknown API requested: %s' % api_ver)
 
@@ -418,13 +426,12 @@ class EngineVM(VM):
             return api_v3.pop()
         else:
             testapi = api_v4.pop()
-            counter = 1
-            while not testapi.test():
-                if counter == 20:
-                    raise RuntimeError('test api call failed')
-                else:
-                    time.sleep(3)
-                    counter += 1
+            try:
+                waiter.wait_for(
+                    testapi.test, API_TEST_TIMEOUT, name='engine api test'
+                )
+            except waiter.WaitTimeout:
+                raise RuntimeError('test api call failed')
 
             return testapi
 
@@ -440,11 +447,15 @@ class EngineVM(VM):
         return self._api_v3
 
     def get_api_v4(self, check=False):
-        if self._api_v4 is None or not self._api_v4.test():
-            self._api_v4 = self._get_api(api_ver=4)
-            if check and self._api_v4 is None:
-                raise RuntimeError('Could not connect to engine')
-        return self._api_v4
+        """
+        Returns the SDK v4 connection of the engine. The services it creates
+        send each request with the connection of the calling thread, which
+        is reused, health checked when its TTL expires, and re-authenticated
+        when a request fails to authenticate.
+        """
+        if check and self._api_v4.get() is None:
+            raise RuntimeError('Could not connect to engine')
+        return self._api_v4_connection
 
     def get_api_v4_system_service(self):
         api = self.get_api_v4(False)
@@ -0,0 +1,652 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Waiting for conditions to be met, probing them with an adaptive backoff
+instead of fixed sleeps, and optionally waking up as soon as the engine
+reports that something changed, see :func:`set_default_watcher`.
+
+Many conditions on engine entities can be waited for together with
+:func:`wait_all` and :func:`wait_any`, which fetch all the entities of the
+same collection with a single ``list`` call per probe.
+"""
+import collections
+import logging
+import random
+import threading
+import time
+
+from ost_utils import profiler
+
+LOGGER = logging.getLogger(__name__)
+
+#: Delay (in seconds) before the second probe
+BACKOFF_INITIAL = 0.25
+#: Factor to grow the delay by after each unsuccessful probe
+BACKOFF_FACTOR = 1.5
+#: Max delay (in seconds) between two probes
+BACKOFF_MAX = 3
+#: Fraction of the delay to randomly add or remove from it
+BACKOFF_JITTER = 0.1
+#: How often (in seconds) the engine is polled for new events
+EVENT_POLL_INTERVAL = 1
+#: Number of the most recent waits whose statistics are kept
+RECENT_STATS = 1000
+#: Max number of entity names searched for in a single ``list`` call, to
+#: keep the query within the URL length limits
+SEARCH_BATCH_SIZE = 50
+
+WaitStats = collections.namedtuple(
+    'WaitStats', ('name', 'probes', 'elapsed', 'succeeded')
+)
+
+
+class WaitTimeout(Exception):
+    """
+    Exception to throw when a wait didn't succeed in time
+
+    Attributes:
+        stats (WaitStats): statistics of the failed wait
+    """
+
+    def __init__(self, message, stats):
+        super(WaitTimeout, self).__init__(message)
+        self.stats = stats
+
+
+class Backoff(object):
+    """
+    Generator of the delays between probes, which grow exponentially from
+    ``initial`` up to ``maximum``, with a random jitter so parallel waiters
+    don't probe the engine in lockstep
+
+    Attributes:
+        initial (float): first delay, in seconds
+        factor (float): factor to grow the delay by
+        maximum (float): max delay, in seconds
+        jitter (float): fraction of the delay to randomly add or remove
+    """
+
+    def __init__(
+        self,
+        initial=BACKOFF_INITIAL,
+        factor=BACKOFF_FACTOR,
+        maximum=BACKOFF_MAX,
+        jitter=BACKOFF_JITTER,
+    ):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+
+    def __iter__(self):
+        delay = self.initial
+        while True:
+            yield delay * (1 + random.uniform(-self.jitter, self.jitter))
+            delay = min(delay * self.factor, self.maximum)
+
+
+class EngineEventWatcher(object):
+    """
+    Background poller of the engine audit log and jobs, which wakes up the
+    subscribed waiters whenever a new event shows up or a job changes its
+    status, so they can probe right away instead of sleeping until the
+    next backoff step.
+
+    A single watcher costs two cheap requests per ``interval``, no matter
+    how many waiters are subscribed to it. The engine is only polled from
+    the thread of the watcher, so it may be started before the engine is
+    up, and it starts waking up the waiters once the engine answers.
+
+    Example:
+        >>> with EngineEventWatcher(engine.get_api_v4_system_service) as w:
+        ...     wait_for(lambda: host.get().status == up, 600, watcher=w)
+
+    Attributes:
+        interval (float): seconds between two polls of the engine
+    """
+
+    def __init__(self, get_system_service, interval=EVENT_POLL_INTERVAL):
+        """
+        Args:
+            get_system_service (callable): returns the engine system service,
+                called from the thread of the watcher, so it must return a
+                service of a connection the thread may use
+            interval (float): seconds between two polls of the engine
+        """
+        self.interval = interval
+        self._get_system_service = get_system_service
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_event_id = None
+        self._jobs_state = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._last_event_id = None
+        self._jobs_state = None
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='engine-event-watcher'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def subscribe(self):
+        """
+        Returns:
+            threading.Event: event that will be set whenever the engine state
+                changes, to be given back with :meth:`unsubscribe`
+        """
+        event = threading.Event()
+        with self._lock:
+            self._subscribers.add(event)
+        return event
+
+    def unsubscribe(self, event):
+        with self._lock:
+            self._subscribers.discard(event)
+
+    def _notify(self):
+        with self._lock:
+            for event in self._subscribers:
+                event.set()
+
+    def _poll(self):
+        system_service = self._get_system_service()
+        events_service = system_service.events_service()
+        jobs_state = frozenset(
+            (job.id, str(job.status))
+            for job in system_service.jobs_service().list()
+        )
+        if self._last_event_id is None:
+            # the first successful poll is the state changes are seen from
+            events = events_service.list(max=1)
+            self._last_event_id = int(events[0].id) if events else 0
+            self._jobs_state = jobs_state
+            return False
+
+        changed = jobs_state != self._jobs_state
+        self._jobs_state = jobs_state
+        events = events_service.list(from_=self._last_event_id)
+        if events:
+            self._last_event_id = max(int(event.id) for event in events)
+            changed = True
+
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self._poll():
+                    self._notify()
+            except Exception:
+                LOGGER.debug('Failed to poll the engine events', exc_info=True)
+
+
+def _summarize(stats):
+    return {
+        'waits': len(stats),
+        'failed': sum(1 for s in stats if not s.succeeded),
+        'total_elapsed': sum(s.elapsed for s in stats),
+        'max_elapsed': max([s.elapsed for s in stats] or [0]),
+        'total_probes': sum(s.probes for s in stats),
+        'max_probes': max([s.probes for s in stats] or [0]),
+    }
+
+
+class _StatsRegistry(object):
+    """
+    Totals of all the waits, and the statistics of the most recent ones
+    """
+
+    def __init__(self, recent=RECENT_STATS):
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=recent)
+        self._summary = _summarize([])
+
+    def add(self, stats):
+        with self._lock:
+            self._recent.append(stats)
+            summary = self._summary
+            summary['waits'] += 1
+            summary['failed'] += 0 if stats.succeeded else 1
+            summary['total_elapsed'] += stats.elapsed
+            summary['max_elapsed'] = max(
+                summary['max_elapsed'], stats.elapsed
+            )
+            summary['total_probes'] += stats.probes
+            summary['max_probes'] = max(summary['max_probes'], stats.probes)
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+    def summary(self):
+        with self._lock:
+            return dict(self._summary)
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._summary = _summarize([])
+
+
+_STATS = _StatsRegistry()
+_default_watcher = None
+
+
+def set_default_watcher(watcher):
+    """
+    Set the watcher used by the waits that aren't given one, e.g. the
+    ``assert_*_within`` functions of :mod:`ost_utils.testlib`
+
+    Args:
+        watcher (EngineEventWatcher): watcher to use, None for none
+
+    Returns:
+        EngineEventWatcher: the previous default watcher
+    """
+    global _default_watcher
+    previous, _default_watcher = _default_watcher, watcher
+    return previous
+
+
+def get_wait_stats():
+    """
+    Returns:
+        list of WaitStats: statistics of the last ``RECENT_STATS`` waits
+    """
+    return _STATS.recent()
+
+
+def clear_wait_stats():
+    _STATS.clear()
+
+
+def summarize_wait_stats(stats=None):
+    """
+    Args:
+        stats (list of WaitStats): stats to summarize, all the waits done so
+            far if None
+
+    Returns:
+        dict: the number of waits and failed waits, the total and max wait
+            time and the total and max probe count
+    """
+    if stats is None:
+        return _STATS.summary()
+    return _summarize(stats)
+
+
+def format_wait_summary(summary=None):
+    """
+    Args:
+        summary (dict): summary of :func:`summarize_wait_stats`, the one of
+            all the waits done so far if None
+
+    Returns:
+        str: the summary, in a single line for the logs and reports
+    """
+    if summary is None:
+        summary = summarize_wait_stats()
+    return (
+        '{waits} waits ({failed} failed), {total_elapsed:.1f}s in total, '
+        'longest {max_elapsed:.1f}s, {total_probes} probes, '
+        'at most {max_probes} in a wait'.format(**summary)
+    )
+
+
+def _sleep(seconds, wakeup):
+    if wakeup is None:
+        time.sleep(seconds)
+    else:
+        wakeup.wait(seconds)
+        wakeup.clear()
+
+
+def _instance_of_any(obj, cls_list):
+    return any(True for cls in cls_list if isinstance(obj, cls))
+
+
+def wait_for(
+    probe,
+    timeout,
+    success=bool,
+    allowed_exceptions=None,
+    backoff=None,
+    watcher=None,
+    name=None,
+):
+    """
+    Probe until the result passes ``success``, or ``timeout`` seconds passed
+
+    The first probe is done right away, and the following ones after the
+    delays generated by ``backoff``. If a ``watcher`` is given, a change in
+    the engine state cuts the current delay short.
+
+    Args:
+        probe (callable): function to call, without arguments
+        timeout (float): seconds to wait before giving up
+        success (callable): gets the probe result and returns True if the
+            wait is over
+        allowed_exceptions (list of Exception): exceptions raised by the
+            probe that mean "not yet" rather than a failure
+        backoff (Backoff): delays to use between probes
+        watcher (EngineEventWatcher): if given, probe again as soon as the
+            engine reports a change, the default watcher is used if None
+        name (str): name of the wait for the logs and stats, the name of the
+            probe function by default
+
+    Returns:
+        object: the last result of the probe
+
+    Raises:
+        WaitTimeout: if the wait didn't succeed in time, its ``args`` hold
+            the last result (or exception) of the probe
+        Exception: any exception of the probe that is not allowed
+    """
+    allowed_exceptions = allowed_exceptions or []
+    backoff = backoff or Backoff()
+    name = name or getattr(probe, '__name__', str(probe))
+    watcher = watcher or _default_watcher
+    wakeup = watcher.subscribe() if watcher is not None else None
+
+    start_time = time.time()
+    deadline = start_time + timeout
+    probes = 0
+    result = None
+    succeeded = False
+    span = profiler.start_span(name, 'wait', timeout=timeout)
+    try:
+        for delay in backoff:
+            probes += 1
+            try:
+                result = probe()
+                if success(result):
+                    succeeded = True
+                    return result
+            except Exception as exc:
+                if not _instance_of_any(exc, allowed_exceptions):
+                    raise
+                result = exc
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            _sleep(min(delay, remaining), wakeup)
+    finally:
+        if wakeup is not None:
+            watcher.unsubscribe(wakeup)
+        stats = WaitStats(name, probes, time.time() - start_time, succeeded)
+        _STATS.add(stats)
+        if span is not None:
+            span.args.update(probes=probes, succeeded=succeeded)
+            profiler.end_span(span)
+        LOGGER.debug(
+            'Wait for %s %s after %.2f seconds and %d probes',
+            name,
+            'succeeded' if succeeded else 'failed',
+            stats.elapsed,
+            probes,
+        )
+
+    raise WaitTimeout(result, stats)
+
+
+class Condition(object):
+    """
+    A named probe and the check of its result, for :func:`wait_all` and
+    :func:`wait_any`
+
+    Attributes:
+        probe (callable): function to call, without arguments
+        success (callable): gets the probe result and returns True if the
+            condition is met
+        name (str): name of the condition, for the logs
+    """
+
+    def __init__(self, probe, success=bool, name=None):
+        self.probe = probe
+        self.success = success
+        self.name = name or getattr(probe, '__name__', str(probe))
+
+    def __str__(self):
+        return self.name
+
+
+class EntityCondition(object):
+    """
+    Condition on a single engine entity. The entities of all the conditions
+    on the same collection service (and with the same ``search``) are
+    fetched together with one ``list`` call per probe.
+
+    Attributes:
+        collection_service (ovirtsdk4.Service): service of the collection the
+            entity belongs to, e.g. ``system_service.vms_service()``
+        entity_name (str): name of the entity
+        predicate (callable): gets the entity (or None if it wasn't found)
+            and returns True if the condition is met
+        search (str): query to fetch the entities with, if None the entities
+            are searched by their names
+        name (str): name of the condition, for the logs
+    """
+
+    def __init__(
+        self, collection_service, entity_name, predicate, search=None,
+        name=None
+    ):
+        self.collection_service = collection_service
+        self.entity_name = entity_name
+        self.predicate = predicate
+        self.search = search
+        self.name = name or entity_name
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def batch_key(self):
+        return (id(self.collection_service), self.search)
+
+
+def _quote(value):
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _list_entities(conditions):
+    first = conditions[0]
+    service = first.collection_service
+    if first.search is not None:
+        entities = service.list(search=first.search)
+    else:
+        names = sorted(set(cond.entity_name for cond in conditions))
+        entities = []
+        for start in range(0, len(names), SEARCH_BATCH_SIZE):
+            entities.extend(service.list(search=' or '.join(
+                'name=%s' % _quote(name)
+                for name in names[start:start + SEARCH_BATCH_SIZE]
+            )))
+    return dict((entity.name, entity) for entity in entities)
+
+
+def _evaluate(conditions, allowed_exceptions):
+    met = []
+    batches = collections.OrderedDict()
+    for condition in conditions:
+        if isinstance(condition, EntityCondition):
+            batches.setdefault(condition.batch_key, []).append(condition)
+            continue
+        try:
+            if condition.success(condition.probe()):
+                met.append(condition)
+        except Exception as exc:
+            if not _instance_of_any(exc, allowed_exceptions):
+                raise
+
+    for batch in batches.values():
+        try:
+            entities = _list_entities(batch)
+        except Exception as exc:
+            if not _instance_of_any(exc, allowed_exceptions):
+                raise
+            continue
+        for condition in batch:
+            if condition.predicate(entities.get(condition.entity_name)):
+                met.append(condition)
+
+    return met
+
+
+def _wait_many(
+    conditions, timeout, wait_all, allowed_exceptions, backoff, watcher, name
+):
+    allowed_exceptions = allowed_exceptions or []
+    backoff = backoff or Backoff()
+    pending = list(conditions)
+    name = name or '%s of %d conditions' % (
+        'all' if wait_all else 'any', len(pending)
+    )
+    watcher = watcher or _default_watcher
+    wakeup = watcher.subscribe() if watcher is not None else None
+
+    start_time = time.time()
+    deadline = start_time + timeout
+    probes = 0
+    succeeded = False
+    span = profiler.start_span(name, 'wait', timeout=timeout)
+    try:
+        for delay in backoff:
+            probes += 1
+            met = _evaluate(pending, allowed_exceptions)
+            if met and not wait_all:
+                succeeded = True
+                return met[0]
+            pending = [cond for cond in pending if cond not in met]
+            if not pending:
+                succeeded = True
+                return list(conditions)
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            _sleep(min(delay, remaining), wakeup)
+    finally:
+        if wakeup is not None:
+            watcher.unsubscribe(wakeup)
+        stats = WaitStats(name, probes, time.time() - start_time, succeeded)
+        _STATS.add(stats)
+        if span is not None:
+            span.args.update(probes=probes, succeeded=succeeded)
+            profiler.end_span(span)
+        LOGGER.debug(
+            'Wait for %s %s after %.2f seconds and %d probes',
+            name,
+            'succeeded' if succeeded else 'failed',
+            stats.elapsed,
+            probes,
+        )
+
+    raise WaitTimeout(
+        'Conditions not met after %s seconds: %s' %
+        (timeout, ', '.join(str(cond) for cond in pending)),
+        stats,
+    )
+
+
+def wait_all(
+    conditions,
+    timeout,
+    allowed_exceptions=None,
+    backoff=None,
+    watcher=None,
+    name=None,
+):
+    """
+    Probe all the conditions until every one of them was met at least once
+
+    Each probe round evaluates only the conditions that were not met yet,
+    and fetches the entities of all the :class:`EntityCondition` on the same
+    collection with a single ``list`` call.
+
+    Args:
+        conditions (list of Condition or EntityCondition): conditions to
+            wait for
+        timeout (float): seconds to wait before giving up
+        allowed_exceptions (list of Exception): exceptions raised by the
+            probes that mean "not yet" rather than a failure
+        backoff (Backoff): delays to use between probe rounds
+        watcher (EngineEventWatcher): if given, probe again as soon as the
+            engine reports a change, the default watcher is used if None
+        name (str): name of the wait for the logs and stats
+
+    Returns:
+        list: the given conditions
+
+    Raises:
+        WaitTimeout: if not all the conditions were met in time, naming the
+            ones that were not
+        Exception: any exception of the probes that is not allowed
+    """
+    return _wait_many(
+        conditions, timeout, True, allowed_exceptions, backoff, watcher, name
+    )
+
+
+def wait_any(
+    conditions,
+    timeout,
+    allowed_exceptions=None,
+    backoff=None,
+    watcher=None,
+    name=None,
+):
+    """
+    Probe all the conditions until one of them is met, see :func:`wait_all`
+    for the arguments
+
+    Returns:
+        Condition or EntityCondition: the first condition that was met
+
+    Raises:
+        WaitTimeout: if none of the conditions were met in time
+        Exception: any exception of the probes that is not allowed
+    """
+    return _wait_many(
+        conditions, timeout, False, allowed_exceptions, backoff, watcher, name
+    )
@@ -0,0 +1,231 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+import textwrap
+
+import pytest
+
+from ost_utils.pytest.scheduler import build_dependencies
+
+pytest_plugins = ('pytester',)
+
+
+class _Marker(object):
+
+    def __init__(self, args):
+        self.args = args
+
+
+class _Item(object):
+
+    def __init__(self, name, depends=None):
+        self.name = name
+        self.nodeid = 'scenario.py::' + name
+        self._depends = depends
+
+    def get_closest_marker(self, name):
+        if name != 'depends' or self._depends is None:
+            return None
+        return _Marker(self._depends)
+
+    def __repr__(self):
+        return self.name
+
+
+def test_unmarked_items_wait_for_everything_before_them():
+    a, b, c = _Item('a'), _Item('b'), _Item('c')
+
+    deps = build_dependencies([a, b, c])
+
+    assert deps == {a: set(), b: {a}, c: {a, b}}
+
+
+def test_marked_items_wait_for_their_dependencies_and_the_barrier():
+    setup = _Item('setup')
+    a = _Item('a', depends=())
+    b = _Item('b', depends=())
+    c = _Item('c', depends=('a',))
+    d = _Item('d', depends=('b', 'c'))
+
+    deps = build_dependencies([setup, a, b, c, d])
+
+    assert deps == {
+        setup: set(),
+        a: {setup},
+        b: {setup},
+        c: {setup, a},
+        d: {setup, b, c},
+    }
+
+
+def test_unmarked_item_after_marked_ones_waits_for_all_of_them():
+    a = _Item('a', depends=())
+    b = _Item('b', depends=())
+    c = _Item('c')
+    d = _Item('d', depends=())
+
+    deps = build_dependencies([a, b, c, d])
+
+    assert deps == {a: set(), b: set(), c: {a, b}, d: {c}}
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(pytest.UsageError):
+        build_dependencies([_Item('a', depends=('missing',))])
+
+
+def test_dependency_on_a_later_item_is_rejected():
+    with pytest.raises(pytest.UsageError):
+        build_dependencies([_Item('a', depends=('b',)), _Item('b')])
+
+
+_SCENARIO = textwrap.dedent("""
+    import threading
+
+    import pytest
+
+    pytest_plugins = ('ost_utils.pytest.scheduler',)
+
+    EVENTS = []
+    TIMEOUT = 10
+    b_started = threading.Event()
+    c_started = threading.Event()
+
+
+    @pytest.fixture(scope='module')
+    def engine():
+        EVENTS.append('setup engine')
+        yield 'engine'
+        EVENTS.append('teardown engine')
+        with open('events.txt', 'w') as f:
+            f.write('\\n'.join(EVENTS))
+
+
+    def test_a(engine):
+        EVENTS.append('a')
+
+
+    @pytest.mark.depends()
+    def test_b(engine):
+        b_started.set()
+        assert c_started.wait(TIMEOUT)
+        EVENTS.append('b')
+
+
+    @pytest.mark.depends()
+    def test_c(engine):
+        c_started.set()
+        assert b_started.wait(TIMEOUT)
+        EVENTS.append('c')
+
+
+    @pytest.mark.depends('test_b')
+    def test_d(engine):
+        EVENTS.append('d')
+
+
+    def test_e(engine):
+        EVENTS.append('e')
+""")
+
+
+def _events(testdir):
+    return testdir.tmpdir.join('events.txt').read().splitlines()
+
+
+def test_independent_items_overlap_and_share_the_fixtures(testdir):
+    testdir.makepyfile(_SCENARIO)
+
+    result = testdir.runpytest_subprocess('-v')
+
+    result.assert_outcomes(passed=5)
+    events = _events(testdir)
+    assert events[:2] == ['setup engine', 'a']
+    assert sorted(events[2:4]) == ['b', 'c']
+    assert events.index('d') > events.index('b')
+    assert events[-2:] == ['e', 'teardown engine']
+    assert events.count('setup engine') == 1
+
+
+def test_items_run_serially_with_one_worker(testdir, monkeypatch):
+    monkeypatch.setenv('OST_PARALLEL_STEPS', '1')
+    testdir.makepyfile(
+        _SCENARIO.replace('TIMEOUT = 10', 'TIMEOUT = 0.1')
+    )
+
+    result = testdir.runpytest_subprocess()
+
+    # b waits for c, which only starts after it
+    result.assert_outcomes(passed=4, failed=1)
+    assert _events(testdir) == [
+        'setup engine', 'a', 'c', 'd', 'e', 'teardown engine'
+    ]
+
+
+def test_items_of_other_modules_do_not_overlap(testdir):
+    testdir.makepyfile(
+        test_first="""
+            import time
+
+            import pytest
+
+            pytest_plugins = ('ost_utils.pytest.scheduler',)
+
+            STATE = {}
+
+            @pytest.fixture(scope='module')
+            def resource():
+                STATE['up'] = True
+                yield
+                STATE['up'] = False
+
+            @pytest.mark.depends()
+            def test_slow(resource):
+                time.sleep(0.5)
+                assert STATE['up']
+        """,
+        test_second="""
+            import pytest
+
+            @pytest.mark.depends()
+            def test_other():
+                pass
+        """,
+    )
+
+    result = testdir.runpytest_subprocess()
+
+    result.assert_outcomes(passed=2)
+
+
+def test_unknown_dependency_fails_the_session(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        pytest_plugins = ('ost_utils.pytest.scheduler',)
+
+        @pytest.mark.depends('test_missing')
+        def test_a():
+            pass
+    """)
+
+    result = testdir.runpytest_subprocess()
+
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(['*depends on test_missing*'])
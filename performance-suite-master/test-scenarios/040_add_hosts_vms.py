@@ -35,8 +35,10 @@ import test_utils
 from test_utils import network_utils_v4
 from test_utils import constants
 from test_utils import versioning
+from test_utils import provisioning
 
 from ost_utils import general_utils
+from ost_utils import waiter
 
 import logging
 LOGGER = logging.getLogger(__name__)
@@ -57,7 +59,8 @@ MASTER_SD_TYPE = 'nfs'
 # Simulate Hosts and Vms
 USE_VDSMFAKE = os.environ.has_key('OST_USE_VDSMFAKE')
 VMS_COUNT = int(os.environ.get('OST_VM_COUNT', 100))
-HOST_COUNT = int(os.environ.get('OST_HOST_COUNT', 10))
+PROVISION_SPEC = provisioning.ProvisionSpec.from_env(default_hosts=10)
+HOST_COUNT = PROVISION_SPEC.hosts
 VM_NAME = "vm"
 VM_TEMPLATE = "template"
 POOL_NAME = "pool"
@@ -174,16 +177,16 @@ def _random_host_from_dc(api, dc_name=DC_NAME):
 def _random_host_from_dc_4(api, dc_name=DC_NAME):
     return _hosts_in_dc_4(api, dc_name, True)
 
-def _all_hosts_up(hosts_service, total_hosts):
-    installing_hosts = hosts_service.list(search='datacenter={} AND status=installing or status=initializing'.format(DC_NAME))
-    if len(installing_hosts) == len(total_hosts): # All hosts still installing
+def _host_up(host):
+    if host is None:
         return False
-
-    up_hosts = hosts_service.list(search='datacenter={} AND status=up'.format(DC_NAME))
-    if len(up_hosts) == len(total_hosts):
-        return True
-
-    _check_problematic_hosts(hosts_service)
+    if host.status in (
+        types.HostStatus.NON_OPERATIONAL, types.HostStatus.INSTALL_FAILED
+    ):
+        raise RuntimeError(
+            'Host %s failed installation: %s' % (host.name, host.status)
+        )
+    return host.status == types.HostStatus.UP
 
 def _single_host_up(hosts_service, total_hosts):
     installing_hosts = hosts_service.list(search='datacenter={} AND status=installing or status=initializing'.format(DC_NAME))
@@ -263,31 +266,18 @@ def add_hosts(prefix):
             host.ssh(['chronyc', '-4', 'add', 'server', testlib.get_prefixed_name('engine')])
             host.ssh(['chronyc', '-4', 'makestep'])
 
-    api = prefix.virt_env.engine_vm().get_api_v4()
-    add_hosts_4(api, hosts)
-
+    add_hosts_4(prefix.virt_env.engine_vm(), hosts)
 
-def add_hosts_4(api, hosts):
-    hosts_service = api.system_service().hosts_service()
-
-    def _add_host_4(vm):
-        return hosts_service.add(
-            sdk4.types.Host(
-                name=vm.name(),
-                description='host %s' % vm.name(),
-                address=vm.name(),
-                root_password=str(vm.root_password()),
-                override_iptables=True,
-                cluster=sdk4.types.Cluster(
-                    name=CLUSTER_NAME,
-                ),
-            ),
-        )
 
-    for host in hosts:
-        nt.assert_true(
-            _add_host_4(host)
-        )
+def add_hosts_4(engine, hosts):
+    provisioner = provisioning.BulkProvisioner(
+        provisioning.engine_connector(engine), CLUSTER_NAME
+    )
+    try:
+        provisioner.add_hosts(hosts)
+    finally:
+        provisioner.log_summary()
+        provisioner.close()
 
 
 @testlib.with_ovirt_prefix
@@ -312,8 +302,16 @@ def verify_add_all_hosts(prefix):
     hosts_service = api.system_service().hosts_service()
     total_hosts = hosts_service.list(search='datacenter={}'.format(DC_NAME))
 
-    testlib.assert_true_within_long(
-        lambda: _all_hosts_up(hosts_service, total_hosts)
+    waiter.wait_all(
+        [
+            waiter.EntityCondition(
+                hosts_service, host.name, _host_up,
+                search='datacenter={}'.format(DC_NAME)
+            )
+            for host in total_hosts
+        ],
+        testlib.LONG_TIMEOUT,
+        name='all hosts up in {}'.format(DC_NAME)
     )
 
     if not USE_VDSMFAKE:
@@ -719,6 +717,24 @@ def add_vms(api):
         ),
     )
 
+@testlib.with_ovirt_prefix
+def add_bulk_vms(prefix):
+    if not PROVISION_SPEC.vms:
+        raise SkipTest('OST_VMS_PER_HOST is not set')
+
+    provisioner = provisioning.BulkProvisioner(
+        provisioning.engine_connector(prefix.virt_env.engine_vm()),
+        CLUSTER_NAME,
+    )
+    try:
+        provisioner.provision_vms(
+            PROVISION_SPEC, VM_TEMPLATE, SD_NFS_NAME, vm_name_prefix='bulk-vm'
+        )
+    finally:
+        provisioner.log_summary()
+        provisioner.close()
+
+
 @testlib.with_ovirt_prefix
 def copy_storage_script(prefix):
     engine = prefix.virt_env.engine_vm()
@@ -758,6 +774,7 @@ _TEST_LIST = [
     add_vm_template,
     verify_add_all_hosts,
     add_vms,
+    add_bulk_vms,
 ]
 
 
@@ -0,0 +1,192 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Scale curve of the engine: for each step of OST_SCALE_STEPS (hosts:vms
+pairs) a new data center and cluster get the step's number of fake hosts,
+and a pool of the step's number of prestarted VMs is created on the
+performance cluster, where the template is. Every phase is timed, the
+engine API latency is sampled after each step, and all of it is written as
+json to OST_SCALE_RESULTS (test_logs/<suite>/scale-curve.json by default).
+
+The entities of a step are kept for the following ones, so each step is
+measured with the entities of all the steps up to it: ``hosts`` and ``vms``
+of a step are the totals added so far, ``added_hosts`` and ``added_vms``
+the ones added by the step, and ``engine_hosts`` and ``engine_vms`` all the
+ones the engine had when the step was measured.
+
+Runs only with vdsmfake (OST_USE_VDSMFAKE) and OST_SCALE_STEPS set.
+"""
+import os
+
+from nose import SkipTest
+
+import ovirtsdk4.types as types
+
+from ovirtlago import testlib
+
+from test_utils import benchmark
+from test_utils import provisioning
+from test_utils import versioning
+
+from ost_utils import waiter
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+USE_VDSMFAKE = 'OST_USE_VDSMFAKE' in os.environ
+RUN_SWEEP = USE_VDSMFAKE and 'OST_SCALE_STEPS' in os.environ
+
+DC_VER_MAJ, DC_VER_MIN = versioning.cluster_version()
+VMS_CLUSTER_NAME = 'performance-cluster'
+VM_TEMPLATE = 'template'
+
+
+class FakeHost(object):
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def root_password(self):
+        return 'password'
+
+
+def _host_up(host):
+    return host is not None and host.status == types.HostStatus.UP
+
+
+def _run_step(system_service, connect, index, step):
+    dc_name = 'scale-dc-%d' % index
+    cluster_name = 'scale-cluster-%d' % index
+    pool_name = 'scale-pool-%d' % index
+    hosts = [
+        FakeHost('scale%d-%d.vdsm.fake' % (index, i))
+        for i in range(step.hosts)
+    ]
+    timer = benchmark.PhaseTimer()
+    provisioner = provisioning.BulkProvisioner(connect, cluster_name)
+
+    with timer.phase('add_dc'):
+        system_service.data_centers_service().add(
+            types.DataCenter(
+                name=dc_name,
+                local=False,
+                version=types.Version(major=DC_VER_MAJ, minor=DC_VER_MIN),
+            ),
+        )
+
+    with timer.phase('add_cluster'):
+        system_service.clusters_service().add(
+            types.Cluster(
+                name=cluster_name,
+                data_center=types.DataCenter(name=dc_name),
+            ),
+        )
+
+    with timer.phase('add_hosts'):
+        try:
+            provisioner.add_hosts(hosts)
+        finally:
+            provisioner.close()
+
+    with timer.phase('hosts_up'):
+        waiter.wait_all(
+            [
+                waiter.EntityCondition(
+                    system_service.hosts_service(), host.name(), _host_up,
+                    search='datacenter=%s' % dc_name
+                )
+                for host in hosts
+            ],
+            testlib.LONG_TIMEOUT,
+            name='hosts of %s up' % dc_name
+        )
+
+    with timer.phase('pool_prestart'):
+        system_service.vm_pools_service().add(
+            types.VmPool(
+                name=pool_name,
+                cluster=types.Cluster(name=VMS_CLUSTER_NAME),
+                template=types.Template(name=VM_TEMPLATE),
+                size=step.vms,
+                prestarted_vms=step.vms,
+                max_user_vms=1,
+            ),
+        )
+        vms_service = system_service.vms_service()
+        waiter.wait_for(
+            lambda: len(vms_service.list(
+                search='pool=%s and status=up' % pool_name
+            )),
+            testlib.LONG_TIMEOUT,
+            success=lambda up_vms: up_vms == step.vms,
+            name='%s prestarted' % pool_name
+        )
+
+    return {
+        'added_hosts': step.hosts,
+        'added_vms': step.vms,
+        'engine_hosts': len(system_service.hosts_service().list()),
+        'engine_vms': len(vms_service.list()),
+        'phases': timer.phases,
+        'provisioning': provisioning.summarize(provisioner.results),
+        'api_latency': benchmark.sample_api_latency(system_service),
+    }
+
+
+@testlib.with_ovirt_prefix
+def scale_curve(prefix):
+    if not RUN_SWEEP:
+        raise SkipTest('OST_USE_VDSMFAKE and OST_SCALE_STEPS are not set')
+
+    engine = prefix.virt_env.engine_vm()
+    connect = provisioning.engine_connector(engine)
+    system_service = engine.get_api_v4().system_service()
+    results = {
+        'engine_version':
+            system_service.get().product_info.version.full_version,
+        'steps': [],
+    }
+    total_hosts = total_vms = 0
+    try:
+        for index, step in enumerate(benchmark.steps_from_env()):
+            total_hosts += step.hosts
+            total_vms += step.vms
+            LOGGER.info(
+                'Scale step %d: %d hosts, %d vms, %d and %d in total',
+                index, step.hosts, step.vms, total_hosts, total_vms
+            )
+            step_results = _run_step(system_service, connect, index, step)
+            step_results.update(hosts=total_hosts, vms=total_vms)
+            results['steps'].append(step_results)
+    finally:
+        benchmark.write_results(results)
+
+
+_TEST_LIST = [
+    scale_curve,
+]
+
+
+def test_gen():
+    for t in testlib.test_sequence_gen(_TEST_LIST):
+        test_gen.__name__ = t.description
+        yield t
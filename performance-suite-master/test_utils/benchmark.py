@@ -0,0 +1,157 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Helpers to measure how the engine scales: timing of the provisioning
+phases, sampling of the engine API latency and writing the results of a
+scale sweep in a machine readable form.
+"""
+import collections
+import contextlib
+import json
+import logging
+import os
+import time
+
+from test_utils.provisioning import percentile
+
+LOGGER = logging.getLogger(__name__)
+
+#: Default sweep, as hosts:vms pairs
+DEFAULT_SCALE_STEPS = '10:100,25:250,50:500'
+API_LATENCY_SAMPLES = 20
+
+ScaleStep = collections.namedtuple('ScaleStep', ('hosts', 'vms'))
+
+
+def parse_steps(steps):
+    """
+    Args:
+        steps (str): comma separated hosts:vms pairs, e.g. '10:100,20:200'
+
+    Returns:
+        list of ScaleStep: the parsed steps
+    """
+    parsed = []
+    for step in steps.split(','):
+        hosts, vms = step.strip().split(':')
+        parsed.append(ScaleStep(int(hosts), int(vms)))
+    return parsed
+
+
+def steps_from_env():
+    return parse_steps(
+        os.environ.get('OST_SCALE_STEPS', DEFAULT_SCALE_STEPS)
+    )
+
+
+class PhaseTimer(object):
+    """
+    Records how long each named phase took
+
+    Example:
+        >>> timer = PhaseTimer()
+        >>> with timer.phase('add_dc'):
+        ...     add_dc()
+        >>> timer.phases
+        OrderedDict([('add_dc', 0.42)])
+    """
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.time() - start
+            LOGGER.info('Phase %s took %.2fs', name, self.phases[name])
+
+
+def _latency_stats(latencies):
+    return {
+        'samples': len(latencies),
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies or [0]),
+    }
+
+
+def sample_api_latency(system_service, samples=API_LATENCY_SAMPLES):
+    """
+    Measure the latency of a few representative engine API calls
+
+    Args:
+        system_service (ovirtsdk4.services.SystemService): engine to probe
+        samples (int): number of times to call each request
+
+    Returns:
+        dict of str: dict: latency percentiles (in seconds) of each request
+    """
+    requests = collections.OrderedDict([
+        ('system_get', lambda: system_service.get()),
+        ('hosts_list', lambda: system_service.hosts_service().list()),
+        ('vms_list', lambda: system_service.vms_service().list()),
+        ('events_list', lambda: system_service.events_service().list(max=50)),
+    ])
+
+    results = collections.OrderedDict()
+    for name, request in requests.items():
+        latencies = []
+        for _ in range(samples):
+            start = time.time()
+            request()
+            latencies.append(time.time() - start)
+        results[name] = _latency_stats(latencies)
+    return results
+
+
+def default_results_path():
+    suite = os.path.basename(os.environ.get('SUITE', 'performance-suite'))
+    return os.path.join(
+        os.environ.get('OST_REPO_ROOT', os.curdir),
+        'test_logs',
+        suite,
+        'scale-curve.json',
+    )
+
+
+def write_results(results, path=None):
+    """
+    Write the results of a sweep as json, so runs can be compared
+
+    Args:
+        results (dict): results to write
+        path (str): file to write to, :func:`default_results_path` if None
+
+    Returns:
+        str: the path the results were written to
+    """
+    path = path or os.environ.get('OST_SCALE_RESULTS') or \
+        default_results_path()
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=4)
+    LOGGER.info('Scale results written to %s', path)
+    return path
@@ -0,0 +1,541 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Bulk provisioning of engine entities for the scale tests: hosts, VMs and
+their disks and NICs are added concurrently, with a bounded number of
+parallel requests, retries of failed additions and the latency of every
+single addition recorded.
+
+Each worker thread sends its requests with its own SDK connection, as SDK
+connections can't be shared between threads (and a shared one would only
+send one request at a time).
+"""
+import collections
+import functools
+import logging
+import os
+import Queue
+import threading
+import time
+
+import ovirtsdk4 as sdk4
+import ovirtsdk4.types as types
+
+from ost_utils import sdk_utils
+from ost_utils import waiter
+
+LOGGER = logging.getLogger(__name__)
+GB = 2 ** 30
+
+DEFAULT_MAX_WORKERS = int(os.environ.get('OST_PROVISION_WORKERS', 10))
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_DELAY = 2
+#: Seconds to wait for the VMs cloned from a template to be unlocked
+VMS_DOWN_TIMEOUT = 600
+
+
+_ProvisionSpec = collections.namedtuple(
+    'ProvisionSpec', ('hosts', 'vms_per_host', 'disks_per_vm', 'nics_per_vm')
+)
+
+
+class ProvisionSpec(_ProvisionSpec):
+    """
+    Declarative description of the setup to provision
+
+    Attributes:
+        hosts (int): number of hosts
+        vms_per_host (int): number of VMs to add for each host
+        disks_per_vm (int): number of disks to add to each VM
+        nics_per_vm (int): number of NICs to add to each VM
+    """
+
+    @classmethod
+    def from_env(cls, default_hosts=10):
+        return cls(
+            hosts=int(os.environ.get('OST_HOST_COUNT', default_hosts)),
+            vms_per_host=int(os.environ.get('OST_VMS_PER_HOST', 0)),
+            disks_per_vm=int(os.environ.get('OST_DISKS_PER_VM', 0)),
+            nics_per_vm=int(os.environ.get('OST_NICS_PER_VM', 0)),
+        )
+
+    @property
+    def vms(self):
+        return self.hosts * self.vms_per_host
+
+
+ItemResult = collections.namedtuple(
+    'ItemResult',
+    ('kind', 'name', 'value', 'latency', 'attempts', 'error', 'started'),
+)
+
+
+class ProvisioningError(Exception):
+
+    def __init__(self, failed):
+        super(ProvisioningError, self).__init__(
+            'Failed to add %d entities: %s' % (
+                len(failed),
+                ', '.join('%s %s' % (res.kind, res.name) for res in failed),
+            )
+        )
+        self.failed = failed
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(results):
+    """
+    Args:
+        results (list of ItemResult): results to summarize
+
+    Returns:
+        dict of str: dict: for each kind of entity, the number of added and
+            failed items, the number of retries, the latency percentiles and
+            the throughput, in added items per second of the time spent
+            adding them
+    """
+    by_kind = collections.OrderedDict()
+    for result in results:
+        by_kind.setdefault(result.kind, []).append(result)
+
+    summary = collections.OrderedDict()
+    for kind, kind_results in by_kind.items():
+        latencies = [res.latency for res in kind_results if res.error is None]
+        attempted = [res for res in kind_results if res.attempts]
+        elapsed = attempted and (
+            max(res.started + res.latency for res in attempted) -
+            min(res.started for res in attempted)
+        )
+        summary[kind] = {
+            'added': len(latencies),
+            'failed': len(kind_results) - len(latencies),
+            'retries': sum(
+                max(res.attempts - 1, 0) for res in kind_results
+            ),
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies or [0]),
+            'throughput': len(latencies) / elapsed if elapsed else 0,
+        }
+    return summary
+
+
+def engine_connector(engine_vm):
+    """
+    Args:
+        engine_vm (ovirtlago.virt.EngineVM): the engine to connect to
+
+    Returns:
+        callable: returns a new, authenticated SDK v4 connection to the engine
+    """
+    return functools.partial(
+        sdk_utils.connect_v4,
+        engine_vm.ip(),
+        str(engine_vm.metadata['ovirt-engine-password']),
+    )
+
+
+def _find_by_name(collection_service, name):
+    found = collection_service.list(search='name="%s"' % name)
+    return next((entity for entity in found if entity.name == name), None)
+
+
+def _disk_names(vm_name, disks_per_vm):
+    return ['%s_disk%d' % (vm_name, index) for index in range(disks_per_vm)]
+
+
+def _nic_names(nics_per_vm):
+    return ['nic%d' % (index + 1) for index in range(nics_per_vm)]
+
+
+class BulkProvisioner(object):
+    """
+    Adds engine entities concurrently, each worker thread with its own SDK
+    connection. Call :meth:`close` to close the connections when done.
+
+    Attributes:
+        max_workers (int): max number of additions running at the same time
+        retries (int): number of times to try each addition
+        retry_delay (float): seconds to wait before retrying an addition,
+            doubled after every failed attempt
+        results (list of ItemResult): results of all the additions done
+    """
+
+    def __init__(
+        self,
+        connect,
+        cluster_name,
+        max_workers=DEFAULT_MAX_WORKERS,
+        retries=DEFAULT_RETRIES,
+        retry_delay=DEFAULT_RETRY_DELAY,
+    ):
+        """
+        Args:
+            connect (callable): returns a new, authenticated SDK v4
+                connection, see :func:`engine_connector`
+            cluster_name (str): cluster to add the hosts and VMs to
+            max_workers (int): max number of additions running at the same
+                time
+            retries (int): number of times to try each addition
+            retry_delay (float): seconds to wait before retrying an addition
+        """
+        self._connections = sdk_utils.SDKConnectionManager(
+            factory=connect,
+            pool_size=max_workers,
+            retry_exceptions=(sdk4.AuthError, sdk4.ConnectionError),
+        )
+        self._system = sdk_utils.ThreadLocalConnection(
+            self._connections
+        ).system_service()
+        self._cluster_name = cluster_name
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.results = []
+        self._results_lock = threading.Lock()
+
+    def _add_one(self, kind, name, func, lookup=None):
+        start = time.time()
+        delay = self.retry_delay
+        for attempt in range(1, self.retries + 1):
+            try:
+                # an addition is not idempotent, a request that failed on
+                # our side may have added the entity on the engine
+                value = lookup() if attempt > 1 and lookup else None
+                if value is None:
+                    value = func()
+                error = None
+                break
+            except (sdk4.Error, IOError) as err:
+                LOGGER.debug(
+                    'Attempt %d to add %s %s failed: %s',
+                    attempt, kind, name, err,
+                )
+                error = err
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+        else:
+            value = None
+
+        result = ItemResult(
+            kind, name, value, time.time() - start, attempt, error, start
+        )
+        with self._results_lock:
+            self.results.append(result)
+        return result
+
+    def run(self, items, raise_on_failure=True):
+        """
+        Run the given additions, at most ``max_workers`` at a time
+
+        Args:
+            items (list of tuple): (kind, name, func, lookup) of each
+                addition, where func adds the entity and returns it, and
+                lookup, if not None, returns the entity if it was already
+                added (or None), and is called before retrying func
+            raise_on_failure (bool): if False, failed additions are only
+                reported in their results
+
+        Returns:
+            list of ItemResult: the results, in the order of the items
+
+        Raises:
+            ProvisioningError: if any of the additions failed all its attempts
+                and ``raise_on_failure`` is True
+        """
+        pending = Queue.Queue()
+        for index, item in enumerate(items):
+            pending.put((index, item))
+        results = [None] * len(items)
+
+        def worker():
+            while True:
+                try:
+                    index, (kind, name, func, lookup) = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                results[index] = self._add_one(kind, name, func, lookup)
+
+        workers = [
+            threading.Thread(target=worker, name='provision-%d' % i)
+            for i in range(min(self.max_workers, len(items)))
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        failed = [res for res in results if res.error is not None]
+        if failed and raise_on_failure:
+            raise ProvisioningError(failed)
+        return results
+
+    def _skip(self, kind, name, error):
+        result = ItemResult(kind, name, None, 0, 0, error, time.time())
+        with self._results_lock:
+            self.results.append(result)
+        return result
+
+    def add_hosts(self, hosts):
+        """
+        Args:
+            hosts (list): objects with ``name()`` and ``root_password()``
+                methods, like the lago VMs
+
+        Returns:
+            list of ItemResult: one for each host
+        """
+        hosts_service = self._system.hosts_service()
+
+        def add_host(host):
+            return hosts_service.add(
+                types.Host(
+                    name=host.name(),
+                    description='host %s' % host.name(),
+                    address=host.name(),
+                    root_password=str(host.root_password()),
+                    override_iptables=True,
+                    cluster=types.Cluster(name=self._cluster_name),
+                ),
+            )
+
+        return self.run([
+            (
+                'host', host.name(),
+                lambda host=host: add_host(host),
+                lambda host=host: _find_by_name(hosts_service, host.name()),
+            )
+            for host in hosts
+        ])
+
+    def add_vms(self, names, template_name, raise_on_failure=True):
+        """
+        Args:
+            names (list of str): names of the VMs to add
+            template_name (str): name of the template to create them from
+            raise_on_failure (bool): see :meth:`run`
+
+        Returns:
+            list of ItemResult: one for each VM, with the added VM as value
+        """
+        vms_service = self._system.vms_service()
+
+        def add_vm(name):
+            return vms_service.add(
+                types.Vm(
+                    name=name,
+                    cluster=types.Cluster(name=self._cluster_name),
+                    template=types.Template(name=template_name),
+                ),
+            )
+
+        return self.run(
+            [
+                (
+                    'vm', name,
+                    lambda name=name: add_vm(name),
+                    lambda name=name: _find_by_name(vms_service, name),
+                )
+                for name in names
+            ],
+            raise_on_failure,
+        )
+
+    def wait_for_vms_down(self, vms, timeout=VMS_DOWN_TIMEOUT):
+        """
+        Wait for the VMs to be down, VMs cloned from a template have their
+        disks locked until the copy is done, and no device can be added to
+        them before
+
+        Args:
+            vms (list of ovirtsdk4.types.Vm): VMs to wait for
+            timeout (float): seconds to wait
+        """
+        vms_service = self._system.vms_service()
+        waiter.wait_all(
+            [
+                waiter.EntityCondition(
+                    vms_service, vm.name,
+                    lambda vm: (
+                        vm is not None and vm.status == types.VmStatus.DOWN
+                    ),
+                )
+                for vm in vms
+            ],
+            timeout,
+            name='%d provisioned vms down' % len(vms),
+        )
+
+    def add_disks_and_nics(
+        self, vms, disks_per_vm, nics_per_vm, storage_domain_name,
+        vnic_profile_id=None, disk_size=GB, raise_on_failure=True,
+    ):
+        """
+        Args:
+            vms (list of ovirtsdk4.types.Vm): VMs to add the devices to
+            disks_per_vm (int): number of disks to add to each VM
+            nics_per_vm (int): number of NICs to add to each VM
+            storage_domain_name (str): storage domain to create the disks on
+            vnic_profile_id (str): vNIC profile of the NICs, if None the NICs
+                are not connected to any network
+            disk_size (int): provisioned size of each disk, in bytes
+            raise_on_failure (bool): see :meth:`run`
+
+        Returns:
+            list of ItemResult: one for each disk and NIC
+        """
+        vms_service = self._system.vms_service()
+        disks_service = self._system.disks_service()
+
+        def add_disk(vm, name):
+            attachments = vms_service.vm_service(vm.id).\
+                disk_attachments_service()
+            return attachments.add(
+                types.DiskAttachment(
+                    disk=types.Disk(
+                        name=name,
+                        format=types.DiskFormat.COW,
+                        provisioned_size=disk_size,
+                        sparse=True,
+                        storage_domains=[
+                            types.StorageDomain(name=storage_domain_name),
+                        ],
+                    ),
+                    interface=types.DiskInterface.VIRTIO,
+                    bootable=False,
+                    active=True,
+                ),
+            )
+
+        def add_nic(vm, name):
+            profile = None
+            if vnic_profile_id is not None:
+                profile = types.VnicProfile(id=vnic_profile_id)
+            return vms_service.vm_service(vm.id).nics_service().add(
+                types.Nic(
+                    name=name,
+                    interface=types.NicInterface.VIRTIO,
+                    vnic_profile=profile,
+                ),
+            )
+
+        def find_nic(vm, name):
+            nics = vms_service.vm_service(vm.id).nics_service().list()
+            return next((nic for nic in nics if nic.name == name), None)
+
+        items = []
+        for vm in vms:
+            for name in _disk_names(vm.name, disks_per_vm):
+                items.append((
+                    'disk', name,
+                    lambda vm=vm, name=name: add_disk(vm, name),
+                    lambda name=name: _find_by_name(disks_service, name),
+                ))
+            for name in _nic_names(nics_per_vm):
+                items.append((
+                    'nic', '%s/%s' % (vm.name, name),
+                    lambda vm=vm, name=name: add_nic(vm, name),
+                    lambda vm=vm, name=name: find_nic(vm, name),
+                ))
+        return self.run(items, raise_on_failure)
+
+    def provision_vms(
+        self, spec, template_name, storage_domain_name, vnic_profile_id=None,
+        vm_name_prefix='vm',
+    ):
+        """
+        Add the VMs of the given spec, and then their disks and NICs
+
+        Args:
+            spec (ProvisionSpec): what to provision
+            template_name (str): name of the template to create the VMs from
+            storage_domain_name (str): storage domain to create the disks on
+            vnic_profile_id (str): vNIC profile of the NICs
+            vm_name_prefix (str): prefix of the VM names
+
+        Returns:
+            list of ItemResult: one for each added entity, and for each device
+                of the VMs that couldn't be added
+
+        Raises:
+            ProvisioningError: if any of the entities couldn't be added
+        """
+        names = ['%s%d' % (vm_name_prefix, i) for i in range(spec.vms)]
+        vm_results = self.add_vms(names, template_name, False)
+        vms = [res.value for res in vm_results if res.error is None]
+
+        skipped = []
+        for res in vm_results:
+            if res.error is None:
+                continue
+            skipped.extend(
+                self._skip('disk', name, res.error)
+                for name in _disk_names(res.name, spec.disks_per_vm)
+            )
+            skipped.extend(
+                self._skip('nic', '%s/%s' % (res.name, name), res.error)
+                for name in _nic_names(spec.nics_per_vm)
+            )
+
+        if vms and (spec.disks_per_vm or spec.nics_per_vm):
+            self.wait_for_vms_down(vms)
+        device_results = self.add_disks_and_nics(
+            vms,
+            spec.disks_per_vm,
+            spec.nics_per_vm,
+            storage_domain_name,
+            vnic_profile_id,
+            raise_on_failure=False,
+        )
+
+        results = vm_results + device_results + skipped
+        failed = [res for res in results if res.error is not None]
+        if failed:
+            raise ProvisioningError(failed)
+        return results
+
+    def close(self):
+        """
+        Close the SDK connections of the workers
+
+        Returns:
+            None
+        """
+        self._connections.close()
+
+    def log_summary(self):
+        for kind, stats in summarize(self.results).items():
+            LOGGER.info(
+                'Added %d %ss (%d failed, %d retries) at %.2f/s: '
+                'p50=%.2fs p90=%.2fs p99=%.2fs max=%.2fs',
+                stats['added'], kind, stats['failed'], stats['retries'],
+                stats['throughput'],
+                stats['p50'], stats['p90'], stats['p99'], stats['max'],
+            )
+
@@ -76,6 +76,9 @@ Optional arguments:
 
 on_exit() {
     [[ "$?" -ne 0 ]] && logger.error "on_exit: Exiting with a non-zero status"
+    env_metrics_stop || logger.error "Failed to stop streaming the host metrics"
+    env_profile_stop || logger.error "Failed to report the profile of the run"
+    env_glance_mirror_stop || logger.error "Failed to stop the Glance mirror"
     logger.info "Dumping lago env status"
     env_status || logger.error "Failed to dump env status"
 }
@@ -84,7 +87,7 @@ on_sigterm() {
     local dest="${OST_REPO_ROOT}/test_logs/${SUITE##*/}/post-suite-sigterm"
 
     set +e
-    export CLI
+    export CLI PYTHON
     export -f env_collect
     timeout \
         120s \
@@ -277,25 +280,96 @@ env_run_test () {
     local res=0
     cd $PREFIX
     local junitxml_file="$PREFIX/${1##*/}.junit.xml"
+    metrics_event scenario start "${1##*/}"
+    profile_span_start scenario "${1##*/}"
     $CLI ovirt runtest $1 --junitxml-file "${junitxml_file}"  || res=$?
+    profile_span_end
+    metrics_event scenario end "${1##*/}"
     [[ "$res" -ne 0 ]] && xmllint --format ${junitxml_file}
     cd -
     return "$res"
 }
 
 
+pytest_events_plugin () {
+    # Prints the pytest arguments that load ost_utils.pytest.events, if the
+    # metrics or the profiling are enabled and the plugin can be imported,
+    # so recording the tests can't fail the scenarios
+    [[ -n "$OST_METRICS_EVENTS" || -n "$OST_PROFILE" ]] || return 0
+
+    if "${PYTHON}" -c 'import ost_utils.pytest.events' > /dev/null 2>&1; then
+        echo "-p ost_utils.pytest.events"
+    else
+        logger.warning \
+            "Failed to import ost_utils.pytest.events, not recording tests" >&2
+    fi
+}
+
+
 env_run_pytest () {
 
     local res=0
     cd $PREFIX
     local junitxml_file="$PREFIX/${1##*/}.junit.xml"
 
+    metrics_event scenario start "${1##*/}"
+    profile_span_start scenario "${1##*/}"
     "${PYTHON}" -B -m pytest \
+        $(pytest_events_plugin) \
         -s \
         -v \
         -x \
         --junit-xml="${junitxml_file}" \
         "$1" || res=$?
+    profile_span_end
+    metrics_event scenario end "${1##*/}"
+
+    [[ "$res" -ne 0 ]] && xmllint --format ${junitxml_file}
+    cd -
+    return "$res"
+}
+
+
+env_run_pytest_browsers () {
+    # Like env_run_pytest, but runs a UI scenario in one pytest process per
+    # browser in OST_UI_BROWSERS, all at the same time, and merges their
+    # junit xml files
+    local scenario="${1?}"
+    local res=0
+    local browser
+    local browser_junitxml_file
+    local pid
+    local -a pids=()
+    local -a junitxml_files=()
+    local events_plugin
+    cd $PREFIX
+    local junitxml_file="$PREFIX/${scenario##*/}.junit.xml"
+
+    metrics_event scenario start "${scenario##*/}"
+    profile_span_start scenario "${scenario##*/}"
+    events_plugin="$(pytest_events_plugin)"
+    for browser in ${OST_UI_BROWSERS:-firefox chrome}; do
+        browser_junitxml_file="$PREFIX/${scenario##*/}.${browser}.junit.xml"
+        junitxml_files+=("$browser_junitxml_file")
+        rm -f "$browser_junitxml_file"
+        OST_UI_BROWSER="$browser" "${PYTHON}" -B -m pytest \
+            $events_plugin \
+            -s \
+            -v \
+            -x \
+            --junit-xml="$browser_junitxml_file" \
+            "$scenario" \
+            > >(sed -u "s/^/[$browser] /") 2>&1 &
+        pids+=($!)
+    done
+    for pid in "${pids[@]}"; do
+        wait "$pid" || res=$?
+    done
+    profile_span_end
+    metrics_event scenario end "${scenario##*/}"
+
+    "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/merge_junit.py" \
+        "$junitxml_file" "${junitxml_files[@]}" || res=$?
 
     [[ "$res" -ne 0 ]] && xmllint --format ${junitxml_file}
     cd -
@@ -324,17 +398,187 @@ env_ansible () {
 }
 
 
+env_metrics_start () {
+    # Streams the metrics of all the VMs into test_logs until
+    # env_metrics_stop, and records the scenarios, tests and log tasks
+    # run meanwhile, see common/scripts/stream_metrics.py
+    local metrics_dir="$OST_REPO_ROOT/test_logs/${SUITE##*/}/metrics"
+
+    mkdir -p "$metrics_dir"
+    export OST_METRICS_EVENTS="$metrics_dir/events.tsv"
+    "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/stream_metrics.py" \
+        stream "$PREFIX" "$metrics_dir" \
+        > "$metrics_dir/stream.log" 2>&1 &
+    METRICS_PID=$!
+}
+
+
+env_metrics_stop () {
+    [[ -n "$METRICS_PID" ]] || return 0
+
+    kill "$METRICS_PID" && wait "$METRICS_PID"
+    METRICS_PID=""
+    "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/stream_metrics.py" \
+        report "${OST_METRICS_EVENTS%/*}" \
+        || logger.error "Failed to report the host metrics"
+}
+
+
+metrics_event () {
+    # Same format as ost_utils.log_utils.record_event
+    [[ -n "$OST_METRICS_EVENTS" ]] || return 0
+
+    printf '%s\t%s\t%s\t%s\n' "$(date +%s.%3N)" "$1" "$2" "$3" \
+        >> "$OST_METRICS_EVENTS"
+}
+
+
+env_profile_start () {
+    # Records the log tasks, tests, waits and SSH commands of the scenarios
+    # as spans, see ost_utils/ost_utils/profiler.py
+    local profile_dir="$OST_REPO_ROOT/test_logs/${SUITE##*/}/profile"
+
+    mkdir -p "$profile_dir"
+    export OST_PROFILE="$profile_dir/spans.jsonl"
+}
+
+
+env_profile_stop () {
+    [[ -n "$OST_PROFILE" && -f "$OST_PROFILE" ]] || return 0
+
+    "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/profile_report.py" \
+        "$OST_PROFILE" "${OST_PROFILE%/*}" \
+        | tee "${OST_PROFILE%/*}/report.txt"
+}
+
+
+env_glance_mirror_start () {
+    # Serves the images of glance.ovirt.org to the VMs from a cache shared
+    # by the runs on this machine, see common/scripts/glance_mirror.py.
+    # The suites use OST_GLANCE_MIRROR_URL instead of the upstream server
+    # when it's set, which it isn't if the mirror failed to start.
+    local mirror_dir="$OST_REPO_ROOT/test_logs/${SUITE##*/}/glance-mirror"
+    local url_file="$mirror_dir/url"
+
+    mkdir -p "$mirror_dir"
+    rm -f "$url_file"
+    "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/glance_mirror.py" \
+        serve "$PREFIX" --url-file "$url_file" \
+        > "$mirror_dir/mirror.log" 2>&1 &
+    GLANCE_MIRROR_PID=$!
+
+    for _ in $(seq 30); do
+        if [[ -f "$url_file" ]]; then
+            export OST_GLANCE_MIRROR_URL="$(cat "$url_file")"
+            logger.info "Serving Glance images at $OST_GLANCE_MIRROR_URL"
+            return 0
+        fi
+        kill -0 "$GLANCE_MIRROR_PID" 2>/dev/null || break
+        sleep 1
+    done
+    logger.error "Glance mirror didn't start, see $mirror_dir/mirror.log"
+    env_glance_mirror_stop
+}
+
+
+env_glance_mirror_stop () {
+    [[ -n "$GLANCE_MIRROR_PID" ]] || return 0
+
+    # it may have exited already, if it failed to start
+    kill "$GLANCE_MIRROR_PID" 2>/dev/null || true
+    wait "$GLANCE_MIRROR_PID" || true
+    GLANCE_MIRROR_PID=""
+    unset OST_GLANCE_MIRROR_URL
+}
+
+
+env_perf_record () {
+    # Stores the durations of the tests and spans of the run, and reports
+    # the ones that got slower than in the previous runs, see
+    # common/scripts/perf_history.py. Set OST_PERF_FAIL_ON_REGRESSION to
+    # fail the run on regressions.
+    local perf_history="${OST_REPO_ROOT}/common/scripts/perf_history.py"
+    local -a fail_args=()
+
+    [[ -n "$OST_PERF_FAIL_ON_REGRESSION" ]] && fail_args=(--fail)
+    "${PYTHON}" "$perf_history" ingest \
+        --suite "${SUITE##*/}" \
+        --prefix "$PREFIX" \
+        ${OST_PROFILE:+--spans "$OST_PROFILE"} \
+        ${BUILD_URL:+--label "$BUILD_URL"} \
+        "$PREFIX"/*.py.junit.xml \
+        || {
+            logger.error "Failed to store the durations of the run"
+            return 0
+        }
+    "${PYTHON}" "$perf_history" compare \
+        --suite "${SUITE##*/}" \
+        "${fail_args[@]}"
+}
+
+
+profile_span_start () {
+    # Opens a span of the given category and name, that the spans of the
+    # processes started until profile_span_end are nested under
+    [[ -n "$OST_PROFILE" ]] || return 0
+
+    PROFILE_SPAN_CATEGORY="$1"
+    PROFILE_SPAN_NAME="$2"
+    PROFILE_SPAN_START="$(date +%s.%6N)"
+    export OST_PROFILE_PARENT="$1-$$-${PROFILE_SPAN_START}"
+}
+
+
+profile_span_end () {
+    # Same format as ost_utils.profiler
+    [[ -n "$OST_PROFILE" && -n "$OST_PROFILE_PARENT" ]] || return 0
+
+    local fields='"id": "%s", "parent": null, "name": "%s", "cat": "%s"'
+    fields+=', "pid": %s, "tid": 0, "thread": "run_suite.sh"'
+    fields+=', "start": %s, "end": %s, "args": {}'
+    printf "{${fields}}\n" \
+        "$OST_PROFILE_PARENT" "$PROFILE_SPAN_NAME" "$PROFILE_SPAN_CATEGORY" \
+        "$$" "$PROFILE_SPAN_START" "$(date +%s.%6N)" \
+        >> "$OST_PROFILE"
+    unset OST_PROFILE_PARENT
+}
+
+
 env_collect () {
     local tests_out_dir="${1?}"
 
     [[ -e "${tests_out_dir%/*}" ]] || mkdir -p "${tests_out_dir%/*}"
     cd "$PREFIX/current"
-    $CLI collect --output "$tests_out_dir"
+    # Fetches the artifacts of all the VMs in parallel, falls back to
+    # 'lago collect' if that fails
+    if ! "${PYTHON}" \
+        "${OST_REPO_ROOT}/common/scripts/collect_artifacts.py" \
+        --full "$PREFIX" "$tests_out_dir"; then
+        rm -rf "$tests_out_dir"
+        $CLI collect --output "$tests_out_dir"
+    fi
     cp -a "logs" "$tests_out_dir/lago_logs"
     cd -
 }
 
 
+env_collect_incremental () {
+    # Like env_collect, but only fetches what changed since the previous
+    # collection, falls back to a full collection on failure
+    local tests_out_dir="${1?}"
+
+    [[ -e "${tests_out_dir%/*}" ]] || mkdir -p "${tests_out_dir%/*}"
+    if ! "${PYTHON}" "${OST_REPO_ROOT}/common/scripts/collect_artifacts.py" \
+        "$PREFIX" "$tests_out_dir"; then
+        logger.error "Incremental collection failed, collecting everything"
+        rm -rf "$tests_out_dir"
+        env_collect "$tests_out_dir"
+        return
+    fi
+    cp -a "$PREFIX/current/logs" "$tests_out_dir/lago_logs"
+}
+
+
 env_cleanup() {
 
     local res=0